@@ -0,0 +1,27 @@
+"""Use database UTC clock for device updated_at
+
+Revision ID: a2c4e6f8b0d1
+Revises: f1d7a9c4b3e8
+Create Date: 2025-02-07 09:18:33.521946
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a2c4e6f8b0d1"
+down_revision: Union[str, None] = "f1d7a9c4b3e8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # updated_at 是差異同步的水位，預設值改為資料庫的 UTC 時間，與更新、刪除及穩定界線使用同一個時鐘
+    op.alter_column("devices", "updated_at", server_default=sa.text("timezone('utc', now())"))
+
+
+def downgrade() -> None:
+    op.alter_column("devices", "updated_at", server_default=sa.text("now()"))
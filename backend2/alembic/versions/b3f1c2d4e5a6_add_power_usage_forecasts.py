@@ -0,0 +1,43 @@
+"""Add power usage forecasts table
+
+Revision ID: b3f1c2d4e5a6
+Revises: 87f90d08204c
+Create Date: 2025-01-20 10:12:41.209117
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b3f1c2d4e5a6"
+down_revision: Union[str, None] = "87f90d08204c"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "power_usage_forecasts",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("device_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("period_start", sa.Date(), nullable=False),
+        sa.Column("period_end", sa.Date(), nullable=False),
+        sa.Column("predicted_usage", sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.Column("predicted_cost", sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.Column("generated_at", sa.DateTime(), server_default=sa.text("now()"), nullable=True),
+        sa.ForeignKeyConstraint(["device_id"], ["devices.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_power_usage_forecasts_id"), "power_usage_forecasts", ["id"], unique=False)
+    op.create_index("idx_power_usage_forecasts_user_period", "power_usage_forecasts", ["user_id", "period_start"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("idx_power_usage_forecasts_user_period", table_name="power_usage_forecasts")
+    op.drop_index(op.f("ix_power_usage_forecasts_id"), table_name="power_usage_forecasts")
+    op.drop_table("power_usage_forecasts")
@@ -0,0 +1,29 @@
+"""Use database UTC clock for alert rule timestamps
+
+Revision ID: b7e1d3f5a9c2
+Revises: a2c4e6f8b0d1
+Create Date: 2025-02-10 14:06:51.308417
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b7e1d3f5a9c2"
+down_revision: Union[str, None] = "a2c4e6f8b0d1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 與設備相同，告警規則的時間戳記預設值改為資料庫的 UTC 時間
+    for column in ("created_at", "updated_at"):
+        op.alter_column("alert_rules", column, server_default=sa.text("timezone('utc', now())"))
+
+
+def downgrade() -> None:
+    for column in ("created_at", "updated_at"):
+        op.alter_column("alert_rules", column, server_default=sa.text("now()"))
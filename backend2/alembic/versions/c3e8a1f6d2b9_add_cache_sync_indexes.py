@@ -0,0 +1,28 @@
+"""Add cache sync indexes
+
+Revision ID: c3e8a1f6d2b9
+Revises: b7e1d3f5a9c2
+Create Date: 2025-02-12 10:37:15.942861
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c3e8a1f6d2b9"
+down_revision: Union[str, None] = "b7e1d3f5a9c2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 行程內快取同步依 updated_at 水位讀取所有使用者的設備與告警規則變更
+    op.create_index("idx_devices_updated_at", "devices", ["updated_at"], unique=False)
+    op.create_index("idx_alert_rules_updated_at", "alert_rules", ["updated_at"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("idx_alert_rules_updated_at", table_name="alert_rules")
+    op.drop_index("idx_devices_updated_at", table_name="devices")
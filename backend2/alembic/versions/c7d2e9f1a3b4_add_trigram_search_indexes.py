@@ -0,0 +1,37 @@
+"""Add trigram search indexes
+
+Revision ID: c7d2e9f1a3b4
+Revises: b3f1c2d4e5a6
+Create Date: 2025-01-24 14:37:05.518326
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c7d2e9f1a3b4"
+down_revision: Union[str, None] = "b3f1c2d4e5a6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (索引名稱, 資料表, 欄位)
+TRGM_INDEXES = [
+    ("idx_users_username_trgm", "users", "username"),
+    ("idx_users_email_trgm", "users", "email"),
+    ("idx_devices_name_trgm", "devices", "name"),
+    ("idx_devices_device_id_trgm", "devices", "device_id"),
+    ("idx_devices_location_trgm", "devices", "location"),
+]
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, column in TRGM_INDEXES:
+        op.create_index(name, table, [column], unique=False, postgresql_using="gin", postgresql_ops={column: "gin_trgm_ops"})
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(TRGM_INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,25 @@
+"""Add device sync index
+
+Revision ID: d4a8b6c2e7f9
+Revises: c7d2e9f1a3b4
+Create Date: 2025-01-27 09:21:48.630174
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d4a8b6c2e7f9"
+down_revision: Union[str, None] = "c7d2e9f1a3b4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("idx_devices_user_updated", "devices", ["user_id", "updated_at", "id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("idx_devices_user_updated", table_name="devices")
@@ -0,0 +1,35 @@
+"""Add soft delete partial indexes
+
+Revision ID: e5b9c3d7f1a2
+Revises: d4a8b6c2e7f9
+Create Date: 2025-01-29 16:05:12.447918
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e5b9c3d7f1a2"
+down_revision: Union[str, None] = "d4a8b6c2e7f9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (索引名稱, 資料表, 欄位)，只索引未刪除的資料列
+# users 的 username 與 email 已有包含已刪除使用者的唯一索引（已刪除的使用者仍佔用），不另建部分索引
+PARTIAL_INDEXES = [
+    ("idx_devices_user_live", "devices", ["user_id", "id"]),
+    ("idx_power_usage_records_device_live", "power_usage_records", ["device_id", "timestamp"]),
+]
+
+
+def upgrade() -> None:
+    for name, table, columns in PARTIAL_INDEXES:
+        op.create_index(name, table, columns, unique=False, postgresql_where=sa.text("deleted_at IS NULL"))
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(PARTIAL_INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,45 @@
+"""Add alert rules table
+
+Revision ID: f1d7a9c4b3e8
+Revises: e5b9c3d7f1a2
+Create Date: 2025-02-03 11:42:57.180364
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f1d7a9c4b3e8"
+down_revision: Union[str, None] = "e5b9c3d7f1a2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "alert_rules",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("device_id", sa.Integer(), nullable=True),
+        sa.Column("metric", sa.String(length=20), nullable=False),
+        sa.Column("threshold", sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.Column("is_active", sa.Boolean(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()"), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.text("now()"), nullable=True),
+        sa.ForeignKeyConstraint(["device_id"], ["devices.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_alert_rules_id"), "alert_rules", ["id"], unique=False)
+    op.create_index("idx_alert_rules_user_metric", "alert_rules", ["user_id", "metric"], unique=False)
+    op.create_index("idx_alert_rules_device_metric", "alert_rules", ["device_id", "metric"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("idx_alert_rules_device_metric", table_name="alert_rules")
+    op.drop_index("idx_alert_rules_user_metric", table_name="alert_rules")
+    op.drop_index(op.f("ix_alert_rules_id"), table_name="alert_rules")
+    op.drop_table("alert_rules")
@@ -0,0 +1,156 @@
+"""
+告警 API 路由模組
+提供查詢目前使用者設備告警與管理門檻告警規則的 HTTP API 端點
+"""
+
+from datetime import datetime
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from ..database.replicas import get_read_db
+from ..database.session import get_db
+from ..middleware.auth import get_current_active_user
+from ..models.user import User
+from ..services.alerts import alert_hub
+from ..services.device import DeviceService
+from ..services.rules import AlertRuleService
+
+router = APIRouter()
+
+
+class AlertResponse(BaseModel):
+    """
+    告警資料回應模型
+    定義返回給客戶端的告警資料結構
+    """
+
+    kind: str  # 告警類型
+    device_id: int  # 設備 ID
+    message: str  # 告警訊息
+    value: float  # 觸發告警的數值
+    baseline: float  # 比較基準值
+    score: float  # 嚴重程度分數
+    timestamp: datetime  # 觸發告警的讀數時間
+    created_at: datetime  # 告警產生時間
+
+    class Config:
+        """啟用從物件屬性自動轉換"""
+
+        from_attributes = True
+
+
+class AlertRuleCreate(BaseModel):
+    """
+    告警規則創建請求模型
+    定義創建告警規則時需要的欄位
+    """
+
+    metric: Literal["usage", "daily_usage", "daily_cost", "offline"]  # 指標：單次讀數用電量、每日用電量、每日電費或離線分鐘數
+    threshold: float  # 門檻值；offline 為分鐘數
+    device_id: Optional[int] = None  # 套用的設備 ID，未提供時套用到所有設備
+
+
+class AlertRuleUpdate(BaseModel):
+    """
+    告警規則更新請求模型
+    定義可以更新的告警規則欄位
+    """
+
+    threshold: Optional[float] = None  # 門檻值
+    is_active: Optional[bool] = None  # 規則啟用狀態
+
+
+class AlertRuleResponse(BaseModel):
+    """
+    告警規則回應模型
+    定義返回給客戶端的告警規則資料結構
+    """
+
+    id: int  # 規則 ID
+    device_id: Optional[int]  # 套用的設備 ID，為空時套用到所有設備
+    metric: str  # 指標
+    threshold: float  # 門檻值
+    is_active: bool  # 規則啟用狀態
+    created_at: datetime  # 創建時間
+    updated_at: datetime  # 更新時間
+
+    class Config:
+        """啟用從 ORM 模型自動轉換"""
+
+        from_attributes = True
+
+
+def _raise_missing_rule(db: Session, rule_id: int) -> None:
+    """寫入未命中告警規則時查詢規則，以區分規則不存在與無權操作"""
+    if not AlertRuleService.get_rule(db, rule_id=rule_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="告警規則不存在")
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="無權操作此告警規則")
+
+
+@router.get("/alerts/rules", response_model=List[AlertRuleResponse])
+def list_alert_rules(current_user: User = Depends(get_current_active_user), db: Session = Depends(get_read_db)):
+    """
+    列出告警規則端點
+    返回當前使用者的所有告警規則
+    """
+    return AlertRuleService.list_rules(db, user_id=current_user.id)
+
+
+@router.post("/alerts/rules", response_model=AlertRuleResponse, status_code=status.HTTP_201_CREATED)
+def create_alert_rule(rule: AlertRuleCreate, current_user: User = Depends(get_current_active_user), db: Session = Depends(get_db)):
+    """
+    創建告警規則端點
+    為當前使用者的單一設備或所有設備建立門檻告警規則，創建後立即在寫入路徑上生效
+    """
+    if rule.threshold <= 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="門檻值必須大於 0")
+    if rule.device_id is not None:
+        device = DeviceService.get_device_by_id(db, device_id=rule.device_id)
+        if not device:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="設備不存在")
+        if device.user_id != current_user.id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="無權為此設備設定告警規則")
+
+    db_rule = AlertRuleService.create_rule(db, user_id=current_user.id, metric=rule.metric, threshold=rule.threshold, device_id=rule.device_id)
+    db.commit()
+    return db_rule
+
+
+@router.put("/alerts/rules/{rule_id}", response_model=AlertRuleResponse)
+def update_alert_rule(rule_id: int, rule_update: AlertRuleUpdate, current_user: User = Depends(get_current_active_user), db: Session = Depends(get_db)):
+    """
+    更新告警規則端點
+    更新門檻值或啟用狀態，需要確認規則所有權
+    """
+    if rule_update.threshold is not None and rule_update.threshold <= 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="門檻值必須大於 0")
+
+    rule = AlertRuleService.update_rule(db, user_id=current_user.id, rule_id=rule_id, **rule_update.dict(exclude_unset=True))
+    if rule is None:
+        _raise_missing_rule(db, rule_id)
+    db.commit()
+    return rule
+
+
+@router.delete("/alerts/rules/{rule_id}")
+def delete_alert_rule(rule_id: int, current_user: User = Depends(get_current_active_user), db: Session = Depends(get_db)):
+    """
+    刪除告警規則端點
+    刪除規則並立即停止評估，需要確認規則所有權
+    """
+    if not AlertRuleService.delete_rule(db, user_id=current_user.id, rule_id=rule_id):
+        _raise_missing_rule(db, rule_id)
+    db.commit()
+    return {"message": "告警規則已刪除"}
+
+
+@router.get("/alerts", response_model=List[AlertResponse])
+def list_alerts(kind: Optional[str] = None, min_value: Optional[float] = None, min_score: Optional[float] = None, limit: int = 50, current_user: User = Depends(get_current_active_user)):
+    """
+    查詢最近告警端點
+    返回當前使用者設備的最近告警，可依類型、最低讀數（對應前端用電警告閾值）與最低分數過濾
+    """
+    return alert_hub.recent(current_user.id, kind=kind, min_value=min_value, min_score=min_score, limit=limit)
@@ -0,0 +1,117 @@
+"""
+儀表板 API 路由模組
+提供節能管家頁面的單一快照端點，一次返回即時用電、用電趨勢、費用統計、用電預測與設備用電分布
+"""
+
+import asyncio
+from datetime import date, datetime
+from typing import Callable, List, Literal, Optional, TypeVar
+
+from fastapi import APIRouter, Depends
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+
+from ..config import settings
+from ..database.replicas import read_replicas
+from ..middleware.auth import get_current_active_user
+from ..models.user import User
+from ..services.dashboard import DashboardService, dashboard_snapshots
+from ..services.device import DeviceService
+from ..services.forecast import ForecastService
+from .device import CurrentPowerItem, ForecastResponse
+
+router = APIRouter()
+
+T = TypeVar("T")
+
+
+class DashboardCurrent(BaseModel):
+    """
+    即時用電區塊模型
+    定義各設備最新讀數的合計、相對前一小時的變化與用電狀態
+    """
+
+    usage: float  # 各設備最新讀數的用電量合計
+    trend: float  # 最近一小時用電量相對前一小時的變化百分比
+    status: Literal["normal", "high", "low"]  # 用電狀態
+    devices: List[CurrentPowerItem]  # 有近期讀數的設備
+
+
+class DashboardDay(BaseModel):
+    """
+    用電趨勢項目模型
+    定義本月單日與上個月同一天的用電量
+    """
+
+    date: date  # 日期
+    usage: float  # 當日用電量
+    last_month: float  # 上個月同一天的用電量
+
+
+class DashboardCosts(BaseModel):
+    """
+    費用統計區塊模型
+    定義本月至今電費、本月預估、上月電費與節省金額
+    """
+
+    month_to_date: float  # 本月至今電費
+    estimated: float  # 本月預估電費
+    last_month: float  # 上月電費
+    saved: float  # 本月預估相對上月節省的金額
+
+
+class DashboardDeviceShare(BaseModel):
+    """
+    設備用電分布項目模型
+    定義單一設備（或其他設備合計）的本月用電量與佔比
+    """
+
+    device_id: Optional[int] = None  # 設備 ID，其他設備合計時為空
+    name: str  # 設備名稱
+    usage: float  # 本月累計用電量
+    percentage: float  # 佔本月用電量的百分比
+
+
+class DashboardResponse(BaseModel):
+    """
+    儀表板快照回應模型
+    定義節能管家頁面所需的所有區塊
+    """
+
+    generated_at: datetime  # 快照產生時間
+    current: DashboardCurrent  # 即時用電
+    daily: List[DashboardDay]  # 本月每日用電趨勢
+    costs: DashboardCosts  # 費用統計
+    forecast: ForecastResponse  # 下期用電預測
+    devices: List[DashboardDeviceShare]  # 設備用電分布
+
+
+def _with_read_session(fn: Callable[..., T], *args) -> T:
+    """在獨立的唯讀 session 中執行查詢；各區塊在不同執行緒並行，不能共用同一個 session"""
+    db = read_replicas.session()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+
+async def _build_snapshot(user_id: int) -> dict:
+    """並行查詢各區塊後組合快照"""
+    now = datetime.utcnow()
+    current, hourly, daily, forecasts, top_devices = await asyncio.gather(
+        run_in_threadpool(_with_read_session, DeviceService.get_current_power, user_id),
+        run_in_threadpool(_with_read_session, DashboardService.get_hourly_usage, user_id, now),
+        run_in_threadpool(_with_read_session, DashboardService.get_daily_usage, user_id, now),
+        run_in_threadpool(_with_read_session, ForecastService.get_user_forecast, user_id),
+        run_in_threadpool(_with_read_session, DashboardService.get_top_devices, user_id, settings.DASHBOARD_TOP_DEVICES),
+    )
+    return DashboardService.assemble(now, current, hourly, daily, forecasts, top_devices)
+
+
+@router.get("/dashboard", response_model=DashboardResponse)
+async def get_dashboard(current_user: User = Depends(get_current_active_user)):
+    """
+    儀表板快照端點
+    一次返回節能管家頁面的所有區塊，各區塊並行查詢；快照依使用者快取 DASHBOARD_CACHE_SECONDS 秒
+    """
+    return await dashboard_snapshots.get_or_compute(current_user.id, lambda: _build_snapshot(current_user.id))
@@ -3,17 +3,27 @@
 提供設備相關的 HTTP API 端點，包括設備管理、狀態更新和用電量記錄等功能
 """
 
-from datetime import datetime
-from typing import List, Optional
-
-from fastapi import APIRouter, Depends, HTTPException, status
-from pydantic import BaseModel
+import csv
+import io
+from datetime import date, datetime
+from typing import List, Literal, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
 from sqlalchemy.orm import Session
 
+from ..config import settings
+from ..database.replicas import get_read_db
 from ..database.session import get_db
 from ..middleware.auth import get_current_active_user
+from ..middleware.rate_limit import rate_limit_device_writes
 from ..models.user import User
 from ..services.device import DeviceService
+from ..services.forecast import ForecastService
+from ..services.pagination import decode_cursor, encode_cursor
+from ..services.rankings import SCOPE_LOCATION, SCOPE_USER, period_start
+from ..services.series import compress, encode_series, negotiate_media_type
 
 router = APIRouter()
 
@@ -62,6 +72,45 @@ class PowerUsageRecord(BaseModel):
     cost: float  # 用電成本
 
 
+class DeviceSelector(BaseModel):
+    """
+    設備批次選取條件模型
+    以設備 ID 清單、位置或類型選取設備，多個條件同時成立才會被選取，至少需要一個條件
+    """
+
+    ids: Optional[List[int]] = None  # 設備 ID 清單（選填）
+    location: Optional[str] = None  # 設備位置（選填）
+    type: Optional[str] = None  # 設備類型（選填）
+
+
+class BulkStatusUpdate(DeviceSelector):
+    """
+    批次狀態更新請求模型
+    定義選取條件與新的設備狀態
+    """
+
+    status: str  # 設備狀態（例如：online, offline, maintenance）
+
+
+class BulkLocationUpdate(DeviceSelector):
+    """
+    批次位置變更請求模型
+    定義選取條件與新的設備位置
+    """
+
+    new_location: Optional[str] = None  # 新的設備位置
+
+
+class BulkOperationResult(BaseModel):
+    """
+    批次操作結果回應模型
+    定義受影響的設備數與設備 ID
+    """
+
+    affected: int  # 受影響的設備數
+    ids: List[int]  # 受影響的設備 ID
+
+
 class DeviceResponse(BaseModel):
     """
     設備資料回應模型
@@ -87,21 +136,278 @@ class DeviceResponse(BaseModel):
         from_attributes = True
 
 
+class DeviceTombstone(BaseModel):
+    """
+    設備墓碑回應模型
+    定義差異同步中已刪除設備的資料結構
+    """
+
+    id: int  # 設備 ID
+    deleted_at: datetime  # 刪除時間
+
+    class Config:
+        """啟用從 ORM 模型自動轉換"""
+
+        from_attributes = True
+
+
+class DeviceChangesResponse(BaseModel):
+    """
+    設備差異同步回應模型
+    定義自同步權杖之後變更與刪除的設備，以及下一次同步使用的權杖
+    """
+
+    changed: List[DeviceResponse]  # 新增或更新的設備
+    deleted: List[DeviceTombstone]  # 已刪除的設備
+    next_token: Optional[str] = None  # 下一次同步使用的權杖
+    has_more: bool  # 是否還有未返回的變更，為真時應立即以 next_token 繼續同步
+
+
+class DeviceSearchItem(DeviceResponse):
+    """
+    設備搜尋結果項目模型
+    在設備資料之外附上相似度分數
+    """
+
+    score: float  # 相似度分數（0 到 1）
+
+
+class DeviceSearchResponse(BaseModel):
+    """
+    設備搜尋回應模型
+    定義搜尋結果與下一頁游標
+    """
+
+    items: List[DeviceSearchItem]  # 依相似度排序的搜尋結果
+    next_cursor: Optional[str] = None  # 下一頁游標，沒有下一頁時為空
+
+
+class DeviceForecast(BaseModel):
+    """
+    設備預測回應模型
+    定義單一設備的下期用電量與電費預測
+    """
+
+    device_id: int  # 設備 ID
+    predicted_usage: float  # 預測用電量
+    predicted_cost: float  # 預測電費
+
+    class Config:
+        """啟用從 ORM 模型自動轉換"""
+
+        from_attributes = True
+
+
+class ForecastResponse(BaseModel):
+    """
+    用電預測回應模型
+    定義返回給 PowerTrend 與 CostOverview 的預測期間、總計與各設備預測
+    """
+
+    period_start: Optional[date]  # 預測期間起始日
+    period_end: Optional[date]  # 預測期間結束日（不含）
+    predicted_usage: float  # 預測總用電量
+    predicted_cost: float  # 預測總電費
+    generated_at: Optional[datetime]  # 預測產生時間
+    devices: List[DeviceForecast]  # 各設備預測
+
+
+class CurrentPowerItem(BaseModel):
+    """
+    設備即時用電回應模型
+    定義單一設備最新一筆讀數
+    """
+
+    device_id: int  # 設備 ID
+    usage: float  # 最新讀數的用電量
+    cost: float  # 最新讀數的電費
+    timestamp: datetime  # 最新讀數時間
+
+
+class CurrentPowerResponse(BaseModel):
+    """
+    即時用電回應模型
+    定義使用者所有設備的最新讀數與合計
+    """
+
+    total_usage: float  # 各設備最新讀數的用電量合計
+    devices: List[CurrentPowerItem]  # 有近期讀數的設備
+
+
+class RankingItem(BaseModel):
+    """
+    用電排行項目回應模型
+    定義排行中單一設備的名次與期間累計用電量
+    """
+
+    rank: int  # 名次
+    id: int  # 設備 ID
+    device_id: str  # 設備唯一識別碼
+    name: str  # 設備名稱
+    location: Optional[str]  # 設備位置
+    usage: float  # 期間累計用電量
+
+
+class RankingResponse(BaseModel):
+    """
+    用電排行回應模型
+    定義排行的期間與依用電量排序的設備
+    """
+
+    window: str  # 排行期間：day、week 或 month
+    period_start: date  # 期間起始日（UTC）
+    items: List[RankingItem]  # 依用電量由高到低排序的設備
+
+
+class DeviceImportItem(BaseModel):
+    """
+    批次匯入成功項目模型
+    定義匯入成功的資料列與新建設備的對應
+    """
+
+    row: int  # 匯入資料的列號（從 1 開始）
+    id: int  # 新建設備的 ID
+    device_id: str  # 設備唯一識別碼
+
+
+class DeviceImportError(BaseModel):
+    """
+    批次匯入錯誤項目模型
+    定義匯入失敗的資料列與失敗原因
+    """
+
+    row: int  # 匯入資料的列號（從 1 開始）
+    device_id: Optional[str] = None  # 設備唯一識別碼（可辨識時）
+    error: str  # 失敗原因
+
+
+class DeviceImportResult(BaseModel):
+    """
+    批次匯入結果回應模型
+    定義批次匯入的成功筆數、成功項目與逐列錯誤
+    """
+
+    created: int  # 成功建立的設備數
+    devices: List[DeviceImportItem]  # 成功項目
+    errors: List[DeviceImportError]  # 逐列錯誤
+
+
+async def _read_import_rows(request: Request) -> List[dict]:
+    """
+    讀取批次匯入資料
+    支援 multipart 上傳的 CSV 檔案（欄位 file）、text/csv 請求本文與 JSON 陣列
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="請上傳 CSV 檔案")
+        text = (await upload.read()).decode("utf-8-sig")
+    elif content_type.startswith("text/csv"):
+        text = (await request.body()).decode("utf-8-sig")
+    else:
+        try:
+            rows = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="無效的 JSON 格式")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="匯入資料必須是陣列")
+        return rows
+
+    # CSV 的空白欄位視為未填
+    return [{key.strip(): (value.strip() or None) if isinstance(value, str) else value for key, value in row.items() if key} for row in csv.DictReader(io.StringIO(text))]
+
+
 @router.post("/devices", response_model=DeviceResponse, status_code=status.HTTP_201_CREATED)
 def create_device(device: DeviceCreate, current_user: User = Depends(get_current_active_user), db: Session = Depends(get_db)):
     """
     創建設備端點
     為當前使用者創建新的設備，並確保設備 ID 不重複
     """
-    db_device = DeviceService.get_device_by_device_id(db, device_id=device.device_id)
+    db_device = DeviceService.get_device_by_device_id(db, device_id=device.device_id, include_deleted=True)
     if db_device:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="設備ID已被使用")
 
-    return DeviceService.create_device(db=db, user_id=current_user.id, name=device.name, device_id=device.device_id, type=device.type, location=device.location, description=device.description)
+    db_device = DeviceService.create_device(db=db, user_id=current_user.id, name=device.name, device_id=device.device_id, type=device.type, location=device.location, description=device.description)
+    db.commit()
+    return db_device
+
+
+@router.post("/devices/import", response_model=DeviceImportResult)
+async def import_devices(request: Request, current_user: User = Depends(get_current_active_user), db: Session = Depends(get_db)):
+    """
+    批次匯入設備端點
+    接受 CSV 或 JSON 陣列，逐列驗證欄位後整批寫入，並回報每一列的錯誤
+    """
+    rows = await _read_import_rows(request)
+    if len(rows) > settings.DEVICE_IMPORT_MAX_ROWS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"單次最多匯入 {settings.DEVICE_IMPORT_MAX_ROWS} 筆設備")
+
+    valid: List[Tuple[int, dict]] = []
+    errors: List[DeviceImportError] = []
+    for row, data in enumerate(rows, start=1):
+        try:
+            valid.append((row, DeviceCreate.model_validate(data).model_dump()))
+        except ValidationError as e:
+            device_id = data.get("device_id") if isinstance(data, dict) else None
+            message = "; ".join(f"{'.'.join(str(loc) for loc in error['loc']) or 'row'}: {error['msg']}" for error in e.errors())
+            errors.append(DeviceImportError(row=row, device_id=device_id if isinstance(device_id, str) else None, error=message))
+
+    created, failed = await run_in_threadpool(DeviceService.bulk_create_devices, db, current_user.id, valid)
+    await run_in_threadpool(db.commit)
+    errors.extend(DeviceImportError(row=row, device_id=device_id, error=error) for row, device_id, error in failed)
+    errors.sort(key=lambda error: error.row)
+
+    return {
+        "created": len(created),
+        "devices": [{"row": row, "id": id, "device_id": device_id} for row, id, device_id in created],
+        "errors": errors,
+    }
+
+
+def _selector_filters(selector: DeviceSelector) -> dict:
+    """取出批次選取條件，未指定任何條件時拒絕請求以避免誤改全部設備"""
+    if selector.ids is None and selector.location is None and selector.type is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="請至少指定一個選取條件")
+    return {"ids": selector.ids, "location": selector.location, "type": selector.type}
+
+
+@router.post("/devices/bulk/status", response_model=BulkOperationResult)
+def bulk_update_device_status(update: BulkStatusUpdate, current_user: User = Depends(get_current_active_user), db: Session = Depends(get_db)):
+    """
+    批次更新設備狀態端點
+    更新當前使用者符合條件的所有設備狀態，例如將某樓層設備標記為維護中
+    """
+    ids = DeviceService.bulk_update_status(db, user_id=current_user.id, status=update.status, **_selector_filters(update))
+    db.commit()
+    return {"affected": len(ids), "ids": ids}
+
+
+@router.post("/devices/bulk/delete", response_model=BulkOperationResult)
+def bulk_delete_devices(selector: DeviceSelector, current_user: User = Depends(get_current_active_user), db: Session = Depends(get_db)):
+    """
+    批次刪除設備端點
+    軟刪除當前使用者符合條件的所有設備
+    """
+    ids = DeviceService.bulk_delete_devices(db, user_id=current_user.id, **_selector_filters(selector))
+    db.commit()
+    return {"affected": len(ids), "ids": ids}
+
+
+@router.post("/devices/bulk/location", response_model=BulkOperationResult)
+def bulk_update_device_location(update: BulkLocationUpdate, current_user: User = Depends(get_current_active_user), db: Session = Depends(get_db)):
+    """
+    批次變更設備位置端點
+    將當前使用者符合條件的所有設備移到新的位置
+    """
+    ids = DeviceService.bulk_update_location(db, user_id=current_user.id, new_location=update.new_location, **_selector_filters(update))
+    db.commit()
+    return {"affected": len(ids), "ids": ids}
 
 
 @router.get("/devices", response_model=List[DeviceResponse])
-def list_devices(skip: int = 0, limit: int = 10, current_user: User = Depends(get_current_active_user), db: Session = Depends(get_db)):
+def list_devices(skip: int = 0, limit: int = 10, current_user: User = Depends(get_current_active_user), db: Session = Depends(get_read_db)):
     """
     列出設備清單端點
     返回當前使用者的所有設備，支援分頁查詢
@@ -110,8 +416,115 @@ def list_devices(skip: int = 0, limit: int = 10, current_user: User = Depends(ge
     return devices
 
 
+# 差異同步固定使用主資料庫：複本延遲超過穩定界線時，尚未複寫的變更會落在已返回的同步權杖之前而永遠被略過
+@router.get("/devices/changes", response_model=DeviceChangesResponse)
+def list_device_changes(since: Optional[str] = None, limit: int = Query(100, ge=1, le=1000), current_user: User = Depends(get_current_active_user), db: Session = Depends(get_db)):
+    """
+    設備差異同步端點
+    返回同步權杖之後新增、更新或刪除的設備，讓客戶端以增量方式維護本地的設備清單；未提供權杖時返回所有設備
+    """
+    try:
+        after = decode_cursor(since, 2)
+        if after is not None:
+            after = (datetime.fromisoformat(after[0]), int(after[1]))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="無效的同步權杖")
+
+    devices = DeviceService.list_device_changes(db, user_id=current_user.id, since=after, limit=limit)
+    next_token = encode_cursor(devices[-1].updated_at.isoformat(), devices[-1].id) if devices else since
+    return {
+        "changed": [device for device in devices if device.deleted_at is None],
+        "deleted": [device for device in devices if device.deleted_at is not None],
+        "next_token": next_token,
+        "has_more": len(devices) == limit,
+    }
+
+
+@router.get("/devices/search", response_model=DeviceSearchResponse)
+def search_devices(q: str, limit: int = Query(20, ge=1, le=100), cursor: Optional[str] = None, current_user: User = Depends(get_current_active_user), db: Session = Depends(get_read_db)):
+    """
+    搜尋設備端點
+    依設備名稱、設備唯一識別碼或位置的部分字串模糊搜尋當前使用者的設備，結果依相似度排序並以游標分頁
+    """
+    try:
+        after = decode_cursor(cursor, 2)
+        if after is not None:
+            after = (float(after[0]), int(after[1]))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="無效的游標")
+
+    results = DeviceService.search_devices(db, user_id=current_user.id, query=q, limit=limit, after=after)
+    items = [{**DeviceResponse.model_validate(device).model_dump(), "score": score} for device, score in results]
+    next_cursor = encode_cursor(results[-1][1], results[-1][0].id) if len(results) == limit else None
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@router.get("/devices/forecast", response_model=ForecastResponse)
+def get_power_usage_forecast(current_user: User = Depends(get_current_active_user), db: Session = Depends(get_read_db)):
+    """
+    查詢用電預測端點
+    返回批次工作預先計算的下期用電量與電費預測；尚未產生預測時各欄位為空
+    """
+    forecasts = ForecastService.get_user_forecast(db, user_id=current_user.id)
+    return ForecastService.summarize(forecasts)
+
+
+@router.get("/devices/current-power", response_model=CurrentPowerResponse)
+def get_current_power(current_user: User = Depends(get_current_active_user), db: Session = Depends(get_read_db)):
+    """
+    查詢即時用電端點
+    返回使用者各設備最近 24 小時內的最新讀數，由記憶體中的近期讀數緩衝回答
+    """
+    devices = DeviceService.get_current_power(db, user_id=current_user.id)
+    return {"total_usage": sum(device["usage"] for device in devices), "devices": devices}
+
+
+@router.get("/devices/rankings", response_model=RankingResponse)
+def get_usage_rankings(
+    window: Literal["day", "week", "month"] = "day",
+    location: Optional[str] = None,
+    user_id: Optional[int] = None,
+    limit: int = Query(settings.RANKING_SIZE, ge=1, le=settings.RANKING_SIZE),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_read_db),
+):
+    """
+    查詢用電排行端點
+    返回今日、本週或本月用電量最高的設備；預設為當前使用者的排行，指定 location 時為該使用者在此位置的排行
+    位置排行只包含同一使用者的設備，查詢其他使用者的排行僅限管理員
+    """
+    if user_id is not None and user_id != current_user.id and current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="權限不足")
+
+    owner_id = user_id or current_user.id
+    scope, scope_id = (SCOPE_LOCATION, (owner_id, location)) if location is not None else (SCOPE_USER, owner_id)
+    leaders = DeviceService.get_usage_rankings(db, scope=scope, scope_id=scope_id, window=window, limit=limit)
+    items = [{"rank": rank, "id": device.id, "device_id": device.device_id, "name": device.name, "location": device.location, "usage": total} for rank, (device, total) in enumerate(leaders, start=1)]
+    return {"window": window, "period_start": period_start(window, datetime.utcnow()), "items": items}
+
+
+@router.get("/devices/total-usage")
+def get_total_power_usage(start_time: datetime, end_time: datetime, current_user: User = Depends(get_current_active_user), db: Session = Depends(get_read_db)):
+    """
+    查詢總用電量端點
+    計算指定時間範圍內所有設備的總用電量
+    """
+    total = DeviceService.get_total_power_usage(db, user_id=current_user.id, start_time=start_time, end_time=end_time)
+    return {"total_usage": total}
+
+
+def _raise_missing_device(db: Session, device_id: int, forbidden_detail: str) -> None:
+    """
+    寫入未命中設備時回報原因
+    所有權條件寫在寫入語句的 WHERE 中，只有未命中時才查詢設備以區分設備不存在與無權操作
+    """
+    if not DeviceService.get_device_by_id(db, device_id=device_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="設備不存在")
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=forbidden_detail)
+
+
 @router.get("/devices/{device_id}", response_model=DeviceResponse)
-def get_device(device_id: int, current_user: User = Depends(get_current_active_user), db: Session = Depends(get_db)):
+def get_device(device_id: int, current_user: User = Depends(get_current_active_user), db: Session = Depends(get_read_db)):
     """
     獲取設備詳情端點
     返回指定設備的詳細資訊，需要確認設備所有權
@@ -130,14 +543,12 @@ def update_device(device_id: int, device_update: DeviceUpdate, current_user: Use
     更新設備資訊端點
     更新指定設備的基本資訊，需要確認設備所有權
     """
-    device = DeviceService.get_device_by_id(db, device_id=device_id)
-    if not device:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="設備不存在")
-    if device.user_id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="無權修改此設備")
-
     update_data = device_update.dict(exclude_unset=True)
-    return DeviceService.update_device(db, device, **update_data)
+    device = DeviceService.update_device(db, user_id=current_user.id, device_id=device_id, **update_data)
+    if device is None:
+        _raise_missing_device(db, device_id, "無權修改此設備")
+    db.commit()
+    return device
 
 
 @router.delete("/devices/{device_id}")
@@ -146,52 +557,44 @@ def delete_device(device_id: int, current_user: User = Depends(get_current_activ
     刪除設備端點
     刪除指定的設備（軟刪除），需要確認設備所有權
     """
-    device = DeviceService.get_device_by_id(db, device_id=device_id)
-    if not device:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="設備不存在")
-    if device.user_id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="無權刪除此設備")
-
-    DeviceService.delete_device(db, device)
+    if not DeviceService.delete_device(db, user_id=current_user.id, device_id=device_id):
+        _raise_missing_device(db, device_id, "無權刪除此設備")
+    db.commit()
     return {"message": "設備已刪除"}
 
 
-@router.put("/devices/{device_id}/status", response_model=DeviceResponse)
+@router.put("/devices/{device_id}/status", response_model=DeviceResponse, dependencies=[Depends(rate_limit_device_writes)])
 def update_device_status(device_id: int, status_update: DeviceStatus, current_user: User = Depends(get_current_active_user), db: Session = Depends(get_db)):
     """
     更新設備狀態端點
     更新設備的在線狀態，需要確認設備所有權
     """
-    device = DeviceService.get_device_by_id(db, device_id=device_id)
-    if not device:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="設備不存在")
-    if device.user_id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="無權修改此設備狀態")
-
-    return DeviceService.update_device_status(db, device, status_update.status)
+    device = DeviceService.update_device_status(db, user_id=current_user.id, device_id=device_id, status=status_update.status)
+    if device is None:
+        _raise_missing_device(db, device_id, "無權修改此設備狀態")
+    db.commit()
+    return device
 
 
-@router.post("/devices/{device_id}/usage")
+@router.post("/devices/{device_id}/usage", dependencies=[Depends(rate_limit_device_writes)])
 def record_power_usage(device_id: int, usage_record: PowerUsageRecord, current_user: User = Depends(get_current_active_user), db: Session = Depends(get_db)):
     """
     記錄用電量端點
     為指定設備記錄用電量和成本，需要確認設備所有權
     """
-    device = DeviceService.get_device_by_id(db, device_id=device_id)
-    if not device:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="設備不存在")
-    if device.user_id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="無權記錄此設備用電量")
-
-    DeviceService.record_power_usage(db, device_id=device_id, usage=usage_record.usage, timestamp=usage_record.timestamp, cost=usage_record.cost)
+    record_id = DeviceService.record_power_usage(db, user_id=current_user.id, device_id=device_id, usage=usage_record.usage, timestamp=usage_record.timestamp, cost=usage_record.cost)
+    if record_id is None:
+        _raise_missing_device(db, device_id, "無權記錄此設備用電量")
+    db.commit()
     return {"message": "用電量記錄成功"}
 
 
 @router.get("/devices/{device_id}/usage")
-def get_device_power_usage(device_id: int, start_time: datetime, end_time: datetime, current_user: User = Depends(get_current_active_user), db: Session = Depends(get_db)):
+def get_device_power_usage(request: Request, device_id: int, start_time: datetime, end_time: datetime, current_user: User = Depends(get_current_active_user), db: Session = Depends(get_read_db)):
     """
     查詢設備用電量端點
     查詢指定時間範圍內的設備用電量記錄，需要確認設備所有權
+    依 Accept 標頭返回 JSON、Apache Arrow IPC（application/vnd.apache.arrow.stream）或緊湊二進位格式（application/vnd.ecoshare.usage-series），並依 Accept-Encoding 壓縮
     """
     device = DeviceService.get_device_by_id(db, device_id=device_id)
     if not device:
@@ -199,15 +602,13 @@ def get_device_power_usage(device_id: int, start_time: datetime, end_time: datet
     if device.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="無權查看此設備用電量")
 
-    records = DeviceService.get_device_power_usage(db, device_id=device_id, start_time=start_time, end_time=end_time)
-    return records
+    columns = DeviceService.get_device_power_usage_columns(db, device_id=device_id, start_time=start_time, end_time=end_time)
+    media_type = negotiate_media_type(request.headers.get("accept", ""))
+    body, encoding = compress(encode_series(media_type, device_id, columns), request.headers.get("accept-encoding", ""))
 
+    # Vary 讓快取依格式與壓縮方式區分回應
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=media_type, headers=headers)
 
-@router.get("/devices/total-usage")
-def get_total_power_usage(start_time: datetime, end_time: datetime, current_user: User = Depends(get_current_active_user), db: Session = Depends(get_db)):
-    """
-    查詢總用電量端點
-    計算指定時間範圍內所有設備的總用電量
-    """
-    total = DeviceService.get_total_power_usage(db, user_id=current_user.id, start_time=start_time, end_time=end_time)
-    return {"total_usage": total}
@@ -3,17 +3,20 @@
 提供使用者相關的 HTTP API 端點，包括註冊、登入、個人資料管理等功能
 """
 
-from datetime import timedelta
-from typing import List
+from datetime import datetime, timedelta
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel, EmailStr
 from sqlalchemy.orm import Session
 
 from ..config import settings
+from ..database.replicas import get_read_db
 from ..database.session import get_db
-from ..middleware.auth import create_access_token, get_current_active_user
+from ..middleware.auth import create_access_token, get_current_active_user, get_current_admin_user, verify_password
+from ..services.pagination import decode_cursor, encode_cursor
+from ..services.tasks import task_runner
 from ..services.user import UserService
 
 router = APIRouter()
@@ -70,6 +73,25 @@ class UserResponse(BaseModel):
         from_attributes = True
 
 
+class UserSearchItem(UserResponse):
+    """
+    使用者搜尋結果項目模型
+    在使用者資料之外附上相似度分數
+    """
+
+    score: float  # 相似度分數（0 到 1）
+
+
+class UserSearchResponse(BaseModel):
+    """
+    使用者搜尋回應模型
+    定義搜尋結果與下一頁游標
+    """
+
+    items: List[UserSearchItem]  # 依相似度排序的搜尋結果
+    next_cursor: Optional[str] = None  # 下一頁游標，沒有下一頁時為空
+
+
 class Token(BaseModel):
     """
     JWT Token 回應模型
@@ -86,15 +108,17 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
     使用者註冊端點
     創建新的使用者帳號，並檢查使用者名稱和電子郵件是否已被使用
     """
-    db_user = UserService.get_user_by_username(db, username=user.username)
+    db_user = UserService.get_user_by_username(db, username=user.username, include_deleted=True)
     if db_user:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="用戶名已被使用")
 
-    db_user = UserService.get_user_by_email(db, email=user.email)
+    db_user = UserService.get_user_by_email(db, email=user.email, include_deleted=True)
     if db_user:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="電子郵件已被使用")
 
-    return UserService.create_user(db=db, username=user.username, password=user.password, email=user.email, phone=user.phone)
+    db_user = UserService.create_user(db=db, username=user.username, password=user.password, email=user.email, phone=user.phone)
+    db.commit()
+    return db_user
 
 
 @router.post("/login", response_model=Token)
@@ -114,7 +138,8 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(data={"sub": str(user.id)}, expires_delta=access_token_expires)
 
-    UserService.update_last_login(db, user)
+    # 最後登入時間不影響回應內容，交由背景工作批次寫入
+    task_runner.submit("stamp_last_login", (user.id, datetime.utcnow()))
 
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -135,12 +160,14 @@ def update_profile(user_update: UserUpdate, current_user=Depends(get_current_act
     更新當前登入使用者的資料，並確保電子郵件不重複
     """
     if user_update.email:
-        db_user = UserService.get_user_by_email(db, email=user_update.email)
+        db_user = UserService.get_user_by_email(db, email=user_update.email, include_deleted=True)
         if db_user and db_user.id != current_user.id:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="電子郵件已被使用")
 
     update_data = user_update.dict(exclude_unset=True)
-    return UserService.update_user(db, current_user, **update_data)
+    user = UserService.update_user(db, current_user, **update_data)
+    db.commit()
+    return user
 
 
 @router.post("/change-password")
@@ -149,22 +176,39 @@ def change_password(password_data: PasswordChange, current_user=Depends(get_curr
     修改密碼端點
     驗證原密碼並更新為新密碼
     """
-    if not UserService.authenticate_user(db, current_user.username, password_data.old_password):
+    # 當前使用者已由認證載入，直接比對密碼雜湊，不需要再查詢一次
+    if not verify_password(password_data.old_password, current_user.password):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="原密碼錯誤")
 
     UserService.update_password(db, current_user, password_data.new_password)
+    db.commit()
     return {"message": "密碼修改成功"}
 
 
 @router.get("/users", response_model=List[UserResponse])
-# def list_users(skip: int = 0, limit: int = 10, current_user=Depends(get_current_active_user), db: Session = Depends(get_db)):
-def list_users(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
+def list_users(skip: int = 0, limit: int = 10, include_deleted: bool = False, current_user=Depends(get_current_admin_user), db: Session = Depends(get_read_db)):
     """
     列出使用者清單端點
-    僅管理員可以訪問，支援分頁查詢
+    僅管理員可以訪問，支援分頁查詢；include_deleted 為真時包含已刪除的使用者
     """
-    # if current_user.role != "admin":
-    #     raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="權限不足")
-
-    users, _ = UserService.list_users(db, skip=skip, limit=limit)
+    users, _ = UserService.list_users(db, skip=skip, limit=limit, include_deleted=include_deleted)
     return users
+
+
+@router.get("/users/search", response_model=UserSearchResponse)
+def search_users(q: str, limit: int = Query(20, ge=1, le=100), cursor: Optional[str] = None, current_user=Depends(get_current_admin_user), db: Session = Depends(get_read_db)):
+    """
+    搜尋使用者端點
+    僅管理員可以訪問，依使用者名稱或電子郵件的部分字串模糊搜尋，結果依相似度排序並以游標分頁
+    """
+    try:
+        after = decode_cursor(cursor, 2)
+        if after is not None:
+            after = (float(after[0]), int(after[1]))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="無效的游標")
+
+    results = UserService.search_users(db, query=q, limit=limit, after=after)
+    items = [{**UserResponse.model_validate(user).model_dump(), "score": score} for user, score in results]
+    next_cursor = encode_cursor(results[-1][1], results[-1][0].id) if len(results) == limit else None
+    return {"items": items, "next_cursor": next_cursor}
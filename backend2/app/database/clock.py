@@ -0,0 +1,35 @@
+"""
+資料庫時鐘模組
+設備的 updated_at 是差異同步的水位，新增、更新、刪除與計算穩定界線必須使用同一個時鐘
+一律使用資料庫伺服器的目前時間並轉為 UTC，不受應用程式主機的時鐘偏移與資料庫連線的時區設定影響
+資料庫中的時間欄位皆為不帶時區的 UTC 時間，應用程式收到的時間以 naive_utc 轉換後再比較或寫入
+"""
+
+from datetime import datetime, timezone
+
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.types import DateTime
+
+
+class utc_now(FunctionElement):
+    """資料庫目前的 UTC 時間（不帶時區），PostgreSQL 上為交易開始的時間"""
+
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(utc_now, "postgresql")
+def _postgresql_utc_now(element, compiler, **kw) -> str:
+    return "timezone('utc', now())"
+
+
+@compiles(utc_now)
+def _default_utc_now(element, compiler, **kw) -> str:
+    # SQLite 的 CURRENT_TIMESTAMP 即為 UTC
+    return "CURRENT_TIMESTAMP"
+
+
+def naive_utc(value: datetime) -> datetime:
+    """將帶時區的時間轉為不帶時區的 UTC 時間，與資料庫中的時間欄位一致；不帶時區的時間視為 UTC 直接返回"""
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
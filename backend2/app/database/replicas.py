@@ -0,0 +1,175 @@
+"""
+唯讀複本路由模組
+唯讀路由透過 get_read_db 取得 session，依序輪流使用複寫延遲在容忍範圍內的複本，分散主資料庫的讀取負載
+複本的健康狀態與延遲定期檢查並快取；無法連線或延遲過大的複本暫時略過，沒有可用的複本時改用主資料庫
+未設定複本時 get_read_db 與 get_db 相同
+複本上讀到的資料可能落後主資料庫，需要永久保存的結果（例如已結算範圍的分析快取）只在 caught_up 確認複本已追上時才寫入
+"""
+
+import itertools
+import logging
+import threading
+import time
+from typing import Callable, Iterator, List, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, sessionmaker
+
+from ..config import settings
+from .session import SessionLocal, engine, make_engine
+
+logger = logging.getLogger(__name__)
+
+# 主資料庫目前的 WAL 位置，作為判斷複本是否已追上的基準
+PRIMARY_LSN_QUERY = text("SELECT pg_current_wal_lsn()::text")
+
+# PostgreSQL 複本的複寫延遲（秒），:primary_lsn 為查詢前在主資料庫取得的 WAL 位置
+# 已重播到主資料庫的 WAL 位置時沒有延遲（主資料庫閒置時最後重播時間過舊也不會誤判）；連線的資料庫不在復原模式（例如本機以主資料庫代替複本）時同樣視為沒有延遲
+# 尚未追上且 WAL 接收程序沒有在串流（與主資料庫斷線）時無法估計延遲，返回 NULL 視為不可用；已收到的 WAL 全部重播完不代表有主資料庫的所有提交
+POSTGRES_LAG_QUERY = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN pg_wal_lsn_diff(pg_last_wal_replay_lsn(), CAST(:primary_lsn AS pg_lsn)) >= 0 THEN 0 "
+    "WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN NULL "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+# 其他資料庫（例如本機以 SQLite 代替複本）只檢查連線，延遲視為 0
+GENERIC_LAG_QUERY = text("SELECT 0")
+
+REPLICA = "replica"
+"""Session.info 中保存複本索引的鍵名，主資料庫的 session 沒有此鍵"""
+
+
+def _primary_lsn() -> Optional[str]:
+    """查詢主資料庫目前的 WAL 位置；非 PostgreSQL 或查詢失敗時返回 None"""
+    if engine.dialect.name != "postgresql":
+        return None
+    try:
+        with engine.connect() as conn:
+            return conn.execute(PRIMARY_LSN_QUERY).scalar()
+    except SQLAlchemyError:
+        logger.warning("主資料庫 WAL 位置查詢失敗", exc_info=True)
+        return None
+
+
+def _lag_query(conn, primary_lsn: Optional[str]) -> Optional[float]:
+    """在連線上查詢複寫延遲（秒），無法估計時返回 None"""
+    if conn.dialect.name != "postgresql":
+        return float(conn.execute(GENERIC_LAG_QUERY).scalar() or 0)
+    lag = conn.execute(POSTGRES_LAG_QUERY, {"primary_lsn": primary_lsn}).scalar()
+    return None if lag is None else float(lag)
+
+
+class ReadReplicas:
+    """
+    唯讀複本路由
+    每個複本有獨立的引擎與連線池；選擇複本時從輪替的起點開始，取第一個健康且延遲在容忍範圍內的複本
+    """
+
+    def __init__(self, urls: Sequence[str], engine_factory: Callable[[str], Engine] = make_engine, max_lag_seconds: float = 5.0, check_interval_seconds: float = 5.0):
+        self.urls = list(urls)
+        self.engines: List[Engine] = [engine_factory(url) for url in self.urls]
+        self._sessionmakers = [sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine) for engine in self.engines]
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval_seconds = check_interval_seconds
+        self._lags: List[Optional[float]] = [None] * len(self.engines)  # 最近一次檢查的延遲，無法連線時為 None
+        self._checked: List[Optional[float]] = [None] * len(self.engines)  # 最近一次檢查的時間（time.monotonic）
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+
+    def lag(self, index: int, now: Optional[float] = None) -> Optional[float]:
+        """
+        返回複本的複寫延遲（秒），無法連線或與主資料庫斷線而無法估計時返回 None
+        檢查結果快取 check_interval_seconds 秒，期間內同時到達的請求不會重複檢查
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            checked = self._checked[index]
+            if checked is not None and now - checked < self.check_interval_seconds:
+                return self._lags[index]
+            self._checked[index] = now
+
+        primary_lsn = _primary_lsn()
+        try:
+            with self.engines[index].connect() as conn:
+                lag = _lag_query(conn, primary_lsn)
+            if lag is None:
+                logger.warning("唯讀複本 %d 與主資料庫斷線且尚未追上，暫時改用其他複本或主資料庫", index)
+        except SQLAlchemyError:
+            logger.warning("唯讀複本 %d 無法連線，暫時改用其他複本或主資料庫", index, exc_info=True)
+            lag = None
+        self._lags[index] = lag
+        return lag
+
+    def pick(self, max_lag_seconds: Optional[float] = None) -> Optional[int]:
+        """選擇延遲在容忍範圍內的複本，返回複本索引；沒有可用的複本時返回 None"""
+        if not self.engines:
+            return None
+        max_lag = self.max_lag_seconds if max_lag_seconds is None else max_lag_seconds
+        start = next(self._turn) % len(self.engines)
+        for offset in range(len(self.engines)):
+            index = (start + offset) % len(self.engines)
+            lag = self.lag(index)
+            if lag is not None and lag <= max_lag:
+                return index
+        return None
+
+    def session(self, max_lag_seconds: Optional[float] = None) -> Session:
+        """開啟唯讀查詢使用的 session，沒有可用的複本時開啟主資料庫的 session"""
+        index = self.pick(max_lag_seconds)
+        if index is None:
+            return SessionLocal()
+        session = self._sessionmakers[index]()
+        session.info[REPLICA] = index
+        return session
+
+    @staticmethod
+    def caught_up(db: Session) -> bool:
+        """
+        判斷 session 接下來讀到的資料是否包含主資料庫已提交的所有寫入
+        主資料庫的 session 一律為 True；複本的 session 先取得主資料庫目前的 WAL 位置，再在同一個連線上確認複本已重播到該位置（延遲為 0）時才為 True
+        健康檢查快取的延遲可能已過時，不作為依據；無法取得主資料庫的 WAL 位置或查詢失敗時視為未追上
+        """
+        if REPLICA not in db.info:
+            return True
+        primary_lsn = _primary_lsn()
+        if primary_lsn is None and db.get_bind().dialect.name == "postgresql":
+            return False
+        try:
+            return _lag_query(db.connection(), primary_lsn) == 0
+        except SQLAlchemyError:
+            logger.warning("唯讀複本 %d 延遲查詢失敗", db.info[REPLICA], exc_info=True)
+            return False
+
+    def dispose(self) -> None:
+        """釋放所有複本的連線池"""
+        for engine in self.engines:
+            engine.dispose()
+
+
+read_replicas = ReadReplicas(
+    settings.DATABASE_REPLICA_URLS,
+    engine_factory=lambda url: make_engine(url, pool_size=settings.REPLICA_POOL_SIZE, max_overflow=settings.REPLICA_MAX_OVERFLOW),
+    max_lag_seconds=settings.REPLICA_MAX_LAG_SECONDS,
+    check_interval_seconds=settings.REPLICA_HEALTH_CHECK_SECONDS,
+)
+"""全域唯讀複本路由實例"""
+
+
+def read_db(max_lag_seconds: Optional[float] = None) -> Callable[[], Iterator[Session]]:
+    """建立唯讀 session 依賴，可為個別路由指定可容忍的複寫延遲（秒）"""
+
+    def dependency() -> Iterator[Session]:
+        db = read_replicas.session(max_lag_seconds)
+        try:
+            yield db
+        finally:
+            db.close()
+
+    return dependency
+
+
+get_read_db = read_db()
+"""唯讀路由使用的 session 依賴，容忍延遲為 REPLICA_MAX_LAG_SECONDS"""
@@ -1,11 +1,26 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from ..config import settings
 
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def make_engine(url: str, pool_size: int = settings.DATABASE_POOL_SIZE, max_overflow: int = settings.DATABASE_MAX_OVERFLOW) -> Engine:
+    """
+    建立資料庫引擎
+    主資料庫、唯讀複本與用電紀錄分片共用此工廠，連線池的大小、回收時間與取出前檢查皆由設定調整
+    """
+    options = {"pool_pre_ping": settings.DATABASE_POOL_PRE_PING, "pool_recycle": settings.DATABASE_POOL_RECYCLE_SECONDS}
+    # 本機以 SQLite 代替資料庫時 SQLAlchemy 會選用 SQLite 專用的連線池，不套用連線數設定
+    if make_url(url).get_backend_name() != "sqlite":
+        options.update(pool_size=pool_size, max_overflow=max_overflow)
+    return create_engine(url, **options)
+
+
+engine = make_engine(settings.DATABASE_URL)
+# 寫入以 RETURNING 取回完整的資料列，提交後不需要再以 SELECT 重新載入物件
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 Base = declarative_base()
 
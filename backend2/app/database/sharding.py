@@ -0,0 +1,155 @@
+"""
+用電紀錄分片模組
+依設備 ID 的穩定雜湊將 power_usage_records 分散到多個資料庫，每個分片有獨立的引擎與連線池
+未設定分片時所有操作直接使用主資料庫的 session，行為與單一資料庫相同
+啟用分片時紀錄 ID 由主資料庫的序列統一配發，各分片的 ID 不會重複，重新分片時可保留原 ID
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, TypeVar
+
+from sqlalchemy import Column, Index, MetaData, Sequence, Table, create_engine, func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from ..config import settings
+from ..models.device import PowerUsageRecord
+from .session import make_engine
+
+T = TypeVar("T")
+W = TypeVar("W")
+
+RECORD_ID_SEQUENCE = Sequence("power_usage_records_id_seq")
+"""主資料庫 power_usage_records.id 的序列；分片前的紀錄也由它配發，啟用分片後繼續用來配發全域唯一的紀錄 ID"""
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """
+    Jump Consistent Hash
+    將整數鍵穩定地對應到 [0, buckets) 的分片；分片數增加時只有約 1/n 的鍵需要搬移
+    """
+    key &= 0xFFFFFFFFFFFFFFFF
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return b
+
+
+def shard_table(metadata: MetaData) -> Table:
+    """
+    建立分片上的用電紀錄資料表定義
+    欄位與主資料庫相同，但分片資料庫沒有 devices 資料表，因此不建立外鍵，並加上依設備與時間查詢的索引
+    """
+    source = PowerUsageRecord.__table__
+    columns = [
+        Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable, index=column.index, server_default=column.server_default.arg if column.server_default is not None else None)
+        for column in source.columns
+    ]
+    return Table(source.name, metadata, *columns, Index("idx_power_usage_records_device_timestamp", "device_id", "timestamp"))
+
+
+class TelemetryShards:
+    """
+    用電紀錄分片路由
+    依設備 ID 決定分片，並提供跨分片平行查詢
+    """
+
+    def __init__(self, urls: Sequence[str], engine_factory: Callable[[str], Engine] = create_engine):
+        self.urls = list(urls)
+        self.engines: List[Engine] = [engine_factory(url) for url in self.urls]
+        self._sessionmakers = [sessionmaker(autocommit=False, autoflush=False, bind=engine) for engine in self.engines]
+        self._executor: Optional[ThreadPoolExecutor] = ThreadPoolExecutor(max_workers=len(self.engines), thread_name_prefix="shard") if len(self.engines) > 1 else None
+        self._next_record_id: Optional[int] = None  # 不支援序列的資料庫使用的行程內計數器
+        self._lock = threading.Lock()
+
+    @property
+    def sharded(self) -> bool:
+        """是否啟用分片"""
+        return bool(self.engines)
+
+    def shard_for(self, device_id: int) -> int:
+        """返回設備所在的分片索引；未啟用分片時為 0"""
+        return jump_hash(device_id, len(self.engines)) if self.engines else 0
+
+    def create_schema(self) -> None:
+        """在所有分片上建立用電紀錄資料表（已存在時略過）"""
+        metadata = MetaData()
+        shard_table(metadata)
+        for engine in self.engines:
+            metadata.create_all(engine)
+
+    @contextmanager
+    def session_for_device(self, db: Session, device_id: int) -> Iterator[Session]:
+        """
+        取得存放設備用電紀錄的 session
+        未啟用分片時直接使用主資料庫的 session，否則開啟該分片的 session 並在結束時關閉
+        """
+        if not self.sharded:
+            yield db
+            return
+        session = self._sessionmakers[self.shard_for(device_id)]()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    def allocate_record_id(self, db: Session) -> int:
+        """
+        配發全域唯一的用電紀錄 ID
+        PostgreSQL 從主資料庫的序列取號（序列不受交易回滾影響，不會重複配發）
+        不支援序列的資料庫（例如以 SQLite 開發與測試）改用行程內計數器，從各分片現有的最大 ID 接續，只適用於單一行程
+        """
+        if db.get_bind().dialect.supports_sequences:
+            return db.scalar(RECORD_ID_SEQUENCE.next_value())
+        with self._lock:
+            if self._next_record_id is None:
+                table = shard_table(MetaData())
+                self._next_record_id = max(self.fan_out_all(db, lambda session, _: session.scalar(select(func.max(table.c.id)))), key=lambda value: value or 0) or 0
+            self._next_record_id += 1
+            return self._next_record_id
+
+    def partition(self, device_ids: Iterable[int]) -> Dict[int, List[int]]:
+        """依分片將設備 ID 分組，返回 {分片索引: 設備 ID 清單}"""
+        groups: Dict[int, List[int]] = {}
+        for device_id in device_ids:
+            groups.setdefault(self.shard_for(device_id), []).append(device_id)
+        return groups
+
+    def fan_out(self, db: Session, work: Dict[int, W], fn: Callable[[Session, W], T]) -> List[T]:
+        """
+        跨分片執行查詢
+        work 為 {分片索引: 該分片的查詢參數}，各分片在獨立的 session 中平行執行 fn，返回各分片結果
+        """
+        if not self.sharded:
+            return [fn(db, item) for item in work.values()]
+
+        def run(shard: int, item: W) -> T:
+            session = self._sessionmakers[shard]()
+            try:
+                return fn(session, item)
+            finally:
+                session.close()
+
+        if self._executor is None or len(work) == 1:
+            return [run(shard, item) for shard, item in work.items()]
+        futures = [self._executor.submit(run, shard, item) for shard, item in work.items()]
+        return [future.result() for future in futures]
+
+    def fan_out_all(self, db: Session, fn: Callable[[Session, None], T]) -> List[T]:
+        """在所有分片（未啟用分片時為主資料庫）上平行執行 fn，返回各分片結果"""
+        return self.fan_out(db, dict.fromkeys(range(len(self.engines) or 1)), fn)
+
+    def dispose(self) -> None:
+        """釋放所有分片的連線池"""
+        for engine in self.engines:
+            engine.dispose()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+
+telemetry_shards = TelemetryShards(settings.TELEMETRY_SHARD_URLS, engine_factory=make_engine)
+"""全域用電紀錄分片路由實例"""
@@ -0,0 +1,31 @@
+"""
+軟刪除查詢範圍模組
+在所有 Session 的 ORM 查詢上自動加入 deleted_at IS NULL 條件，已軟刪除的設備、用電紀錄與使用者不會出現在一般查詢中
+管理與稽核查詢或唯一性檢查需要看到已刪除的資料時，以 execution_options(include_deleted=True) 明確排除此條件
+條件與部分索引（WHERE deleted_at IS NULL）相同，PostgreSQL 可直接使用部分索引
+"""
+
+from sqlalchemy import event
+from sqlalchemy.orm import ORMExecuteState, Session, with_loader_criteria
+
+from ..models.device import Device, PowerUsageRecord
+from ..models.user import User
+
+INCLUDE_DELETED = "include_deleted"
+"""查詢執行選項名稱，設為 True 時包含已軟刪除的資料"""
+
+SOFT_DELETE_MODELS = (Device, PowerUsageRecord, User)
+"""套用軟刪除查詢範圍的模型"""
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _scope_soft_deleted(execute_state: ORMExecuteState) -> None:
+    """
+    為 ORM SELECT 加上軟刪除條件
+    欄位延遲載入與關聯載入會沿用原查詢的條件，因此只處理最上層的查詢
+    """
+    if not execute_state.is_select or execute_state.is_column_load or execute_state.is_relationship_load:
+        return
+    if execute_state.execution_options.get(INCLUDE_DELETED, False):
+        return
+    execute_state.statement = execute_state.statement.options(*(with_loader_criteria(model, lambda cls: cls.deleted_at.is_(None), include_aliases=True) for model in SOFT_DELETE_MODELS))
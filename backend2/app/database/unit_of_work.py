@@ -0,0 +1,62 @@
+"""
+請求範圍的工作單元模組
+服務層的寫入方法只執行 INSERT / UPDATE ... RETURNING 而不提交，由路由在請求結束前呼叫 commit，一個請求最多提交一次
+寫入後才需要更新的記憶體狀態（排行、告警規則、分析快取等）以 on_commit 登記，交易提交後才執行，回滾時捨棄
+已在其他資料庫（例如用電紀錄分片）提交的寫入以 on_rollback 登記補償，交易未提交即結束（回滾或關閉 session）時執行
+回呼失敗只記錄錯誤：交易已經提交或回滾，不能讓請求因此失敗，也不能略過其餘的回呼
+"""
+
+import logging
+from typing import Callable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+POST_COMMIT = "post_commit"
+"""Session.info 中保存提交後回呼的鍵名"""
+
+POST_ROLLBACK = "post_rollback"
+"""Session.info 中保存補償回呼的鍵名"""
+
+
+def on_commit(db: Session, callback: Callable[[], None]) -> None:
+    """登記交易提交後執行的回呼"""
+    db.info.setdefault(POST_COMMIT, []).append(callback)
+
+
+def on_rollback(db: Session, callback: Callable[[], None]) -> None:
+    """登記交易未提交即結束時執行的補償回呼"""
+    db.info.setdefault(POST_ROLLBACK, []).append(callback)
+
+
+@event.listens_for(Session, "after_commit")
+def _run_post_commit(session: Session) -> None:
+    """交易提交後依登記順序執行回呼，並捨棄補償回呼"""
+    session.info.pop(POST_ROLLBACK, None)
+    for callback in session.info.pop(POST_COMMIT, []):
+        try:
+            callback()
+        except Exception:
+            logger.exception("交易提交後的回呼執行失敗")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_post_commit(session: Session) -> None:
+    """交易回滾時捨棄尚未執行的回呼"""
+    session.info.pop(POST_COMMIT, None)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _run_post_rollback(session: Session, transaction) -> None:
+    """
+    最外層交易結束時執行尚未捨棄的補償回呼
+    提交時已先捨棄，因此只在回滾或未提交即關閉 session 時執行
+    """
+    if transaction.parent is None:
+        for callback in session.info.pop(POST_ROLLBACK, []):
+            try:
+                callback()
+            except Exception:
+                logger.exception("交易回滾後的補償回呼執行失敗")
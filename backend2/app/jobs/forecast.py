@@ -0,0 +1,22 @@
+"""
+用電預測批次工作
+為所有設備產生下個月的用電量與電費預測，建議每日排程執行一次
+執行方式：python -m app.jobs.forecast
+"""
+
+from ..database.session import SessionLocal
+from ..services.forecast import ForecastService
+
+
+def main() -> None:
+    """執行預測批次工作並輸出處理的設備數"""
+    db = SessionLocal()
+    try:
+        count = ForecastService.run_forecast_job(db)
+        print(f"已產生 {count} 個設備的用電預測")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
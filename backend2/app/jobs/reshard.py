@@ -0,0 +1,94 @@
+"""
+用電紀錄重新分片工具
+依新的分片清單重新計算每個設備所在的分片，並將分片有變動的設備用電紀錄搬移到新分片
+搬移以設備為單位：先清除目標分片上該設備的殘留資料再複製，確認提交後才刪除來源資料，中斷後可直接重新執行
+紀錄連同 ID 一起搬移（ID 由主資料庫的序列配發，跨分片唯一），近期讀數緩衝與查詢結果中的紀錄 ID 在搬移後仍然有效
+執行期間應暫停用電紀錄寫入；完成後將 TELEMETRY_SHARD_URLS 更新為新的分片清單
+
+執行方式：
+    python -m app.jobs.reshard --target URL [URL ...] [--source URL [URL ...]] [--dry-run]
+    python -m app.jobs.reshard --init
+未指定 --source 時以目前設定的分片為來源；尚未分片時可用 --source 指定主資料庫
+"""
+
+import argparse
+from typing import Dict, List, Sequence
+
+from sqlalchemy import MetaData, create_engine, delete, func, insert, select
+from sqlalchemy.engine import Engine
+
+from ..config import settings
+from ..database.sharding import jump_hash, shard_table, telemetry_shards
+
+
+def reshard(source_urls: Sequence[str], target_urls: Sequence[str], dry_run: bool = False, batch_size: int = 5000) -> Dict[str, int]:
+    """
+    重新分片
+    返回搬移的設備數與紀錄數；dry_run 時只計算不搬移
+    """
+    metadata = MetaData()
+    table = shard_table(metadata)
+
+    # 來源與目標可能有相同的資料庫（例如分片擴充時保留既有分片），以連接字串共用引擎
+    engines: Dict[str, Engine] = {url: create_engine(url) for url in {*source_urls, *target_urls}}
+    if not dry_run:
+        for url in target_urls:
+            metadata.create_all(engines[url])
+
+    stats = {"devices": 0, "records": 0}
+    try:
+        for source_url in source_urls:
+            source = engines[source_url]
+            with source.connect() as conn:
+                device_ids: List[int] = list(conn.execute(select(table.c.device_id).distinct()).scalars())
+
+            for device_id in device_ids:
+                target_url = target_urls[jump_hash(device_id, len(target_urls))]
+                if target_url == source_url:
+                    continue
+
+                stats["devices"] += 1
+                if dry_run:
+                    with source.connect() as conn:
+                        stats["records"] += conn.execute(select(func.count()).where(table.c.device_id == device_id)).scalar()
+                    continue
+
+                with engines[target_url].begin() as target_conn, source.connect() as source_conn:
+                    target_conn.execute(delete(table).where(table.c.device_id == device_id))
+                    result = source_conn.execution_options(yield_per=batch_size).execute(select(table).where(table.c.device_id == device_id).order_by(table.c.id))
+                    for rows in result.partitions():
+                        target_conn.execute(insert(table), [dict(row._mapping) for row in rows])
+                        stats["records"] += len(rows)
+
+                with source.begin() as source_conn:
+                    source_conn.execute(delete(table).where(table.c.device_id == device_id))
+    finally:
+        for engine in engines.values():
+            engine.dispose()
+
+    return stats
+
+
+def main() -> None:
+    """解析命令列參數並執行重新分片或建立分片資料表"""
+    parser = argparse.ArgumentParser(description="用電紀錄重新分片工具")
+    parser.add_argument("--source", nargs="+", default=settings.TELEMETRY_SHARD_URLS, help="來源分片連接字串，預設為目前設定的分片")
+    parser.add_argument("--target", nargs="+", help="新的分片連接字串清單，順序即分片索引")
+    parser.add_argument("--dry-run", action="store_true", help="只計算需要搬移的設備數與紀錄數")
+    parser.add_argument("--init", action="store_true", help="在目前設定的分片上建立用電紀錄資料表")
+    args = parser.parse_args()
+
+    if args.init:
+        telemetry_shards.create_schema()
+        print(f"已在 {len(telemetry_shards.engines)} 個分片上建立資料表")
+        return
+    if not args.source or not args.target:
+        parser.error("需要指定 --source（或設定 TELEMETRY_SHARD_URLS）與 --target")
+
+    stats = reshard(args.source, args.target, dry_run=args.dry_run)
+    action = "需要搬移" if args.dry_run else "已搬移"
+    print(f"{action} {stats['devices']} 個設備、{stats['records']} 筆用電紀錄")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,70 @@
 負責設定 FastAPI 應用程式、配置中間件、註冊路由
 """
 
+import asyncio
+from contextlib import asynccontextmanager
+from typing import List
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 
-from .api import device, user  # 導入 API 路由模組
+from .api import alert, dashboard, device, user  # 導入 API 路由模組
 from .config import settings  # 導入應用程式設定
+from .database.replicas import read_replicas
+from .database.session import SessionLocal, engine
+from .database.sharding import telemetry_shards
+from .middleware.admission import AdmissionControlMiddleware
+from .services.anomaly import anomaly_detector
+from .services.cache_sync import cache_sync
+from .services.device import DeviceService
+from .services.rules import AlertRuleService, rule_engine
+from .services.tasks import task_runner
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    應用程式生命週期
+    啟動時載入異常偵測快照、從各分片預熱近期讀數緩衝、用電排行與告警規則，並啟動背景工作者、離線規則時間輪與行程內快取同步
+    記憶體中的狀態是每個工作行程各自的快取，其他行程的寫入由行程內快取同步定期載入，可以多個工作行程或執行個體部署
+    關閉時先停止時間輪與同步並清空背景工作佇列，再寫入最新快照並釋放分片與唯讀複本的連線池；啟動中途失敗時同樣釋放已取得的資源
+    """
+    background: List[asyncio.Task] = []
+    snapshot_loaded = False
+    try:
+        anomaly_detector.load()
+        snapshot_loaded = True
+        with SessionLocal() as db:
+            await run_in_threadpool(cache_sync.start, db)
+            await run_in_threadpool(DeviceService.warm_recent_readings, db)
+            await run_in_threadpool(DeviceService.warm_rankings, db)
+            await run_in_threadpool(AlertRuleService.warm_engine, db)
+        await task_runner.start()
+        background += [asyncio.create_task(rule_engine.run()), asyncio.create_task(cache_sync.run())]
+        yield
+    finally:
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        await task_runner.stop(timeout=settings.TASK_DRAIN_TIMEOUT_SECONDS)
+        # 快照載入失敗時不以空的統計值覆寫既有快照
+        if snapshot_loaded:
+            anomaly_detector.save()
+        telemetry_shards.dispose()
+        read_replicas.dispose()
+
 
 # 創建 FastAPI 應用程式實例
-app = FastAPI(title=settings.PROJECT_NAME, openapi_url=f"{settings.API_V1_PREFIX}/openapi.json")  # 設定 API 文檔標題  # 設定 OpenAPI 文檔路徑
+app = FastAPI(title=settings.PROJECT_NAME, openapi_url=f"{settings.API_V1_PREFIX}/openapi.json", lifespan=lifespan)  # 設定 API 文檔標題  # 設定 OpenAPI 文檔路徑
+
+# 配置准入控制中間件，過載時拒絕低優先級寫入（需在 CORS 之前加入，429 回應才會帶有 CORS 標頭）
+app.add_middleware(
+    AdmissionControlMiddleware,
+    engine=engine,
+    pool_threshold=settings.ADMISSION_POOL_USAGE_THRESHOLD,  # 連線池使用率門檻
+    latency_threshold_ms=settings.ADMISSION_LATENCY_THRESHOLD_MS,  # 互動式請求延遲門檻
+)
 
 # 配置 CORS（跨來源資源共用）中間件
 app.add_middleware(
@@ -24,6 +80,8 @@ app.add_middleware(
 # 註冊 API 路由
 app.include_router(user.router, prefix=settings.API_V1_PREFIX)  # 使用者相關的路由  # 加入 API 版本前綴
 app.include_router(device.router, prefix=settings.API_V1_PREFIX)  # 設備相關的路由  # 加入 API 版本前綴
+app.include_router(alert.router, prefix=settings.API_V1_PREFIX)  # 告警相關的路由  # 加入 API 版本前綴
+app.include_router(dashboard.router, prefix=settings.API_V1_PREFIX)  # 儀表板相關的路由  # 加入 API 版本前綴
 
 
 @app.get("/")
@@ -0,0 +1,89 @@
+"""
+准入控制中間件
+當資料庫連線池接近用盡或互動式請求延遲過高時，以 429 拒絕低優先級的寫入流量
+讓儀表板等互動式端點在寫入突增時仍能維持回應時間
+"""
+
+import re
+import threading
+import time
+from typing import Optional, Sequence, Tuple
+
+from sqlalchemy.engine import Engine
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# 低優先級的寫入端點：（HTTP 方法, 路徑規則）
+LOW_PRIORITY_ROUTES: Sequence[Tuple[str, "re.Pattern[str]"]] = (
+    ("POST", re.compile(r"/devices/\d+/usage$")),
+    ("PUT", re.compile(r"/devices/\d+/status$")),
+    ("POST", re.compile(r"/devices/import$")),
+)
+
+
+def is_low_priority(method: str, path: str) -> bool:
+    """判斷請求是否屬於可被拒絕的低優先級寫入流量"""
+    return any(method == route_method and pattern.search(path) for route_method, pattern in LOW_PRIORITY_ROUTES)
+
+
+class AdmissionControlMiddleware:
+    """
+    准入控制中間件
+    以互動式請求延遲的指數加權平均與連線池使用率判斷系統是否過載，過載時拒絕低優先級請求
+    延遲樣本超過 latency_window 秒未更新時視為無效，避免沒有互動流量時持續拒絕寫入
+    """
+
+    def __init__(self, app: ASGIApp, engine: Engine, pool_threshold: float = 0.9, latency_threshold_ms: float = 500, latency_window: float = 10.0, alpha: float = 0.2):
+        self.app = app
+        self.engine = engine
+        self.pool_threshold = pool_threshold
+        self.latency_threshold = latency_threshold_ms / 1000
+        self.latency_window = latency_window
+        self.alpha = alpha
+        self._latency: Optional[float] = None  # 互動式請求延遲的指數加權平均（秒）
+        self._latency_at = 0.0  # 最近一次延遲樣本的時間
+        self._lock = threading.Lock()
+
+    def pool_usage(self) -> Optional[float]:
+        """返回連線池使用率（已借出連線數 / 連線池容量），連線池不支援統計時返回 None"""
+        pool = self.engine.pool
+        if not hasattr(pool, "checkedout"):
+            return None
+        capacity = pool.size() + max(getattr(pool, "_max_overflow", 0), 0)
+        return pool.checkedout() / capacity if capacity > 0 else None
+
+    def overloaded(self, now: Optional[float] = None) -> bool:
+        """判斷系統目前是否過載"""
+        now = time.monotonic() if now is None else now
+        usage = self.pool_usage()
+        if usage is not None and usage >= self.pool_threshold:
+            return True
+        return self._latency is not None and now - self._latency_at <= self.latency_window and self._latency >= self.latency_threshold
+
+    def record_latency(self, elapsed: float, now: Optional[float] = None) -> None:
+        """記錄一次互動式請求的延遲"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self._latency is None or now - self._latency_at > self.latency_window:
+                self._latency = elapsed
+            else:
+                self._latency += self.alpha * (elapsed - self._latency)
+            self._latency_at = now
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        low_priority = is_low_priority(scope["method"], scope["path"])
+        if low_priority and self.overloaded():
+            response = JSONResponse({"detail": "系統忙碌中，請稍後再試"}, status_code=429, headers={"Retry-After": "1"})
+            await response(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if not low_priority:
+                self.record_latency(time.perf_counter() - start)
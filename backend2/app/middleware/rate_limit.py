@@ -0,0 +1,101 @@
+"""
+速率限制模組
+以權杖桶（token bucket）限制每個設備與每位使用者的寫入頻率
+設備權杖桶依（使用者, 設備）區分，其他使用者對同一設備的請求（即使因權限不足被拒）不會耗盡擁有者的權杖
+狀態以陣列緊湊儲存，已回滿的權杖桶等同於不存在，會在數量過多時回收；仍超過上限時再淘汰最久未更新的權杖桶
+"""
+
+import heapq
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import Depends, HTTPException, status
+
+from ..config import settings
+from ..models.user import User
+from .auth import get_current_active_user
+
+
+class TokenBucketLimiter:
+    """
+    權杖桶速率限制器
+    每個鍵以固定速率補充權杖，最多累積 burst 個；每次請求消耗一個權杖，權杖不足時拒絕
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._slots: Dict[int, int] = {}  # 鍵 -> 陣列索引
+        self._keys = array("q")  # 依陣列索引排列的鍵
+        self._tokens = array("d")  # 上次更新時的權杖數
+        self._updated = array("d")  # 上次更新時間（time.monotonic）
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def acquire(self, key: int, now: Optional[float] = None) -> Tuple[bool, float]:
+        """
+        嘗試消耗一個權杖
+        返回（是否允許, 建議重試秒數）
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                if len(self._slots) >= self.max_keys:
+                    self._sweep(now)
+                slot = len(self._keys)
+                self._slots[key] = slot
+                self._keys.append(key)
+                self._tokens.append(self.burst)
+                self._updated.append(now)
+
+            tokens = min(self.burst, self._tokens[slot] + (now - self._updated[slot]) * self.rate)
+            self._updated[slot] = now
+            if tokens >= 1:
+                self._tokens[slot] = tokens - 1
+                return True, 0.0
+            self._tokens[slot] = tokens
+            return False, (1 - tokens) / self.rate
+
+    def _sweep(self, now: float) -> None:
+        """
+        回收已回滿的權杖桶並壓縮陣列
+        若其餘權杖桶仍達上限（例如大量輪替的鍵），淘汰最久未更新者直到低於上限的九成，避免每個新鍵都觸發回收
+        被淘汰的權杖桶最接近回滿，重新出現時視為已回滿
+        """
+        keep: List[int] = [slot for slot in range(len(self._keys)) if self._tokens[slot] + (now - self._updated[slot]) * self.rate < self.burst]
+        if len(keep) >= self.max_keys:
+            keep = sorted(heapq.nlargest(self.max_keys * 9 // 10, keep, key=self._updated.__getitem__))
+        self._keys = array("q", (self._keys[slot] for slot in keep))
+        self._tokens = array("d", (self._tokens[slot] for slot in keep))
+        self._updated = array("d", (self._updated[slot] for slot in keep))
+        self._slots = {key: slot for slot, key in enumerate(self._keys)}
+
+
+def device_bucket_key(user_id: int, device_id: int) -> int:
+    """將（使用者 ID, 設備 ID）合併為設備權杖桶的鍵，兩者皆為 32 位元整數"""
+    return (user_id << 32) | (device_id & 0xFFFFFFFF)
+
+
+device_limiter = TokenBucketLimiter(rate=settings.RATE_LIMIT_DEVICE_PER_SECOND, burst=settings.RATE_LIMIT_DEVICE_BURST)
+"""每個設備的寫入速率限制器，鍵由 device_bucket_key 產生"""
+
+user_limiter = TokenBucketLimiter(rate=settings.RATE_LIMIT_USER_PER_SECOND, burst=settings.RATE_LIMIT_USER_BURST)
+"""每位使用者的寫入速率限制器"""
+
+
+async def rate_limit_device_writes(device_id: int, current_user: User = Depends(get_current_active_user)) -> None:
+    """
+    設備寫入速率限制依賴
+    先檢查使用者的權杖桶，再檢查該使用者對此設備的權杖桶，任一不足時返回 429 並附上 Retry-After
+    使用者權杖桶不足時不消耗設備權杖
+    """
+    for limiter, key in ((user_limiter, current_user.id), (device_limiter, device_bucket_key(current_user.id, device_id))):
+        allowed, retry_after = limiter.acquire(key)
+        if not allowed:
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="請求過於頻繁，請稍後再試", headers={"Retry-After": str(max(1, round(retry_after)))})
@@ -0,0 +1,37 @@
+"""
+告警規則模型定義
+儲存使用者設定的門檻告警規則，例如單次讀數、每日用電量或電費超過門檻，以及設備離線超過指定分鐘數
+"""
+
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, Numeric, String
+
+from ..database.clock import utc_now
+from ..database.session import Base
+
+
+class AlertRule(Base):
+    """
+    告警規則資料模型
+    device_id 為空時規則套用到使用者的所有設備
+    """
+
+    __tablename__ = "alert_rules"  # 資料表名稱
+    __table_args__ = (
+        Index("idx_alert_rules_user_metric", "user_id", "metric"),
+        Index("idx_alert_rules_device_metric", "device_id", "metric"),
+        Index("idx_alert_rules_updated_at", "updated_at"),  # 行程內快取同步依水位讀取規則變更
+    )
+
+    # 基本資訊欄位
+    id = Column(Integer, primary_key=True, index=True)  # 主鍵，自動遞增
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)  # 規則所屬使用者 ID
+    device_id = Column(Integer, ForeignKey("devices.id"))  # 套用的設備 ID，為空時套用到使用者的所有設備
+
+    # 規則內容欄位
+    metric = Column(String(20), nullable=False)  # 指標：usage、daily_usage、daily_cost 或 offline
+    threshold = Column(Numeric(12, 2), nullable=False)  # 門檻值；offline 為分鐘數
+    is_active = Column(Boolean, default=True)  # 規則啟用狀態
+
+    # 時間戳記欄位
+    created_at = Column(DateTime, server_default=utc_now())  # 建立時間（資料庫的 UTC 時間）
+    updated_at = Column(DateTime, server_default=utc_now(), onupdate=utc_now())  # 更新時間（資料庫的 UTC 時間）
@@ -3,10 +3,11 @@
 包含設備基本資訊、狀態追蹤和用電量紀錄的資料結構
 """
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, Numeric, String, Text
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, Numeric, String, Text, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
+from ..database.clock import utc_now
 from ..database.session import Base
 
 
@@ -17,6 +18,11 @@ class Device(Base):
     """
 
     __tablename__ = "devices"  # 資料表名稱
+    __table_args__ = (
+        Index("idx_devices_user_updated", "user_id", "updated_at", "id"),  # 差異同步的鍵集索引
+        Index("idx_devices_updated_at", "updated_at"),  # 行程內快取同步依水位讀取所有使用者的設備變更
+        Index("idx_devices_user_live", "user_id", "id", postgresql_where=text("deleted_at IS NULL")),  # 未刪除設備的部分索引
+    )
 
     # 基本資訊欄位
     id = Column(Integer, primary_key=True, index=True)  # 主鍵，自動遞增
@@ -37,7 +43,7 @@ class Device(Base):
 
     # 時間戳記欄位
     created_at = Column(DateTime, server_default=func.now())  # 建立時間
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())  # 更新時間
+    updated_at = Column(DateTime, server_default=utc_now(), onupdate=utc_now())  # 更新時間（資料庫的 UTC 時間），差異同步的水位
     deleted_at = Column(DateTime)  # 刪除時間，用於軟刪除
 
     # 關聯
@@ -51,6 +57,7 @@ class PowerUsageRecord(Base):
     """
 
     __tablename__ = "power_usage_records"  # 資料表名稱
+    __table_args__ = (Index("idx_power_usage_records_device_live", "device_id", "timestamp", postgresql_where=text("deleted_at IS NULL")),)  # 未刪除紀錄的部分索引
 
     # 基本資訊欄位
     id = Column(Integer, primary_key=True, index=True)  # 主鍵，自動遞增
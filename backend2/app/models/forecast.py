@@ -0,0 +1,33 @@
+"""
+用電預測模型定義
+儲存批次預測工作產生的每個設備下個月用電量與電費預測值
+"""
+
+from sqlalchemy import Column, Date, DateTime, ForeignKey, Index, Integer, Numeric
+from sqlalchemy.sql import func
+
+from ..database.session import Base
+
+
+class PowerUsageForecast(Base):
+    """
+    用電預測資料模型
+    每個設備在每個預測期間一筆資料，並冗餘存放 user_id 以便依使用者單次索引讀取
+    """
+
+    __tablename__ = "power_usage_forecasts"  # 資料表名稱
+    __table_args__ = (Index("idx_power_usage_forecasts_user_period", "user_id", "period_start"),)
+
+    # 基本資訊欄位
+    id = Column(Integer, primary_key=True, index=True)  # 主鍵，自動遞增
+    device_id = Column(Integer, ForeignKey("devices.id"), nullable=False)  # 關聯設備 ID
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)  # 設備所屬使用者 ID
+
+    # 預測期間與預測值欄位
+    period_start = Column(Date, nullable=False)  # 預測期間起始日（含）
+    period_end = Column(Date, nullable=False)  # 預測期間結束日（不含）
+    predicted_usage = Column(Numeric(12, 2), nullable=False)  # 預測用電量
+    predicted_cost = Column(Numeric(12, 2), nullable=False)  # 預測電費
+
+    # 時間戳記欄位
+    generated_at = Column(DateTime, server_default=func.now())  # 預測產生時間
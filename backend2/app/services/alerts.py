@@ -0,0 +1,91 @@
+"""
+告警中心模組
+集中發布設備告警事件，提供訂閱介面與每位使用者的最近告警查詢
+"""
+
+import logging
+import threading
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Alert:
+    """
+    告警事件
+    描述某個設備在某個時間點觸發的異常或門檻告警
+    """
+
+    kind: str  # 告警類型，例如 anomaly
+    device_id: int  # 設備 ID
+    user_id: int  # 設備所屬使用者 ID
+    message: str  # 告警訊息
+    value: float  # 觸發告警的數值
+    baseline: float  # 比較基準值
+    score: float  # 嚴重程度分數
+    timestamp: datetime  # 觸發告警的讀數時間
+    created_at: datetime = field(default_factory=datetime.utcnow)  # 告警產生時間
+
+
+AlertSubscriber = Callable[[Alert], None]
+
+
+class AlertHub:
+    """
+    告警中心
+    以發布/訂閱方式轉發告警，並為每位使用者保留固定數量的最近告警
+    """
+
+    def __init__(self, max_recent_per_user: int = 100):
+        self._subscribers: List[AlertSubscriber] = []
+        self._recent: Dict[int, Deque[Alert]] = defaultdict(lambda: deque(maxlen=max_recent_per_user))
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback: AlertSubscriber) -> Callable[[], None]:
+        """
+        訂閱告警
+        返回取消訂閱的函數
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe() -> None:
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+
+        return unsubscribe
+
+    def publish(self, alert: Alert) -> None:
+        """
+        發布告警
+        記錄到使用者的最近告警，並通知所有訂閱者；單一訂閱者失敗不影響其他訂閱者
+        """
+        with self._lock:
+            self._recent[alert.user_id].append(alert)
+            subscribers = list(self._subscribers)
+
+        for callback in subscribers:
+            try:
+                callback(alert)
+            except Exception:
+                logger.exception("告警訂閱者處理失敗")
+
+    def recent(self, user_id: int, kind: Optional[str] = None, min_value: Optional[float] = None, min_score: Optional[float] = None, limit: int = 50) -> List[Alert]:
+        """
+        查詢使用者的最近告警
+        依產生時間由新到舊排序，可依類型、最低讀數與最低分數過濾
+        """
+        with self._lock:
+            alerts = list(self._recent.get(user_id, ()))
+
+        alerts = [alert for alert in reversed(alerts) if (kind is None or alert.kind == kind) and (min_value is None or alert.value >= min_value) and (min_score is None or alert.score >= min_score)]
+        return alerts[:limit]
+
+
+alert_hub = AlertHub()
+"""全域告警中心實例"""
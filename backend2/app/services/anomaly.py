@@ -0,0 +1,240 @@
+"""
+用電異常偵測模組
+在用電量寫入時即時更新每個設備的滾動統計值，偵測突增等異常用電並發布告警
+統計值以陣列緊湊儲存，每個設備佔用固定大小，並定期寫入快照以便重啟後直接沿用
+"""
+
+import math
+import os
+import struct
+import threading
+import time
+from array import array
+from datetime import datetime
+from typing import Dict, Optional
+
+from ..config import settings
+from ..database.clock import naive_utc
+from .alerts import Alert, AlertHub, alert_hub
+
+# 每個設備一列的欄位配置：總筆數、Welford 平均與平方差和、EWMA，以及 24 小時的季節均值與筆數
+_COUNT, _MEAN, _M2, _EWMA = 0, 1, 2, 3
+_HOUR_MEAN = 4
+_HOUR_COUNT = _HOUR_MEAN + 24
+_STRIDE = _HOUR_COUNT + 24
+_ZERO_ROW = array("d", [0.0]) * _STRIDE
+
+_SNAPSHOT_MAGIC = b"ECOAD1"
+_SNAPSHOT_HEADER = struct.Struct("<6sII")
+
+
+class AnomalyDetector:
+    """
+    線上異常偵測器
+    每筆讀數以 O(1) 時間更新統計值，不需要回查歷史資料
+    當讀數同時超過 z 分數門檻與基準倍數門檻時發布 anomaly 告警
+    """
+
+    def __init__(
+        self,
+        hub: AlertHub,
+        snapshot_path: Optional[str] = None,
+        snapshot_interval: float = 300,
+        z_threshold: float = 4.0,
+        min_ratio: float = 3.0,
+        min_samples: int = 30,
+        min_hour_samples: int = 7,
+        ewma_alpha: float = 0.1,
+    ):
+        self.hub = hub
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.z_threshold = z_threshold
+        self.min_ratio = min_ratio
+        self.min_samples = min_samples
+        self.min_hour_samples = min_hour_samples
+        self.ewma_alpha = ewma_alpha
+
+        self._slots: Dict[int, int] = {}  # 設備 ID -> 列索引
+        self._device_ids = array("q")  # 依列索引排列的設備 ID
+        self._stats = array("d")  # 所有設備的統計值，每列 _STRIDE 個欄位
+        self._lock = threading.Lock()
+        self._last_snapshot = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._device_ids)
+
+    def _slot(self, device_id: int) -> int:
+        """取得設備的列索引，新設備會配置一列全為零的統計值"""
+        slot = self._slots.get(device_id)
+        if slot is None:
+            slot = len(self._device_ids)
+            self._slots[device_id] = slot
+            self._device_ids.append(device_id)
+            self._stats.extend(_ZERO_ROW)
+        return slot
+
+    def baseline(self, device_id: int, hour: int) -> Optional[float]:
+        """
+        取得設備在指定小時的用電基準值
+        該小時樣本足夠時使用季節均值，否則使用 EWMA；尚無資料時返回 None
+        """
+        with self._lock:
+            slot = self._slots.get(device_id)
+            if slot is None:
+                return None
+            return self._baseline(slot * _STRIDE, hour)
+
+    def _baseline(self, base: int, hour: int) -> float:
+        stats = self._stats
+        if stats[base + _HOUR_COUNT + hour] >= self.min_hour_samples:
+            return stats[base + _HOUR_MEAN + hour]
+        return stats[base + _EWMA]
+
+    def observe(self, device_id: int, user_id: int, usage: float, timestamp: datetime) -> Optional[Alert]:
+        """
+        處理一筆用電讀數
+        先以既有統計值判斷是否異常，再將讀數併入統計值；偵測到異常時發布並返回告警
+        """
+        alert = None
+        # 季節均值依 UTC 小時分組，帶時區的讀數先轉為 UTC
+        timestamp = naive_utc(timestamp)
+        hour = timestamp.hour
+
+        with self._lock:
+            base = self._slot(device_id) * _STRIDE
+            stats = self._stats
+            count = stats[base + _COUNT]
+
+            # 以更新前的統計值判斷，避免異常讀數稀釋自身分數
+            if count >= self.min_samples:
+                variance = stats[base + _M2] / (count - 1)
+                std = math.sqrt(variance) if variance > 0 else 0.0
+                mean = stats[base + _MEAN]
+                baseline = self._baseline(base, hour)
+                score = (usage - mean) / std if std > 0 else (math.inf if usage > mean else 0.0)
+                ratio = usage / baseline if baseline > 0 else math.inf
+                if score >= self.z_threshold and ratio >= self.min_ratio:
+                    alert = Alert(
+                        kind="anomaly",
+                        device_id=device_id,
+                        user_id=user_id,
+                        message=f"設備用電量 {usage:.2f} 為基準值 {baseline:.2f} 的 {ratio:.1f} 倍",
+                        value=usage,
+                        baseline=baseline,
+                        score=score if math.isfinite(score) else float(self.z_threshold),
+                        timestamp=timestamp,
+                    )
+
+            # Welford 線上平均與變異數
+            count += 1
+            delta = usage - stats[base + _MEAN]
+            stats[base + _COUNT] = count
+            stats[base + _MEAN] += delta / count
+            stats[base + _M2] += delta * (usage - stats[base + _MEAN])
+
+            # 指數加權移動平均
+            stats[base + _EWMA] = usage if count == 1 else stats[base + _EWMA] + self.ewma_alpha * (usage - stats[base + _EWMA])
+
+            # 每小時季節均值：樣本少時為累積平均，之後以 EWMA 追蹤變化
+            hour_count = stats[base + _HOUR_COUNT + hour] + 1
+            stats[base + _HOUR_COUNT + hour] = hour_count
+            stats[base + _HOUR_MEAN + hour] += max(1.0 / hour_count, self.ewma_alpha) * (usage - stats[base + _HOUR_MEAN + hour])
+
+        if alert is not None:
+            self.hub.publish(alert)
+        return alert
+
+    def forget(self, device_id: int) -> None:
+        """
+        移除設備的統計值
+        將最後一列移到被移除的列，維持陣列緊湊
+        """
+        with self._lock:
+            slot = self._slots.pop(device_id, None)
+            if slot is None:
+                return
+            last = len(self._device_ids) - 1
+            if slot != last:
+                moved = self._device_ids[last]
+                self._device_ids[slot] = moved
+                self._stats[slot * _STRIDE : (slot + 1) * _STRIDE] = self._stats[last * _STRIDE :]
+                self._slots[moved] = slot
+            self._device_ids.pop()
+            del self._stats[last * _STRIDE :]
+
+    def claim_snapshot(self) -> bool:
+        """
+        檢查是否該寫入快照
+        距離上次快照超過設定間隔時返回 True 並重設計時，確保每個間隔只有一個呼叫者負責寫入
+        """
+        with self._lock:
+            if not self.snapshot_path or time.monotonic() - self._last_snapshot < self.snapshot_interval:
+                return False
+            self._last_snapshot = time.monotonic()
+            return True
+
+    def save(self, path: Optional[str] = None) -> None:
+        """
+        寫入統計值快照
+        先寫入暫存檔再以原子操作取代，避免中途失敗留下損壞的快照
+        """
+        path = path or self.snapshot_path
+        if not path:
+            return
+
+        with self._lock:
+            header = _SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, len(self._device_ids), _STRIDE)
+            device_ids = self._device_ids.tobytes()
+            stats = self._stats.tobytes()
+            self._last_snapshot = time.monotonic()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+            f.write(device_ids)
+            f.write(stats)
+        os.replace(tmp_path, path)
+
+    def load(self, path: Optional[str] = None) -> bool:
+        """
+        載入統計值快照
+        快照不存在或格式不符時維持空白狀態並返回 False
+        """
+        path = path or self.snapshot_path
+        if not path or not os.path.exists(path):
+            return False
+
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < _SNAPSHOT_HEADER.size:
+            return False
+        magic, count, stride = _SNAPSHOT_HEADER.unpack_from(data)
+        if magic != _SNAPSHOT_MAGIC or stride != _STRIDE or len(data) != _SNAPSHOT_HEADER.size + count * 8 * (1 + stride):
+            return False
+
+        device_ids = array("q")
+        stats = array("d")
+        offset = _SNAPSHOT_HEADER.size
+        device_ids.frombytes(data[offset : offset + count * 8])
+        stats.frombytes(data[offset + count * 8 :])
+
+        with self._lock:
+            self._device_ids = device_ids
+            self._stats = stats
+            self._slots = {device_id: slot for slot, device_id in enumerate(device_ids)}
+            self._last_snapshot = time.monotonic()
+        return True
+
+
+anomaly_detector = AnomalyDetector(
+    hub=alert_hub,
+    snapshot_path=settings.ANOMALY_SNAPSHOT_PATH,
+    snapshot_interval=settings.ANOMALY_SNAPSHOT_INTERVAL_SECONDS,
+    z_threshold=settings.ANOMALY_Z_THRESHOLD,
+    min_ratio=settings.ANOMALY_MIN_RATIO,
+    min_samples=settings.ANOMALY_MIN_SAMPLES,
+)
+"""全域異常偵測器實例"""
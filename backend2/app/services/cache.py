@@ -0,0 +1,187 @@
+"""
+用電分析結果快取模組
+快取已結算時間範圍的查詢結果；範圍結束時間早於結算界線的結果不會再改變，因此可以永久保存
+記憶體層為有上限的 LRU，另可選擇以 SQLite 檔案作為磁碟層，讓重啟後仍可沿用
+遲到的用電讀數只會使涵蓋該時間點的同一設備或使用者的快取失效
+每個（範圍種類, 範圍 ID）有失效世代，查詢期間發生失效時不寫入查詢結果，避免以失效前讀到的資料覆蓋
+"""
+
+import os
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from ..config import settings
+from ..database.clock import naive_utc
+
+# 快取鍵：(範圍種類, 範圍 ID, 起始時間, 結束時間, 粒度)，範圍種類為 device 或 user
+CacheKey = Tuple[str, int, datetime, datetime, str]
+
+_MISSING = object()
+
+
+class ResultCache:
+    """
+    已結算範圍查詢結果快取
+    依（範圍種類, 範圍 ID）建立索引，失效時只需檢查同一範圍的快取鍵
+    """
+
+    def __init__(self, max_entries: int = 10000, settled_after: timedelta = timedelta(hours=48), disk_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.settled_after = settled_after
+        self._entries: "OrderedDict[CacheKey, Any]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, int], Set[CacheKey]] = defaultdict(set)
+        self._max_end: Optional[datetime] = None  # 已快取範圍中最晚的結束時間，用於略過不可能命中的失效檢查
+        self._generations: Dict[Tuple[str, int], int] = defaultdict(int)  # 每個範圍的失效次數
+        self._epoch = 0  # clear 的次數
+        self._lock = threading.Lock()
+        self._disk = self._open_disk(disk_path) if disk_path else None
+        if self._disk is not None:
+            (max_end,) = self._disk.execute("SELECT MAX(end_time) FROM results").fetchone()
+            self._max_end = datetime.fromisoformat(max_end) if max_end else None
+
+    @staticmethod
+    def _open_disk(path: str) -> sqlite3.Connection:
+        """開啟磁碟層並建立資料表"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, scope TEXT NOT NULL, scope_id INTEGER NOT NULL, start_time TEXT NOT NULL, end_time TEXT NOT NULL, value BLOB NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_results_scope ON results (scope, scope_id, start_time, end_time)")
+        return conn
+
+    def is_settled(self, end_time: datetime, now: Optional[datetime] = None) -> bool:
+        """判斷時間範圍是否已結算（結束時間早於結算界線）"""
+        return naive_utc(end_time) < (now or datetime.utcnow()) - self.settled_after
+
+    @staticmethod
+    def make_key(scope: str, scope_id: int, start_time: datetime, end_time: datetime, granularity: str) -> CacheKey:
+        """建立快取鍵"""
+        return (scope, scope_id, naive_utc(start_time), naive_utc(end_time), granularity)
+
+    def get(self, key: CacheKey) -> Any:
+        """
+        讀取快取
+        記憶體層未命中時查詢磁碟層並提升到記憶體層；都未命中時返回 _MISSING
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            if self._disk is None:
+                return _MISSING
+            row = self._disk.execute("SELECT value FROM results WHERE key = ?", (repr(key),)).fetchone()
+            if row is None:
+                return _MISSING
+            value = pickle.loads(row[0])
+            self._remember(key, value)
+            return value
+
+    def get_or_compute(self, key: CacheKey, compute: Callable[[], Any], fresh: Optional[Callable[[], bool]] = None) -> Any:
+        """
+        讀取快取或執行查詢
+        只有已結算的時間範圍才會寫入快取，未結算的範圍每次重新查詢
+        fresh 在查詢前判斷即將讀取的資料是否為最新（例如唯讀複本是否已追上主資料庫），返回 False 時查詢結果不寫入快取
+        """
+        if not self.is_settled(key[3]):
+            return compute()
+        value = self.get(key)
+        if value is _MISSING:
+            generation = self._generation(key)
+            store = fresh is None or fresh()
+            value = compute()
+            if store:
+                self.set(key, value, generation)
+        return value
+
+    def _generation(self, key: CacheKey) -> Tuple[int, int]:
+        """返回快取鍵所屬範圍目前的失效世代"""
+        with self._lock:
+            return self._epoch, self._generations.get(key[:2], 0)
+
+    def set(self, key: CacheKey, value: Any, generation: Optional[Tuple[int, int]] = None) -> None:
+        """
+        寫入快取，記憶體層超過上限時淘汰最久未使用的項目
+        指定 generation 時，範圍在取得世代之後已失效則不寫入
+        """
+        with self._lock:
+            if generation is not None and generation != (self._epoch, self._generations.get(key[:2], 0)):
+                return
+            self._remember(key, value)
+            if self._disk is not None:
+                scope, scope_id, start_time, end_time, _ = key
+                self._disk.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)", (repr(key), scope, scope_id, start_time.isoformat(), end_time.isoformat(), pickle.dumps(value)))
+
+    def _remember(self, key: CacheKey, value: Any) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        self._buckets[key[:2]].add(key)
+        if self._max_end is None or key[3] > self._max_end:
+            self._max_end = key[3]
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._discard_bucket(evicted)
+
+    def _discard_bucket(self, key: CacheKey) -> None:
+        bucket = self._buckets.get(key[:2])
+        if bucket is not None:
+            bucket.discard(key)
+            if not bucket:
+                del self._buckets[key[:2]]
+
+    def invalidate(self, scopes: Iterable[Tuple[str, int]], timestamp: datetime) -> int:
+        """
+        使涵蓋指定時間點的快取失效
+        scopes 為受影響的（範圍種類, 範圍 ID），返回記憶體層移除的項目數
+        """
+        removed = 0
+        timestamp = naive_utc(timestamp)
+        scopes = list(scopes)
+        with self._lock:
+            # 查詢中的範圍尚未計入 _max_end，世代需在略過檢查之前遞增
+            for scope in scopes:
+                self._generations[scope] += 1
+            if self._max_end is None or timestamp > self._max_end:
+                return 0
+            for scope in scopes:
+                for key in [key for key in self._buckets.get(scope, ()) if key[2] <= timestamp <= key[3]]:
+                    del self._entries[key]
+                    self._discard_bucket(key)
+                    removed += 1
+                if self._disk is not None:
+                    self._disk.execute("DELETE FROM results WHERE scope = ? AND scope_id = ? AND start_time <= ? AND end_time >= ?", (scope[0], scope[1], timestamp.isoformat(), timestamp.isoformat()))
+        return removed
+
+    def invalidate_scope(self, scope: str, scope_id: int) -> None:
+        """使某個設備或使用者的所有快取失效"""
+        with self._lock:
+            self._generations[(scope, scope_id)] += 1
+            for key in list(self._buckets.get((scope, scope_id), ())):
+                del self._entries[key]
+                self._discard_bucket(key)
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM results WHERE scope = ? AND scope_id = ?", (scope, scope_id))
+
+    def clear(self) -> None:
+        """清空所有快取"""
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self._max_end = None
+            self._epoch += 1
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM results")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+analytics_cache = ResultCache(
+    max_entries=settings.ANALYTICS_CACHE_MAX_ENTRIES,
+    settled_after=timedelta(hours=settings.ANALYTICS_CACHE_SETTLED_HOURS),
+    disk_path=settings.ANALYTICS_CACHE_DISK_PATH,
+)
+"""全域用電分析結果快取實例"""
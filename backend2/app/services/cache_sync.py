@@ -0,0 +1,147 @@
+"""
+行程內快取同步模組
+近期讀數緩衝、用電排行、告警規則引擎與異常偵測都是每個工作行程各自的記憶體狀態，寫入路徑只更新處理該請求的行程
+多個工作行程（uvicorn --workers）或多個執行個體同時提供服務時，各行程定期從資料庫載入其他行程的寫入：
+新的用電紀錄、設備的位置變更、刪除與上線時間，以及告警規則的變更；每個行程的狀態最多落後一個同步間隔加上穩定界線
+"""
+
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database.clock import utc_now
+from ..database.session import SessionLocal
+from ..database.sharding import telemetry_shards
+from ..database.soft_delete import INCLUDE_DELETED
+from ..models.alert import AlertRule
+from ..models.device import Device, PowerUsageRecord
+from .device import DeviceService
+from .rankings import usage_rankings
+from .rules import rule_engine
+
+logger = logging.getLogger(__name__)
+
+MAX_PENDING_IDS = 10000
+"""最多追蹤的未出現紀錄 ID 數"""
+
+
+class CacheSync:
+    """
+    行程內快取同步
+    用電紀錄以紀錄 ID 為游標（ID 由序列配發，隨時間遞增）；游標之前尚未出現的 ID 可能屬於尚未提交的交易，在穩定界線內持續重新查詢，之後視為已回滾
+    設備與告警規則以資料庫時間的 updated_at 為水位，與設備差異同步相同只讀取早於穩定界線的變更，較晚提交的交易不會被略過
+    本行程寫入的資料也會被同步讀到，由近期讀數緩衝的紀錄 ID 與各元件的冪等更新去除重複
+    """
+
+    def __init__(self, interval: float, settle: float):
+        self.interval = interval
+        self.settle = settle
+        self._last_id = 0  # 已看到的最大紀錄 ID
+        self._pending: Dict[int, float] = {}  # 游標之前尚未出現的紀錄 ID -> 首次發現的時間（time.monotonic）
+        self._since: Optional[datetime] = None  # 設備與告警規則的水位（資料庫的 UTC 時間）
+
+    def start(self, db: Session) -> None:
+        """
+        記錄游標與水位
+        應在預熱前呼叫，預熱期間提交的寫入會在第一次同步時載入，已預熱的部分由去除重複略過
+        """
+        self._since = db.scalar(select(utc_now())) - timedelta(seconds=self.settle)
+        self._last_id = max((value or 0 for value in telemetry_shards.fan_out_all(db, lambda records_db, _: records_db.scalar(select(func.max(PowerUsageRecord.id))))), default=0)
+        self._pending.clear()
+
+    def sync(self, db: Session, now: Optional[float] = None) -> Dict[str, int]:
+        """執行一次同步，返回載入的紀錄數、設備變更數與規則變更數"""
+        if self._since is None:
+            self.start(db)
+        horizon = db.scalar(select(utc_now())) - timedelta(seconds=self.settle)
+        stats = {
+            "devices": self._sync_devices(db, horizon),
+            "rules": self._sync_rules(db, horizon),
+            "records": self._sync_records(db, time.monotonic() if now is None else now),
+        }
+        self._since = max(self._since, horizon)
+        return stats
+
+    def _sync_devices(self, db: Session, horizon: datetime) -> int:
+        """套用水位到穩定界線之間的設備變更：刪除的設備從記憶體狀態移除，其餘更新位置與上線時間"""
+        rows = (
+            db.query(Device.id, Device.user_id, Device.location, Device.last_online, Device.deleted_at)
+            .filter(Device.updated_at > self._since, Device.updated_at <= horizon)
+            .execution_options(**{INCLUDE_DELETED: True})
+            .all()
+        )
+        deleted: Dict[int, List[int]] = defaultdict(list)
+        for device_id, user_id, location, last_online, deleted_at in rows:
+            if deleted_at is not None:
+                deleted[user_id].append(device_id)
+                continue
+            rule_engine.track_device(device_id, user_id)
+            usage_rankings.relocate(device_id, location)
+            if last_online is not None:
+                rule_engine.seen(device_id, user_id, last_online)
+        for user_id, device_ids in deleted.items():
+            DeviceService.forget_devices(user_id, device_ids)
+        return len(rows)
+
+    def _sync_rules(self, db: Session, horizon: datetime) -> int:
+        """移除已刪除或停用的規則，並載入水位到穩定界線之間建立或更新的規則"""
+        active_ids = set(db.scalars(select(AlertRule.id).where(AlertRule.is_active.is_(True))))
+        changed = db.query(AlertRule).filter(AlertRule.updated_at > self._since, AlertRule.updated_at <= horizon).all()
+        rule_engine.sync_rules(active_ids, changed)
+        return len(changed)
+
+    def _sync_records(self, db: Session, now: float) -> int:
+        """載入游標之後與尚未出現的用電紀錄，依設備目前的使用者與位置計入記憶體狀態；已刪除設備的紀錄略過"""
+        last_id, pending = self._last_id, list(self._pending)
+
+        def shard_rows(records_db: Session, _: None) -> list:
+            condition = PowerUsageRecord.id > last_id
+            if pending:
+                condition = or_(condition, PowerUsageRecord.id.in_(pending))
+            return records_db.query(PowerUsageRecord.id, PowerUsageRecord.device_id, PowerUsageRecord.timestamp, PowerUsageRecord.usage, PowerUsageRecord.cost).filter(condition).all()
+
+        rows = sorted((row for shard in telemetry_shards.fan_out_all(db, shard_rows) for row in shard), key=lambda row: row.id)
+        seen = {row.id for row in rows}
+        top = max(seen, default=last_id)
+        if top > last_id:
+            for missing in range(max(last_id + 1, top - MAX_PENDING_IDS), top):
+                if missing not in seen:
+                    self._pending[missing] = now
+        for record_id in seen:
+            self._pending.pop(record_id, None)
+        self._pending = {record_id: found for record_id, found in self._pending.items() if now - found < self.settle}
+        self._last_id = max(last_id, top)
+
+        if not rows:
+            return 0
+        devices = {device_id: (user_id, location) for device_id, user_id, location in db.query(Device.id, Device.user_id, Device.location).filter(Device.id.in_({row.device_id for row in rows}))}
+        for row in rows:
+            if row.device_id in devices:
+                user_id, location = devices[row.device_id]
+                DeviceService.observe_reading(row.device_id, user_id, location, row.id, row.timestamp, float(row.usage), float(row.cost))
+        return len(rows)
+
+    async def run(self) -> None:
+        """每個同步間隔在背景執行緒同步一次，由應用程式生命週期啟動與取消"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await run_in_threadpool(self._sync_once)
+            except Exception:
+                logger.exception("行程內快取同步失敗")
+
+    def _sync_once(self) -> None:
+        with SessionLocal() as db:
+            self.sync(db)
+
+
+cache_sync = CacheSync(interval=settings.CACHE_SYNC_SECONDS, settle=settings.DEVICE_SYNC_SETTLE_SECONDS)
+"""全域行程內快取同步實例"""
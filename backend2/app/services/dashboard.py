@@ -0,0 +1,170 @@
+"""
+儀表板服務層模組
+將節能管家頁面的即時用電、用電趨勢、費用統計與設備用電分布組合為單一快照，取代頁面載入時各元件分別發出的請求
+各區塊的查詢彼此獨立，由路由在各自的 session 中並行執行後交由 assemble 組合；快照依使用者短暫快取
+"""
+
+import asyncio
+import calendar
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models.device import Device
+from ..models.forecast import PowerUsageForecast
+from .device import DeviceService
+from .forecast import ForecastService
+from .rankings import SCOPE_USER
+
+TREND_STATUS_PERCENT = 10.0
+"""最近一小時用電量相對前一小時的變化超過此百分比時，狀態標示為偏高（high）或良好（low）"""
+
+
+def month_start(day: date) -> date:
+    """返回日期所在月份的第一天"""
+    return day.replace(day=1)
+
+
+def previous_month_start(day: date) -> date:
+    """返回日期上個月的第一天"""
+    return month_start(month_start(day) - timedelta(days=1))
+
+
+class DashboardService:
+    """
+    儀表板服務類別
+    提供各區塊的查詢與快照組合
+    所有方法都是靜態方法，不需要實例化即可使用
+    """
+
+    @staticmethod
+    def get_hourly_usage(db: Session, user_id: int, now: datetime) -> Tuple[float, float]:
+        """返回使用者最近一小時與前一小時的總用電量"""
+        hour = timedelta(hours=1)
+        recent = DeviceService.get_total_power_usage(db, user_id=user_id, start_time=now - hour, end_time=now)
+        previous = DeviceService.get_total_power_usage(db, user_id=user_id, start_time=now - 2 * hour, end_time=now - hour)
+        return recent, previous
+
+    @staticmethod
+    def get_daily_usage(db: Session, user_id: int, now: datetime) -> Dict[date, Tuple[float, float]]:
+        """返回使用者從上個月第一天到今天每日的用電量與電費"""
+        start = datetime.combine(previous_month_start(now.date()), datetime.min.time())
+        end = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+        return DeviceService.get_daily_usage(db, user_id=user_id, start_time=start, end_time=end)
+
+    @staticmethod
+    def get_top_devices(db: Session, user_id: int, limit: int) -> List[Tuple[Device, float]]:
+        """返回使用者本月用電量最高的設備與其累計用電量，由記憶體中的用電排行回答"""
+        return DeviceService.get_usage_rankings(db, scope=SCOPE_USER, scope_id=user_id, window="month", limit=limit)
+
+    @staticmethod
+    def assemble(
+        now: datetime,
+        current: List[dict],
+        hourly: Tuple[float, float],
+        daily: Dict[date, Tuple[float, float]],
+        forecasts: List[PowerUsageForecast],
+        top_devices: List[Tuple[Device, float]],
+    ) -> dict:
+        """
+        組合儀表板快照
+        本月電費預估以本月至今的電費依已經過的時間比例推算整月；上個月沒有對應日期（例如 31 日）時上月用電量為 0
+        """
+        today = now.date()
+        this_month = month_start(today)
+        last_month = previous_month_start(today)
+
+        # 即時用電：各設備最新讀數的合計，趨勢為最近一小時相對前一小時的變化百分比
+        recent, previous = hourly
+        trend = (recent - previous) / previous * 100 if previous > 0 else 0.0
+        status = "high" if trend > TREND_STATUS_PERCENT else "low" if trend < -TREND_STATUS_PERCENT else "normal"
+
+        # 用電趨勢：本月每一天與上個月同一天的用電量
+        trend_days = []
+        for offset in range((today - this_month).days + 1):
+            day = this_month + timedelta(days=offset)
+            try:
+                same_day_last_month = last_month.replace(day=day.day)
+            except ValueError:
+                same_day_last_month = None
+            trend_days.append(
+                {
+                    "date": day,
+                    "usage": daily.get(day, (0.0, 0.0))[0],
+                    "last_month": daily.get(same_day_last_month, (0.0, 0.0))[0] if same_day_last_month else 0.0,
+                }
+            )
+
+        # 費用統計
+        month_usage = sum(usage for day, (usage, _) in daily.items() if day >= this_month)
+        month_cost = sum(cost for day, (_, cost) in daily.items() if day >= this_month)
+        last_month_cost = sum(cost for day, (_, cost) in daily.items() if last_month <= day < this_month)
+        elapsed_days = (now - datetime.combine(this_month, datetime.min.time())).total_seconds() / 86400
+        days_in_month = calendar.monthrange(today.year, today.month)[1]
+        estimated = month_cost / elapsed_days * days_in_month if elapsed_days > 0 else month_cost
+
+        # 設備用電分布：本月用電量最高的設備，其餘合併為其他設備
+        distribution = [{"device_id": device.id, "name": device.name, "usage": total} for device, total in top_devices]
+        others = month_usage - sum(item["usage"] for item in distribution)
+        if others > 0:
+            distribution.append({"device_id": None, "name": "其他設備", "usage": others})
+        distribution_total = sum(item["usage"] for item in distribution)
+        for item in distribution:
+            item["percentage"] = item["usage"] / distribution_total * 100 if distribution_total > 0 else 0.0
+
+        return {
+            "generated_at": now,
+            "current": {"usage": sum(item["usage"] for item in current), "trend": trend, "status": status, "devices": current},
+            "daily": trend_days,
+            "costs": {"month_to_date": month_cost, "estimated": estimated, "last_month": last_month_cost, "saved": max(last_month_cost - estimated, 0.0)},
+            "forecast": ForecastService.summarize(forecasts),
+            "devices": distribution,
+        }
+
+
+class SnapshotCache:
+    """
+    儀表板快照快取
+    依使用者保存最近一次的快照，逾期前直接返回；同一使用者同時到達的請求共用同一次計算
+    只在事件迴圈中存取，不需要加鎖
+    """
+
+    def __init__(self, ttl_seconds: float = 10.0, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, Tuple[float, dict]]" = OrderedDict()  # 使用者 ID -> (建立時間, 快照)
+        self._pending: Dict[int, "asyncio.Future[dict]"] = {}
+
+    async def get_or_compute(self, user_id: int, compute: Callable[[], Awaitable[dict]], now: Optional[float] = None) -> dict:
+        """取得使用者的快照，沒有未逾期的快照時計算"""
+        now = time.monotonic() if now is None else now
+        entry = self._entries.get(user_id)
+        if entry is not None and now - entry[0] < self.ttl_seconds:
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+        task = self._pending.get(user_id)
+        if task is None:
+            task = asyncio.ensure_future(compute())
+            self._pending[user_id] = task
+            task.add_done_callback(lambda done: self._finish(user_id, done))
+        # 個別請求中斷時不取消共用的計算
+        return await asyncio.shield(task)
+
+    def _finish(self, user_id: int, task: "asyncio.Future[dict]") -> None:
+        """計算完成時保存快照；計算失敗時不保存，下一個請求重新計算"""
+        self._pending.pop(user_id, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        self._entries[user_id] = (time.monotonic(), task.result())
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+dashboard_snapshots = SnapshotCache(ttl_seconds=settings.DASHBOARD_CACHE_SECONDS, max_entries=settings.DASHBOARD_CACHE_MAX_ENTRIES)
+"""全域儀表板快照快取實例"""
@@ -4,13 +4,28 @@
 包括設備的 CRUD 操作、狀態管理和用電量統計功能
 """
 
-from datetime import datetime
-from typing import List, Optional, Tuple
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 
+from sqlalchemy import Date, Float, and_, cast, delete, literal, or_, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 from sqlalchemy.sql import func
 
+from ..config import settings
+from ..database.clock import utc_now
+from ..database.replicas import ReadReplicas
+from ..database.sharding import telemetry_shards
+from ..database.soft_delete import INCLUDE_DELETED
+from ..database.unit_of_work import on_commit, on_rollback
 from ..models.device import Device, PowerUsageRecord
+from .anomaly import anomaly_detector
+from .cache import ResultCache, analytics_cache
+from .rankings import period_start, usage_rankings
+from .recent import recent_readings
+from .rules import rule_engine
+from .series import Columns, columns_from_rows, records_from_columns
+from .tasks import task_runner
 
 
 class DeviceService:
@@ -18,29 +33,80 @@ class DeviceService:
     設備服務類別
     處理所有與設備相關的業務邏輯，包括設備管理和用電量記錄
     所有方法都是靜態方法，不需要實例化即可使用
+    寫入方法不提交交易，由呼叫端（路由）提交；依賴寫入結果的記憶體狀態在提交後才更新
     """
 
     @staticmethod
     def create_device(db: Session, user_id: int, name: str, device_id: str, type: str, location: Optional[str] = None, description: Optional[str] = None) -> Device:
         """
         創建新設備
-        為指定使用者創建一個新的智慧設備記錄
+        為指定使用者創建一個新的智慧設備記錄，以 INSERT ... RETURNING 一次取回包含伺服器預設值的完整資料列
+        updated_at 與更新、刪除相同，明確使用資料庫的 UTC 時間
         """
-        db_device = Device(user_id=user_id, name=name, device_id=device_id, type=type, location=location, description=description)
-        db.add(db_device)
-        db.commit()
-        db.refresh(db_device)
+        stmt = insert(Device).values(user_id=user_id, name=name, device_id=device_id, type=type, location=location, description=description, updated_at=utc_now()).returning(Device)
+        db_device = db.scalars(stmt).one()
+        on_commit(db, lambda: rule_engine.track_device(db_device.id, user_id))
         return db_device
 
+    @staticmethod
+    def bulk_create_devices(db: Session, user_id: int, rows: List[Tuple[int, dict]], chunk_size: int = 1000) -> Tuple[List[Tuple[int, int, str]], List[Tuple[int, str, str]]]:
+        """
+        批次創建設備
+        rows 為（列號, 設備欄位）清單；以單次 IN 查詢檢查整批設備 ID 是否已被使用，再以多列 INSERT 分段寫入，由呼叫端一次提交
+        返回成功建立的（列號, 設備 ID, 設備唯一識別碼）與失敗的（列號, 設備唯一識別碼, 原因）
+        """
+        errors: List[Tuple[int, str, str]] = []
+        created: List[Tuple[int, int, str]] = []
+
+        # 匯入資料內重複的設備 ID 只保留第一筆
+        seen = set()
+        candidates = []
+        for row, data in rows:
+            if data["device_id"] in seen:
+                errors.append((row, data["device_id"], "設備ID在匯入資料中重複"))
+            else:
+                seen.add(data["device_id"])
+                candidates.append((row, data))
+
+        # 已刪除的設備仍佔用設備 ID 的唯一索引
+        existing = {device_id for (device_id,) in db.query(Device.device_id).filter(Device.device_id.in_(seen)).execution_options(**{INCLUDE_DELETED: True})} if seen else set()
+        pending = []
+        for row, data in candidates:
+            if data["device_id"] in existing:
+                errors.append((row, data["device_id"], "設備ID已被使用"))
+            else:
+                pending.append((row, data))
+
+        for i in range(0, len(pending), chunk_size):
+            chunk = pending[i : i + chunk_size]
+            stmt = (
+                insert(Device.__table__)
+                .values([{**data, "user_id": user_id, "updated_at": utc_now()} for _, data in chunk])
+                .on_conflict_do_nothing(index_elements=["device_id"])
+                .returning(Device.__table__.c.id, Device.__table__.c.device_id)
+            )
+            inserted = {device_id: id for id, device_id in db.execute(stmt)}
+
+            # 檢查之後才被其他請求搶先使用的設備 ID 不會寫入，同樣回報為已被使用
+            for row, data in chunk:
+                if data["device_id"] in inserted:
+                    created.append((row, inserted[data["device_id"]], data["device_id"]))
+                else:
+                    errors.append((row, data["device_id"], "設備ID已被使用"))
+
+        on_commit(db, lambda: [rule_engine.track_device(id, user_id) for _, id, _ in created])
+        errors.sort()
+        return created, errors
+
     @staticmethod
     def get_device_by_id(db: Session, device_id: int) -> Optional[Device]:
         """根據設備 ID 查詢設備資訊"""
         return db.query(Device).filter(Device.id == device_id).first()
 
     @staticmethod
-    def get_device_by_device_id(db: Session, device_id: str) -> Optional[Device]:
-        """根據設備唯一識別碼查詢設備資訊"""
-        return db.query(Device).filter(Device.device_id == device_id).first()
+    def get_device_by_device_id(db: Session, device_id: str, include_deleted: bool = False) -> Optional[Device]:
+        """根據設備唯一識別碼查詢設備資訊，唯一性檢查需包含已刪除的設備"""
+        return db.query(Device).filter(Device.device_id == device_id).execution_options(**{INCLUDE_DELETED: include_deleted}).first()
 
     @staticmethod
     def list_devices(db: Session, user_id: int, skip: int = 0, limit: int = 10) -> Tuple[List[Device], int]:
@@ -53,78 +119,365 @@ class DeviceService:
         return devices, total
 
     @staticmethod
-    def update_device(db: Session, device: Device, **kwargs) -> Device:
+    def list_device_changes(db: Session, user_id: int, since: Optional[Tuple[datetime, int]] = None, limit: int = 100) -> List[Device]:
+        """
+        列出變更的設備
+        依 (updated_at, id) 鍵集順序返回 since 之後建立、更新或軟刪除的設備，已刪除的設備由呼叫端作為墓碑回報；未指定 since 時為初次同步，只返回未刪除的設備
+        只返回 updated_at 早於穩定界線的變更，避免較晚提交的交易以較早的 updated_at 出現在已同步的位置之前而被略過
+        updated_at 由資料庫的 UTC 時間產生，穩定界線同樣以資料庫時間計算，不受應用程式主機的時鐘影響
+        """
+        horizon = utc_now() - timedelta(seconds=settings.DEVICE_SYNC_SETTLE_SECONDS)
+        query = db.query(Device).filter(Device.user_id == user_id, Device.updated_at <= horizon).execution_options(**{INCLUDE_DELETED: True})
+        if since is None:
+            query = query.filter(Device.deleted_at.is_(None))
+        else:
+            updated_at, device_id = since
+            query = query.filter(or_(Device.updated_at > updated_at, and_(Device.updated_at == updated_at, Device.id > device_id)))
+        return query.order_by(Device.updated_at, Device.id).limit(limit).all()
+
+    @staticmethod
+    def search_devices(db: Session, user_id: int, query: str, limit: int = 20, after: Optional[Tuple[float, int]] = None) -> List[Tuple[Device, float]]:
+        """
+        模糊搜尋使用者的設備
+        以 pg_trgm 的 word_similarity 比對設備名稱、設備唯一識別碼與位置（由 GIN 三元組索引支援），依相似度由高到低排序
+        after 為上一頁最後一筆的（相似度, 設備 ID），用於鍵集分頁
+        """
+        columns = (Device.name, Device.device_id, Device.location)
+        score = cast(func.greatest(*(func.word_similarity(query, column) for column in columns)), Float)
+        q = db.query(Device, score).filter(Device.user_id == user_id, Device.deleted_at.is_(None), or_(*(literal(query).op("<%")(column) for column in columns)))
+        if after is not None:
+            last_score, last_id = after
+            q = q.filter(or_(score < last_score, and_(score == last_score, Device.id > last_id)))
+        return q.order_by(score.desc(), Device.id).limit(limit).all()
+
+    @staticmethod
+    def _update_owned(db: Session, user_id: int, device_id: int, values: dict) -> Optional[Device]:
+        """
+        更新使用者擁有的單一設備
+        以單一 UPDATE ... WHERE ... RETURNING 執行，所有權與未刪除條件直接寫在 WHERE 中；設備不存在或不屬於使用者時返回 None
+        """
+        stmt = (
+            update(Device)
+            .where(Device.id == device_id, Device.user_id == user_id, Device.deleted_at.is_(None))
+            .values(**values, updated_at=utc_now())
+            .returning(Device)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        )
+        return db.scalars(stmt).one_or_none()
+
+    @staticmethod
+    def update_device(db: Session, user_id: int, device_id: int, **kwargs) -> Optional[Device]:
         """
         更新設備資訊
-        可以更新設備的任何欄位，包括名稱、位置、描述等
-        """
-        for key, value in kwargs.items():
-            if hasattr(device, key):
-                setattr(device, key, value)
-        device.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(device)
+        可以更新設備的任何欄位，包括名稱、位置、描述等；設備不存在或不屬於使用者時返回 None
+        """
+        device = DeviceService._update_owned(db, user_id, device_id, {key: value for key, value in kwargs.items() if hasattr(Device, key)})
+        if device is not None and "location" in kwargs:
+            on_commit(db, lambda: usage_rankings.relocate(device.id, device.location))
         return device
 
     @staticmethod
-    def delete_device(db: Session, device: Device) -> None:
+    def delete_device(db: Session, user_id: int, device_id: int) -> bool:
         """
         刪除設備（軟刪除）
-        將設備標記為已刪除，但保留資料庫記錄
+        將設備標記為已刪除，但保留資料庫記錄；返回設備是否存在且屬於使用者
         """
-        device.deleted_at = datetime.utcnow()
-        device.is_active = False
-        db.commit()
+        return bool(DeviceService.bulk_delete_devices(db, user_id, ids=[device_id]))
 
     @staticmethod
-    def update_device_status(db: Session, device: Device, status: str) -> Device:
+    def update_device_status(db: Session, user_id: int, device_id: int, status: str) -> Optional[Device]:
         """
         更新設備狀態
-        更新設備的在線狀態，並記錄最後在線時間
+        更新設備的在線狀態，並記錄最後在線時間；設備不存在或不屬於使用者時返回 None
         """
-        device.status = status
-        device.last_online = datetime.utcnow() if status == "online" else device.last_online
-        device.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(device)
+        values = {"status": status}
+        if status == "online":
+            values["last_online"] = utc_now()
+        device = DeviceService._update_owned(db, user_id, device_id, values)
+        if device is not None:
+            on_commit(db, lambda: rule_engine.status_changed(device.id, user_id, status))
         return device
 
     @staticmethod
-    def record_power_usage(db: Session, device_id: int, usage: float, timestamp: datetime, cost: float) -> PowerUsageRecord:
+    def _bulk_update(db: Session, user_id: int, values: dict, ids: Optional[List[int]] = None, location: Optional[str] = None, type: Optional[str] = None) -> List[int]:
+        """
+        依條件批次更新設備
+        以單一 UPDATE ... WHERE ... RETURNING 執行，所有權與未刪除條件直接寫在 WHERE 中，返回受影響的設備 ID
+        """
+        conditions = [Device.user_id == user_id, Device.deleted_at.is_(None)]
+        if ids is not None:
+            conditions.append(Device.id.in_(ids))
+        if location is not None:
+            conditions.append(Device.location == location)
+        if type is not None:
+            conditions.append(Device.type == type)
+
+        stmt = update(Device).where(*conditions).values(**values, updated_at=utc_now()).returning(Device.id).execution_options(synchronize_session=False)
+        return list(db.scalars(stmt))
+
+    @staticmethod
+    def bulk_update_status(db: Session, user_id: int, status: str, ids: Optional[List[int]] = None, location: Optional[str] = None, type: Optional[str] = None) -> List[int]:
+        """
+        批次更新設備狀態
+        更新符合條件設備的在線狀態，狀態為 online 時同時記錄最後在線時間
+        """
+        values = {"status": status}
+        if status == "online":
+            values["last_online"] = utc_now()
+        affected = DeviceService._bulk_update(db, user_id, values, ids=ids, location=location, type=type)
+        on_commit(db, lambda: [rule_engine.status_changed(device_id, user_id, status) for device_id in affected])
+        return affected
+
+    @staticmethod
+    def bulk_delete_devices(db: Session, user_id: int, ids: Optional[List[int]] = None, location: Optional[str] = None, type: Optional[str] = None) -> List[int]:
+        """
+        批次刪除設備（軟刪除）
+        將符合條件的設備標記為已刪除並停用，並使使用者的用電分析快取失效
+        """
+        affected = DeviceService._bulk_update(db, user_id, {"deleted_at": utc_now(), "is_active": False}, ids=ids, location=location, type=type)
+        if affected:
+            on_commit(db, lambda: DeviceService.forget_devices(user_id, affected))
+        return affected
+
+    @staticmethod
+    def forget_devices(user_id: int, device_ids: List[int]) -> None:
+        """
+        從記憶體狀態中移除已刪除的設備
+        由刪除的提交後回呼呼叫，其他行程刪除的設備由 cache_sync 呼叫
+        """
+        # 已刪除設備的用電量不再計入使用者的總用電量與排行
+        analytics_cache.invalidate_scope("user", user_id)
+        for device_id in device_ids:
+            recent_readings.forget(device_id)
+            usage_rankings.remove(device_id)
+            rule_engine.forget_device(device_id)
+            anomaly_detector.forget(device_id)
+
+    @staticmethod
+    def bulk_update_location(db: Session, user_id: int, new_location: Optional[str], ids: Optional[List[int]] = None, location: Optional[str] = None, type: Optional[str] = None) -> List[int]:
+        """
+        批次變更設備位置
+        將符合條件的設備移到新的位置，設備在目前期間的排行累計值隨設備移到新位置
+        """
+        affected = DeviceService._bulk_update(db, user_id, {"location": new_location}, ids=ids, location=location, type=type)
+        on_commit(db, lambda: [usage_rankings.relocate(device_id, new_location) for device_id in affected])
+        return affected
+
+    @staticmethod
+    def record_power_usage(db: Session, user_id: int, device_id: int, usage: float, timestamp: datetime, cost: float) -> Optional[int]:
         """
         記錄設備用電量
-        創建新的用電量記錄，並更新設備的總用電量
+        以 UPDATE ... RETURNING 累加設備的總用電量（所有權條件寫在 WHERE 中），再以 INSERT ... RETURNING 在設備所在的分片創建用電量記錄，返回記錄 ID；設備不存在或不屬於使用者時返回 None
+        啟用分片時紀錄 ID 由主資料庫的序列配發，跨分片唯一
+        提交後加入近期讀數緩衝並交由異常偵測器即時檢查，遲到的讀數會使涵蓋該時間點的分析快取失效
+        啟用分片時用電紀錄與設備總用電量分屬不同資料庫，無法在同一交易中提交：用電紀錄先提交到分片，主資料庫未提交（回滾或請求失敗）時刪除該筆紀錄作為補償
+        兩次提交之間行程中止時補償不會執行，分片上會留下沒有計入設備總用電量的紀錄；各種用電統計皆以分片上的紀錄計算，只有設備的 power_usage 累計值會略少
+        """
+        stmt = (
+            update(Device)
+            .where(Device.id == device_id, Device.user_id == user_id, Device.deleted_at.is_(None))
+            .values(power_usage=Device.power_usage + usage, updated_at=utc_now())
+            .returning(Device.location)
+            .execution_options(synchronize_session=False)
+        )
+        device = db.execute(stmt).one_or_none()
+        if device is None:
+            return None
+
+        values = {"device_id": device_id, "usage": usage, "timestamp": timestamp, "cost": cost}
+        if telemetry_shards.sharded:
+            # 各分片的自動遞增 ID 會重複，改由主資料庫統一配發
+            values["id"] = telemetry_shards.allocate_record_id(db)
+
+        with telemetry_shards.session_for_device(db, device_id) as records_db:
+            record_id = records_db.scalar(insert(PowerUsageRecord.__table__).values(**values).returning(PowerUsageRecord.__table__.c.id))
+            # 啟用分片時用電紀錄先提交到分片，主資料庫的設備總用電量由呼叫端提交
+            if records_db is not db:
+                records_db.commit()
+
+                def discard() -> None:
+                    with telemetry_shards.session_for_device(db, device_id) as shard_db:
+                        shard_db.execute(delete(PowerUsageRecord.__table__).where(PowerUsageRecord.__table__.c.id == record_id))
+                        shard_db.commit()
+
+                on_rollback(db, discard)
+
+        on_commit(db, lambda: DeviceService.observe_reading(device_id, user_id, device.location, record_id, timestamp, float(usage), float(cost)))
+        return record_id
+
+    @staticmethod
+    def observe_reading(device_id: int, user_id: int, location: Optional[str], record_id: int, timestamp: datetime, usage: float, cost: float) -> None:
+        """
+        將一筆已提交的讀數計入記憶體狀態：近期讀數緩衝、分析快取失效、用電排行、告警規則與異常偵測
+        由寫入的提交後回呼呼叫，其他行程寫入的讀數由 cache_sync 呼叫；以近期讀數緩衝的紀錄 ID 去除重複，同一筆讀數只計入一次
         """
-        record = PowerUsageRecord(device_id=device_id, usage=usage, timestamp=timestamp, cost=cost)
-        db.add(record)
+        if not recent_readings.append(device_id, record_id, timestamp, usage, cost):
+            return
+        task_runner.submit("invalidate_analytics_cache", ([("device", device_id), ("user", user_id)], timestamp))
+        usage_rankings.observe(device_id, user_id, location, usage, timestamp)
+        rule_engine.observe(device_id, user_id, usage, cost, timestamp)
+        anomaly_detector.observe(device_id=device_id, user_id=user_id, usage=usage, timestamp=timestamp)
+        if anomaly_detector.claim_snapshot():
+            task_runner.submit("save_anomaly_snapshot")
 
-        # 更新設備的總用電量
-        device = db.query(Device).filter(Device.id == device_id).first()
-        if device:
-            device.power_usage += usage
-            device.updated_at = datetime.utcnow()
+    @staticmethod
+    def get_device_power_usage_columns(db: Session, device_id: int, start_time: datetime, end_time: datetime) -> Columns:
+        """
+        獲取設備用電量欄位陣列
+        查詢指定時間範圍內的設備用電量記錄並以欄位陣列返回，近期的時間範圍由近期讀數緩衝回答，已結算的時間範圍會從分析快取讀取
+        """
+        recent = recent_readings.query(device_id, start_time, end_time)
+        if recent is not None:
+            return recent
 
-        db.commit()
-        db.refresh(record)
-        return record
+        def query() -> Columns:
+            with telemetry_shards.session_for_device(db, device_id) as records_db:
+                rows = (
+                    records_db.query(PowerUsageRecord.id, PowerUsageRecord.timestamp, PowerUsageRecord.usage, PowerUsageRecord.cost)
+                    .filter(PowerUsageRecord.device_id == device_id, PowerUsageRecord.timestamp >= start_time, PowerUsageRecord.timestamp <= end_time)
+                    .order_by(PowerUsageRecord.timestamp)
+                    .all()
+                )
+            return columns_from_rows(rows)
+
+        return analytics_cache.get_or_compute(ResultCache.make_key("device", device_id, start_time, end_time, "columns"), query, fresh=lambda: ReadReplicas.caught_up(db))
 
     @staticmethod
-    def get_device_power_usage(db: Session, device_id: int, start_time: datetime, end_time: datetime) -> List[PowerUsageRecord]:
+    def get_device_power_usage(db: Session, device_id: int, start_time: datetime, end_time: datetime) -> List[dict]:
         """
         獲取設備用電量記錄
-        查詢指定時間範圍內的設備用電量記錄
+        查詢指定時間範圍內的設備用電量記錄，返回依時間排序的紀錄清單
         """
-        return db.query(PowerUsageRecord).filter(PowerUsageRecord.device_id == device_id, PowerUsageRecord.timestamp >= start_time, PowerUsageRecord.timestamp <= end_time).all()
+        return records_from_columns(device_id, DeviceService.get_device_power_usage_columns(db, device_id, start_time, end_time))
 
     @staticmethod
     def get_total_power_usage(db: Session, user_id: int, start_time: datetime, end_time: datetime) -> float:
         """
         計算使用者所有設備的總用電量
-        統計指定時間範圍內所有設備的用電量總和
+        統計指定時間範圍內所有設備的用電量總和，已結算的時間範圍會從分析快取讀取
+        db 為落後主資料庫的唯讀複本時，查詢結果不寫入已結算範圍的快取
+        啟用分片時各分片平行計算所屬設備的小計後加總
+        """
+
+        def shard_total(records_db: Session, device_ids: List[int]) -> float:
+            total = records_db.query(func.sum(PowerUsageRecord.usage)).filter(PowerUsageRecord.device_id.in_(device_ids), PowerUsageRecord.timestamp >= start_time, PowerUsageRecord.timestamp <= end_time).scalar()
+            return float(total or 0)
+
+        def query() -> float:
+            device_ids = [device_id for (device_id,) in db.query(Device.id).filter(Device.user_id == user_id)]
+            return sum(telemetry_shards.fan_out(db, telemetry_shards.partition(device_ids), shard_total))
+
+        return analytics_cache.get_or_compute(ResultCache.make_key("user", user_id, start_time, end_time, "total"), query, fresh=lambda: ReadReplicas.caught_up(db))
+
+    @staticmethod
+    def get_daily_usage(db: Session, user_id: int, start_time: datetime, end_time: datetime) -> Dict[date, Tuple[float, float]]:
+        """
+        計算使用者所有設備每日的用電量與電費
+        返回 {日期: (用電量, 電費)}，只包含有讀數的日期；各分片平行以 GROUP BY 日期彙總後合併，已結算的時間範圍會從分析快取讀取
+        """
+        day = func.date(PowerUsageRecord.timestamp, type_=Date)
+
+        def shard_daily(records_db: Session, device_ids: List[int]) -> list:
+            return (
+                records_db.query(day, func.sum(PowerUsageRecord.usage), func.sum(PowerUsageRecord.cost))
+                .filter(PowerUsageRecord.device_id.in_(device_ids), PowerUsageRecord.timestamp >= start_time, PowerUsageRecord.timestamp < end_time)
+                .group_by(day)
+                .all()
+            )
+
+        def query() -> Dict[date, Tuple[float, float]]:
+            device_ids = [device_id for (device_id,) in db.query(Device.id).filter(Device.user_id == user_id)]
+            totals: Dict[date, Tuple[float, float]] = {}
+            for shard in telemetry_shards.fan_out(db, telemetry_shards.partition(device_ids), shard_daily):
+                for day_value, usage, cost in shard:
+                    prev_usage, prev_cost = totals.get(day_value, (0.0, 0.0))
+                    totals[day_value] = (prev_usage + float(usage or 0), prev_cost + float(cost or 0))
+            return totals
+
+        return analytics_cache.get_or_compute(ResultCache.make_key("user", user_id, start_time, end_time, "daily"), query, fresh=lambda: ReadReplicas.caught_up(db))
+
+    @staticmethod
+    def get_current_power(db: Session, user_id: int) -> List[dict]:
         """
-        devices = db.query(Device).filter(Device.user_id == user_id).all()
-        device_ids = [device.id for device in devices]
+        獲取使用者各設備的最新讀數
+        優先由近期讀數緩衝回答；緩衝尚未預熱時改為在各分片查詢近期最新的一筆，沒有近期讀數的設備不列入
+        """
+        device_ids = [device_id for (device_id,) in db.query(Device.id).filter(Device.user_id == user_id, Device.deleted_at.is_(None)).all()]
+        latest = recent_readings.latest(device_ids)
+        if latest is None:
+            since = datetime.utcnow() - recent_readings.window
+
+            def shard_latest(records_db: Session, shard_device_ids: List[int]) -> List[dict]:
+                newest = (
+                    records_db.query(PowerUsageRecord.device_id, func.max(PowerUsageRecord.timestamp).label("timestamp"))
+                    .filter(PowerUsageRecord.device_id.in_(shard_device_ids), PowerUsageRecord.timestamp >= since)
+                    .group_by(PowerUsageRecord.device_id)
+                    .subquery()
+                )
+                rows = records_db.query(PowerUsageRecord.device_id, PowerUsageRecord.usage, PowerUsageRecord.cost, PowerUsageRecord.timestamp).join(
+                    newest, and_(PowerUsageRecord.device_id == newest.c.device_id, PowerUsageRecord.timestamp == newest.c.timestamp)
+                )
+                return [{"device_id": row.device_id, "usage": float(row.usage), "cost": float(row.cost), "timestamp": row.timestamp} for row in rows]
+
+            latest = {row["device_id"]: row for shard in telemetry_shards.fan_out(db, telemetry_shards.partition(device_ids), shard_latest) for row in shard}
+        return [latest[device_id] for device_id in device_ids if device_id in latest]
+
+    @staticmethod
+    def get_usage_rankings(db: Session, scope: str, scope_id: object, window: str, limit: int) -> List[Tuple[Device, float]]:
+        """
+        獲取用電排行
+        從記憶體中的排行取得前 N 名設備 ID，再以單次主鍵查詢載入設備資料，不查詢用電紀錄資料表
+        """
+        leaders = usage_rankings.top(scope, scope_id, window, limit)
+        devices = {device.id: device for device in db.query(Device).filter(Device.id.in_([device_id for device_id, _ in leaders]))} if leaders else {}
+        return [(devices[device_id], total) for device_id, total in leaders if device_id in devices]
+
+    @staticmethod
+    def warm_recent_readings(db: Session) -> int:
+        """
+        預熱近期讀數緩衝
+        在所有分片上平行讀取緩衝期間內的用電紀錄並依時間載入緩衝，返回載入的筆數
+        """
+        since = datetime.utcnow() - recent_readings.window
+
+        def shard_rows(records_db: Session, _: None) -> list:
+            return (
+                records_db.query(PowerUsageRecord.id, PowerUsageRecord.device_id, PowerUsageRecord.timestamp, PowerUsageRecord.usage, PowerUsageRecord.cost)
+                .filter(PowerUsageRecord.timestamp >= since)
+                .order_by(PowerUsageRecord.device_id, PowerUsageRecord.timestamp)
+                .all()
+            )
+
+        return recent_readings.warm((row for shard in telemetry_shards.fan_out_all(db, shard_rows) for row in shard), since)
+
+    @staticmethod
+    def warm_rankings(db: Session) -> None:
+        """
+        預熱用電排行
+        在所有分片上平行彙總本週與本月每個設備每日的用電量，依設備目前的使用者與位置載入排行
+        """
+        now = datetime.utcnow()
+        since = datetime.combine(min(period_start("week", now), period_start("month", now)), datetime.min.time())
+        devices = {device_id: (user_id, location) for device_id, user_id, location in db.query(Device.id, Device.user_id, Device.location)}
+        day = func.date(PowerUsageRecord.timestamp, type_=Date)
+
+        def shard_rows(records_db: Session, _: None) -> list:
+            return records_db.query(PowerUsageRecord.device_id, day, func.sum(PowerUsageRecord.usage)).filter(PowerUsageRecord.timestamp >= since).group_by(PowerUsageRecord.device_id, day).all()
+
+        rows = (row for shard in telemetry_shards.fan_out_all(db, shard_rows) for row in shard)
+        usage_rankings.load(((device_id, *devices[device_id], day, total) for device_id, day, total in rows if device_id in devices), now=now)
+
+
+def _invalidate_analytics_cache(payloads: List[Tuple[List[Tuple[str, int]], datetime]]) -> None:
+    """背景工作：使遲到讀數所涵蓋的分析快取失效"""
+    for scopes, timestamp in payloads:
+        analytics_cache.invalidate(scopes, timestamp)
+
+
+def _save_anomaly_snapshot(payloads: List[None]) -> None:
+    """背景工作：寫入異常偵測統計值快照，同一批次只寫入一次"""
+    anomaly_detector.save()
 
-        total = db.query(func.sum(PowerUsageRecord.usage)).filter(PowerUsageRecord.device_id.in_(device_ids), PowerUsageRecord.timestamp >= start_time, PowerUsageRecord.timestamp <= end_time).scalar()
 
-        return float(total or 0)
+task_runner.register("invalidate_analytics_cache", _invalidate_analytics_cache)
+task_runner.register("save_anomaly_snapshot", _save_anomaly_snapshot)
@@ -0,0 +1,152 @@
+"""
+用電預測服務層模組
+以批次方式為所有設備預測下個月的用電量與電費
+每日彙總資料載入為 NumPy 矩陣（設備 × 日期），一次對所有設備向量化擬合季節性加趨勢模型
+"""
+
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import Date, insert
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from ..database.sharding import telemetry_shards
+from ..models.device import Device, PowerUsageRecord
+from ..models.forecast import PowerUsageForecast
+
+
+class ForecastService:
+    """
+    用電預測服務類別
+    處理預測批次工作與預測結果查詢
+    所有方法都是靜態方法，不需要實例化即可使用
+    """
+
+    @staticmethod
+    def next_period(today: date) -> Tuple[date, date]:
+        """計算下個月的預測期間，返回（起始日, 結束日）且結束日不含"""
+        period_start = (today.replace(day=1) + timedelta(days=32)).replace(day=1)
+        period_end = (period_start + timedelta(days=32)).replace(day=1)
+        return period_start, period_end
+
+    @staticmethod
+    def load_daily_matrix(db: Session, device_ids: List[int], start: date, days: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        載入每日彙總矩陣
+        以 GROUP BY 查詢取得指定設備在期間內每日的用電量與電費（啟用分片時各分片平行查詢），返回兩個（設備數 × 天數）矩陣
+        """
+        usage = np.zeros((len(device_ids), days))
+        cost = np.zeros((len(device_ids), days))
+        if not device_ids:
+            return usage, cost
+
+        day = func.date(PowerUsageRecord.timestamp, type_=Date)
+
+        def shard_rows(records_db: Session, shard_device_ids: List[int]) -> list:
+            return (
+                records_db.query(PowerUsageRecord.device_id, day, func.sum(PowerUsageRecord.usage), func.sum(PowerUsageRecord.cost))
+                .filter(PowerUsageRecord.device_id.in_(shard_device_ids), PowerUsageRecord.timestamp >= datetime.combine(start, datetime.min.time()), PowerUsageRecord.timestamp < datetime.combine(start + timedelta(days=days), datetime.min.time()))
+                .group_by(PowerUsageRecord.device_id, day)
+                .all()
+            )
+
+        rows = [row for shard in telemetry_shards.fan_out(db, telemetry_shards.partition(device_ids), shard_rows) for row in shard]
+        if not rows:
+            return usage, cost
+
+        index = {device_id: i for i, device_id in enumerate(device_ids)}
+        row_idx = np.fromiter((index[row[0]] for row in rows), dtype=np.intp, count=len(rows))
+        day_idx = np.fromiter(((row[1] - start).days for row in rows), dtype=np.intp, count=len(rows))
+        usage[row_idx, day_idx] = np.fromiter((row[2] or 0 for row in rows), dtype=float, count=len(rows))
+        cost[row_idx, day_idx] = np.fromiter((row[3] or 0 for row in rows), dtype=float, count=len(rows))
+        return usage, cost
+
+    @staticmethod
+    def fit_seasonal_trend(usage: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        """
+        向量化擬合季節性加趨勢模型
+        usage 為（設備數 × 天數）的歷史矩陣，天數必須是 7 的倍數，第 0 欄為最早的一天
+        offsets 為欲預測的日期相對於歷史第 0 欄的天數，返回（設備數 × 預測天數）的每日預測值
+        季節項取各星期幾的歷史平均，趨勢項以每週總量的最小平方法斜率推估
+        """
+        devices, days = usage.shape
+        weeks = days // 7
+        by_week = usage.reshape(devices, weeks, 7)
+
+        # 每個設備在星期幾（相對歷史第 0 欄）的平均用電量
+        seasonal = by_week.mean(axis=1)
+
+        # 每週總量對週序的斜率，換算為每日用電量每天的變化量
+        x = np.arange(weeks) - (weeks - 1) / 2
+        slope = by_week.sum(axis=2) @ x / (x @ x) if weeks > 1 else np.zeros(devices)
+        daily_trend = slope / 49
+
+        # 季節平均對應歷史期間的中點，趨勢以與中點的距離外推
+        forecast = seasonal[:, offsets % 7] + np.outer(daily_trend, offsets - (days - 1) / 2)
+        return np.clip(forecast, 0, None)
+
+    @staticmethod
+    def run_forecast_job(db: Session, today: Optional[date] = None, history_weeks: int = 8, batch_size: int = 5000) -> int:
+        """
+        執行預測批次工作
+        分批載入設備的每日彙總並一次擬合整批設備，取代該期間既有的預測結果，返回產生預測的設備數
+        """
+        today = today or datetime.utcnow().date()
+        period_start, period_end = ForecastService.next_period(today)
+        history_days = history_weeks * 7
+        history_start = today - timedelta(days=history_days)
+        offsets = np.arange((period_start - history_start).days, (period_end - history_start).days)
+
+        devices = db.query(Device.id, Device.user_id).filter(Device.deleted_at.is_(None)).order_by(Device.id).all()
+        db.query(PowerUsageForecast).filter(PowerUsageForecast.period_start == period_start).delete(synchronize_session=False)
+
+        for i in range(0, len(devices), batch_size):
+            batch = devices[i : i + batch_size]
+            device_ids = [device.id for device in batch]
+            usage, cost = ForecastService.load_daily_matrix(db, device_ids, history_start, history_days)
+
+            predicted_usage = ForecastService.fit_seasonal_trend(usage, offsets).sum(axis=1)
+
+            # 以各設備的歷史平均電價換算電費，沒有歷史用電的設備使用整批的平均電價
+            usage_total = usage.sum(axis=1)
+            cost_total = cost.sum(axis=1)
+            fallback_rate = cost_total.sum() / usage_total.sum() if usage_total.sum() > 0 else 0.0
+            rate = np.divide(cost_total, usage_total, out=np.full(len(batch), fallback_rate), where=usage_total > 0)
+            predicted_cost = predicted_usage * rate
+
+            db.execute(
+                insert(PowerUsageForecast),
+                [
+                    {"device_id": device.id, "user_id": device.user_id, "period_start": period_start, "period_end": period_end, "predicted_usage": round(float(u), 2), "predicted_cost": round(float(c), 2)}
+                    for device, u, c in zip(batch, predicted_usage, predicted_cost)
+                ],
+            )
+
+        db.commit()
+        return len(devices)
+
+    @staticmethod
+    def get_user_forecast(db: Session, user_id: int) -> List[PowerUsageForecast]:
+        """
+        查詢使用者最新一期的設備預測
+        以 (user_id, period_start) 索引單次讀取，不需要在請求時計算
+        """
+        latest = db.query(func.max(PowerUsageForecast.period_start)).filter(PowerUsageForecast.user_id == user_id).scalar_subquery()
+        return db.query(PowerUsageForecast).filter(PowerUsageForecast.user_id == user_id, PowerUsageForecast.period_start == latest).all()
+
+    @staticmethod
+    def summarize(forecasts: List[PowerUsageForecast]) -> dict:
+        """
+        彙總使用者的設備預測
+        返回預測期間、預測總用電量與總電費、產生時間與各設備預測；尚未產生預測時期間與產生時間為空
+        """
+        return {
+            "period_start": forecasts[0].period_start if forecasts else None,
+            "period_end": forecasts[0].period_end if forecasts else None,
+            "predicted_usage": float(sum(forecast.predicted_usage for forecast in forecasts)),
+            "predicted_cost": float(sum(forecast.predicted_cost for forecast in forecasts)),
+            "generated_at": max((forecast.generated_at for forecast in forecasts if forecast.generated_at), default=None),
+            "devices": forecasts,
+        }
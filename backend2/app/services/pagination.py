@@ -0,0 +1,29 @@
+"""
+分頁游標工具模組
+將鍵集分頁（keyset pagination）的最後位置編碼為不透明的游標字串
+"""
+
+import base64
+import json
+from typing import Any, List, Optional
+
+
+def encode_cursor(*values: Any) -> str:
+    """將最後一筆資料的排序鍵編碼為游標字串"""
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(",", ":")).encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str], size: int) -> Optional[List[Any]]:
+    """
+    解碼游標字串
+    游標為空時返回 None；格式錯誤或欄位數不符時拋出 ValueError
+    """
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError("無效的游標") from e
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("無效的游標")
+    return values
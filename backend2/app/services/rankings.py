@@ -0,0 +1,203 @@
+"""
+用電排行模組
+在記憶體中為每個使用者（租戶）與每個使用者的每個位置（建築）維護今日、本週與本月的用電量前 N 名設備
+位置排行以（使用者 ID, 位置）為鍵，不同租戶的同名位置（例如都叫「辦公室」）各自獨立
+寫入路徑每收到一筆讀數就累加計數並更新有界的最小堆積，讀取排行不需要查詢用電紀錄資料表
+期間以 UTC 計算，跨過日、週（週一起算）或月的界線時自動歸零
+每個工作行程各有一份排行，其他行程處理的讀數與位置變更由 cache_sync 定期從資料庫載入，在下次同步前不會反映在本行程的排行中
+"""
+
+import heapq
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from ..config import settings
+from ..database.clock import naive_utc
+
+WINDOWS = ("day", "week", "month")
+"""支援的排行期間"""
+
+# 排行範圍：依使用者（租戶）或依使用者的位置（建築），後者的範圍 ID 為（使用者 ID, 位置）
+SCOPE_USER = "user"
+SCOPE_LOCATION = "location"
+
+
+def period_start(window: str, timestamp: datetime) -> date:
+    """返回時間點所在期間的起始日"""
+    day = timestamp.date()
+    if window == "day":
+        return day
+    if window == "week":
+        return day - timedelta(days=day.weekday())
+    if window == "month":
+        return day.replace(day=1)
+    raise ValueError(f"不支援的排行期間: {window}")
+
+
+class _Board:
+    """
+    單一範圍與期間的排行
+    totals 保存範圍內所有設備在期間內的累計用電量，top 與 heap 維護前 size 名；heap 中過期的項目在取出時略過
+    """
+
+    __slots__ = ("size", "period", "totals", "top", "heap")
+
+    def __init__(self, size: int, period: date):
+        self.size = size
+        self.period = period
+        self.totals: Dict[int, float] = {}
+        self.top: Dict[int, float] = {}
+        self.heap: List[Tuple[float, int]] = []
+
+    def add(self, device_id: int, amount: float) -> None:
+        """累加設備的用電量並更新前 N 名"""
+        total = self.totals.get(device_id, 0.0) + amount
+        self.totals[device_id] = total
+
+        if device_id in self.top:
+            # 累計值只增不減時前 N 名內的設備不會被擠出；負值讀數讓名次可能下滑，改為重新計算
+            if amount < 0:
+                self._rebuild()
+                return
+            self.top[device_id] = total
+            heapq.heappush(self.heap, (total, device_id))
+        elif len(self.top) < self.size:
+            self.top[device_id] = total
+            heapq.heappush(self.heap, (total, device_id))
+        else:
+            floor_total, floor_device = self._floor()
+            if total <= floor_total:
+                return
+            del self.top[floor_device]
+            heapq.heappop(self.heap)
+            self.top[device_id] = total
+            heapq.heappush(self.heap, (total, device_id))
+
+        # 過期項目累積過多時壓縮堆積，讓堆積大小維持在 O(size)
+        if len(self.heap) > 4 * self.size:
+            self.heap = [(value, device) for device, value in self.top.items()]
+            heapq.heapify(self.heap)
+
+    def discard(self, device_id: int) -> float:
+        """移除設備並返回其累計用電量；設備在前 N 名內時重新計算前 N 名"""
+        total = self.totals.pop(device_id, 0.0)
+        if device_id in self.top:
+            self._rebuild()
+        return total
+
+    def leaders(self) -> List[Tuple[int, float]]:
+        """返回依用電量由高到低排序的（設備 ID, 累計用電量）"""
+        return sorted(self.top.items(), key=lambda item: (-item[1], item[0]))
+
+    def _floor(self) -> Tuple[float, int]:
+        """取得前 N 名中用電量最低的項目，並丟棄堆積頂端過期的項目"""
+        while True:
+            total, device_id = self.heap[0]
+            if self.top.get(device_id) == total:
+                return total, device_id
+            heapq.heappop(self.heap)
+
+    def _rebuild(self) -> None:
+        """由所有設備的累計值重新選出前 N 名"""
+        self.top = dict(heapq.nlargest(self.size, self.totals.items(), key=lambda item: item[1]))
+        self.heap = [(value, device) for device, value in self.top.items()]
+        heapq.heapify(self.heap)
+
+
+class UsageRankings:
+    """
+    用電排行
+    每個設備同時計入所屬使用者與所在位置的排行；設備位置變更時累計值隨設備移到新位置，設備刪除時從排行移除
+    """
+
+    def __init__(self, size: int = 20):
+        self.size = size
+        self._boards: Dict[Tuple[str, object, str], _Board] = {}
+        self._devices: Dict[int, Tuple[int, Optional[str]]] = {}  # 設備 ID -> (使用者 ID, 位置)
+        self._lock = threading.Lock()
+
+    def _board(self, scope: str, scope_id: object, window: str, current: date) -> _Board:
+        """取得範圍與期間的排行，期間已過時歸零"""
+        key = (scope, scope_id, window)
+        board = self._boards.get(key)
+        if board is None or board.period != current:
+            board = self._boards[key] = _Board(self.size, current)
+        return board
+
+    def _scopes(self, device_id: int) -> List[Tuple[str, object]]:
+        user_id, location = self._devices[device_id]
+        return [(SCOPE_USER, user_id)] + ([(SCOPE_LOCATION, (user_id, location))] if location else [])
+
+    def observe(self, device_id: int, user_id: int, location: Optional[str], usage: float, timestamp: datetime, now: Optional[datetime] = None) -> None:
+        """
+        計入一筆讀數
+        只計入落在目前期間內的讀數，遲到到上一個期間的讀數不影響目前的排行
+        """
+        now = now or datetime.utcnow()
+        timestamp = naive_utc(timestamp)
+        with self._lock:
+            if self._devices.get(device_id, (user_id, location)) != (user_id, location):
+                self._move(device_id, user_id, location, now)
+            self._devices[device_id] = (user_id, location)
+            for window in WINDOWS:
+                current = period_start(window, now)
+                if period_start(window, timestamp) != current:
+                    continue
+                for scope, scope_id in self._scopes(device_id):
+                    self._board(scope, scope_id, window, current).add(device_id, usage)
+
+    def relocate(self, device_id: int, location: Optional[str], now: Optional[datetime] = None) -> None:
+        """設備位置變更時將目前期間的累計值移到新位置的排行"""
+        with self._lock:
+            if device_id in self._devices and self._devices[device_id][1] != location:
+                self._move(device_id, self._devices[device_id][0], location, now or datetime.utcnow())
+
+    def _move(self, device_id: int, user_id: int, location: Optional[str], now: datetime) -> None:
+        """將設備在目前期間的累計值從原範圍的排行移到新範圍的排行"""
+        old_scopes = self._scopes(device_id)
+        self._devices[device_id] = (user_id, location)
+        for window in WINDOWS:
+            current = period_start(window, now)
+            # 設備在各範圍的累計值相同，取使用者範圍（一定存在）的值
+            total = [self._board(scope, scope_id, window, current).discard(device_id) for scope, scope_id in old_scopes][0]
+            if total:
+                for scope, scope_id in self._scopes(device_id):
+                    self._board(scope, scope_id, window, current).add(device_id, total)
+
+    def remove(self, device_id: int) -> None:
+        """從所有排行中移除設備"""
+        with self._lock:
+            if device_id not in self._devices:
+                return
+            for scope, scope_id in self._scopes(device_id):
+                for window in WINDOWS:
+                    board = self._boards.get((scope, scope_id, window))
+                    if board is not None:
+                        board.discard(device_id)
+            del self._devices[device_id]
+
+    def top(self, scope: str, scope_id: object, window: str, limit: Optional[int] = None, now: Optional[datetime] = None) -> List[Tuple[int, float]]:
+        """
+        讀取排行
+        返回目前期間依用電量由高到低排序的（設備 ID, 累計用電量），最多 limit 筆
+        """
+        current = period_start(window, now or datetime.utcnow())
+        with self._lock:
+            board = self._boards.get((scope, scope_id, window))
+            if board is None or board.period != current:
+                return []
+            leaders = board.leaders()
+        return leaders[:limit] if limit else leaders
+
+    def load(self, rows: Iterable[Tuple[int, int, Optional[str], date, float]], now: Optional[datetime] = None) -> None:
+        """
+        以資料庫彙總預熱排行
+        rows 為（設備 ID, 使用者 ID, 位置, 日期, 當日用電量），需涵蓋本月與本週的每一天
+        """
+        for device_id, user_id, location, day, usage in rows:
+            self.observe(device_id, user_id, location, float(usage), datetime.combine(day, datetime.min.time()), now=now)
+
+
+usage_rankings = UsageRankings(size=settings.RANKING_SIZE)
+"""全域用電排行實例"""
@@ -0,0 +1,217 @@
+"""
+近期用電讀數緩衝模組
+在記憶體中以 NumPy 陣列保存每個設備最近一段時間（預設 24 小時）的用電讀數，讓近期查詢不需要存取資料庫
+每個設備佔用各欄位矩陣中的一列環狀緩衝，欄位為紀錄 ID、時間（UTC 微秒）、用電量與電費，每筆讀數 32 bytes
+以預設容量 288 筆（每 5 分鐘一筆）計算，每 1 萬個設備約佔用 92 MB
+"""
+
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from ..config import settings
+from .series import SERIES_COLUMNS, Columns, from_micros, to_micros
+
+# 每筆讀數佔用的位元組數即為各欄位大小總和
+BYTES_PER_READING = sum(np.dtype(dtype).itemsize for dtype in SERIES_COLUMNS.values())
+
+
+class RecentReadingsBuffer:
+    """
+    近期用電讀數環狀緩衝
+    啟動時從資料庫預熱，之後由寫入路徑持續填入；只有查詢範圍完全落在緩衝保有完整資料的期間內時才由緩衝回答
+    每個工作行程各有一份緩衝，其他行程寫入的讀數由 cache_sync 定期從資料庫載入，在下次同步前不會出現在本行程的緩衝中
+    同一筆讀數可能同時經由寫入路徑與同步載入，append 以紀錄 ID 去除重複
+    """
+
+    def __init__(self, window: timedelta = timedelta(hours=24), capacity: int = 288, initial_devices: int = 1024):
+        self.window = window
+        self.capacity = capacity
+        self._slots: Dict[int, int] = {}  # 設備 ID -> 列索引
+        self._free: List[int] = []  # 已刪除設備釋出、可重複使用的列索引
+        self._rows_used = 0  # 曾經配置過的列數
+        self._columns = {name: np.zeros((initial_devices, capacity), dtype=dtype) for name, dtype in SERIES_COLUMNS.items()}
+        self._head = np.zeros(initial_devices, dtype=np.int32)  # 每列最舊一筆的位置
+        self._count = np.zeros(initial_devices, dtype=np.int32)  # 每列的讀數筆數
+        self._floor = np.zeros(initial_devices, dtype=np.int64)  # 每列因容量不足而丟棄的最新時間，之後的資料才是完整的
+        self._warmed_from: Optional[int] = None  # 預熱範圍的起始時間，未預熱前不回答查詢
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    @property
+    def warmed(self) -> bool:
+        return self._warmed_from is not None
+
+    def nbytes(self) -> int:
+        """返回緩衝目前配置的記憶體大小（位元組）"""
+        return sum(column.nbytes for column in self._columns.values()) + self._head.nbytes + self._count.nbytes + self._floor.nbytes
+
+    @staticmethod
+    def estimate_bytes(devices: int, capacity: int) -> int:
+        """估算指定設備數與容量所需的讀數記憶體（位元組），例如 1 萬個設備、容量 288 約為 92 MB"""
+        return devices * capacity * BYTES_PER_READING
+
+    def _slot(self, device_id: int) -> int:
+        """取得設備的列索引，優先重複使用已釋出的列，列數不足時將所有欄位矩陣擴充為兩倍"""
+        slot = self._slots.get(device_id)
+        if slot is not None:
+            return slot
+        if self._free:
+            slot = self._free.pop()
+            self._slots[device_id] = slot
+            return slot
+
+        slot = self._rows_used
+        self._rows_used += 1
+        rows = self._head.shape[0]
+        if slot >= rows:
+            for name, column in self._columns.items():
+                grown = np.zeros((rows * 2, self.capacity), dtype=column.dtype)
+                grown[:rows] = column
+                self._columns[name] = grown
+            self._head = np.concatenate([self._head, np.zeros(rows, dtype=self._head.dtype)])
+            self._count = np.concatenate([self._count, np.zeros(rows, dtype=self._count.dtype)])
+            self._floor = np.concatenate([self._floor, np.zeros(rows, dtype=self._floor.dtype)])
+        self._slots[device_id] = slot
+        return slot
+
+    def forget(self, device_id: int) -> None:
+        """設備刪除時釋出其列，之後新設備可重複使用，欄位矩陣不會因設備的新增與刪除而無限成長"""
+        with self._lock:
+            slot = self._slots.pop(device_id, None)
+            if slot is None:
+                return
+            self._head[slot] = self._count[slot] = self._floor[slot] = 0
+            self._free.append(slot)
+
+    def _ordered(self, slot: int) -> Dict[str, np.ndarray]:
+        """依時間順序取出一列的所有欄位"""
+        order = (self._head[slot] + np.arange(self._count[slot])) % self.capacity
+        return {name: column[slot, order] for name, column in self._columns.items()}
+
+    def _contains(self, slot: int, record_id: int) -> bool:
+        """判斷一列中是否已有指定紀錄 ID 的讀數"""
+        head, count = int(self._head[slot]), int(self._count[slot])
+        ids = self._columns["id"][slot]
+        if count == self.capacity:
+            return bool((ids == record_id).any())
+        end = head + count
+        if end <= self.capacity:
+            return bool((ids[head:end] == record_id).any())
+        return bool((ids[head:] == record_id).any() or (ids[: end - self.capacity] == record_id).any())
+
+    def append(self, device_id: int, record_id: int, timestamp: datetime, usage: float, cost: float) -> bool:
+        """
+        加入一筆讀數，返回是否為新的讀數；緩衝中已有相同紀錄 ID 的讀數時不重複加入
+        緩衝已滿時覆寫最舊的讀數；時間早於該列最新讀數的遲到資料會插入到正確位置
+        """
+        ts = to_micros(timestamp)
+        with self._lock:
+            slot = self._slot(device_id)
+            if self._contains(slot, record_id):
+                return False
+            head, count = int(self._head[slot]), int(self._count[slot])
+            values = {"id": record_id, "timestamp": ts, "usage": usage, "cost": cost}
+
+            if count and ts < self._columns["timestamp"][slot, (head + count - 1) % self.capacity]:
+                self._insert_sorted(slot, values)
+                return True
+
+            if count == self.capacity:
+                self._floor[slot] = max(self._floor[slot], self._columns["timestamp"][slot, head])
+                position = head
+                self._head[slot] = (head + 1) % self.capacity
+            else:
+                position = (head + count) % self.capacity
+                self._count[slot] = count + 1
+            for name, value in values.items():
+                self._columns[name][slot, position] = value
+            return True
+
+    def _insert_sorted(self, slot: int, values: dict) -> None:
+        """將遲到的讀數插入到依時間排序的位置並重寫整列，緩衝已滿時丟棄最舊的一筆"""
+        ordered = self._ordered(slot)
+        index = int(np.searchsorted(ordered["timestamp"], values["timestamp"], side="right"))
+        merged = {name: np.insert(column, index, values[name]) for name, column in ordered.items()}
+        if merged["timestamp"].shape[0] > self.capacity:
+            self._floor[slot] = max(self._floor[slot], merged["timestamp"][0])
+            merged = {name: column[1:] for name, column in merged.items()}
+        count = merged["timestamp"].shape[0]
+        for name, column in merged.items():
+            self._columns[name][slot, :count] = column
+        self._head[slot] = 0
+        self._count[slot] = count
+
+    def covers(self, device_id: int, start_time: datetime, now: Optional[datetime] = None) -> bool:
+        """判斷緩衝是否保有設備從 start_time 起的完整讀數"""
+        if self._warmed_from is None:
+            return False
+        start = to_micros(start_time)
+        if start < max(self._warmed_from, to_micros((now or datetime.utcnow()) - self.window)):
+            return False
+        slot = self._slots.get(device_id)
+        return slot is None or start > self._floor[slot]
+
+    def query(self, device_id: int, start_time: datetime, end_time: datetime) -> Optional[Columns]:
+        """
+        查詢設備在時間範圍內的讀數
+        返回依時間排序的欄位陣列；緩衝無法完整涵蓋查詢範圍時返回 None，由呼叫端改查資料庫
+        """
+        with self._lock:
+            if not self.covers(device_id, start_time):
+                return None
+            slot = self._slots.get(device_id)
+            if slot is None:
+                return {name: np.empty(0, dtype=dtype) for name, dtype in SERIES_COLUMNS.items()}
+            ordered = self._ordered(slot)
+
+        # 與資料庫查詢相同的閉區間 [start_time, end_time]
+        lo = int(np.searchsorted(ordered["timestamp"], to_micros(start_time), side="left"))
+        hi = int(np.searchsorted(ordered["timestamp"], to_micros(end_time), side="right"))
+        return {name: column[lo:hi] for name, column in ordered.items()}
+
+    def latest(self, device_ids: Iterable[int], now: Optional[datetime] = None) -> Optional[Dict[int, dict]]:
+        """
+        取得設備在緩衝期間內的最新讀數
+        返回 {設備 ID: 讀數}，沒有近期讀數的設備不列入；尚未預熱時返回 None
+        """
+        cutoff = to_micros((now or datetime.utcnow()) - self.window)
+        result = {}
+        with self._lock:
+            if self._warmed_from is None:
+                return None
+            for device_id in device_ids:
+                slot = self._slots.get(device_id)
+                if slot is None or not self._count[slot]:
+                    continue
+                position = (self._head[slot] + self._count[slot] - 1) % self.capacity
+                ts = int(self._columns["timestamp"][slot, position])
+                if ts >= cutoff:
+                    result[device_id] = {
+                        "device_id": device_id,
+                        "usage": float(self._columns["usage"][slot, position]),
+                        "cost": float(self._columns["cost"][slot, position]),
+                        "timestamp": from_micros(ts),
+                    }
+        return result
+
+    def warm(self, rows: Iterable, since: datetime) -> int:
+        """
+        以資料庫讀數預熱緩衝
+        rows 為（紀錄 ID, 設備 ID, 時間, 用電量, 電費），需包含 since 之後的所有讀數；返回載入的筆數
+        """
+        loaded = 0
+        for record_id, device_id, timestamp, usage, cost in rows:
+            self.append(device_id, record_id, timestamp, float(usage), float(cost))
+            loaded += 1
+        with self._lock:
+            self._warmed_from = to_micros(since)
+        return loaded
+
+
+recent_readings = RecentReadingsBuffer(window=timedelta(hours=settings.RECENT_BUFFER_HOURS), capacity=settings.RECENT_BUFFER_CAPACITY)
+"""全域近期用電讀數緩衝實例"""
@@ -0,0 +1,393 @@
+"""
+門檻告警規則模組
+在寫入路徑上即時評估使用者設定的告警規則，觸發時發布到告警中心
+規則依（設備, 指標）與（使用者, 指標）建立索引，每筆讀數或狀態變更只檢查套用到該設備的規則
+離線規則以時間輪排程到期時間，不需要定期掃描所有設備
+每個工作行程各有一份規則引擎，其他行程的規則變更、讀數與設備上線由 cache_sync 定期從資料庫載入，在下次同步前不會反映在本行程中
+"""
+
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Hashable, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import delete, insert, update
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from ..config import settings
+from ..database.clock import naive_utc, utc_now
+from ..database.sharding import telemetry_shards
+from ..database.unit_of_work import on_commit
+from ..models.alert import AlertRule
+from ..models.device import Device, PowerUsageRecord
+from .alerts import Alert, alert_hub
+
+METRICS = ("usage", "daily_usage", "daily_cost", "offline")
+"""支援的規則指標：單次讀數用電量、每日用電量、每日電費、離線分鐘數"""
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _seconds(value: datetime) -> float:
+    return (naive_utc(value) - _EPOCH).total_seconds()
+
+
+class TimerWheel:
+    """
+    雜湊時間輪
+    將到期時間依刻度分配到固定數量的槽，推進時只檢查經過的槽；重新排程與取消以延遲刪除處理
+    """
+
+    def __init__(self, tick_seconds: float, slots: int = 4096, start: Optional[datetime] = None):
+        self.tick_seconds = tick_seconds
+        self._slots: List[Set[Hashable]] = [set() for _ in range(slots)]
+        self._deadlines: Dict[Hashable, int] = {}  # 鍵 -> 到期刻度
+        self._current = int(_seconds(start or datetime.utcnow()) // tick_seconds)
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def schedule(self, key: Hashable, deadline: datetime) -> None:
+        """排程或重新排程鍵的到期時間；已過的到期時間在下一個刻度到期"""
+        tick = max(int(_seconds(deadline) // self.tick_seconds), self._current + 1)
+        self._deadlines[key] = tick
+        self._slots[tick % len(self._slots)].add(key)
+
+    def cancel(self, key: Hashable) -> None:
+        """取消排程，槽中的項目在經過時移除"""
+        self._deadlines.pop(key, None)
+
+    def advance(self, now: datetime) -> List[Hashable]:
+        """推進到目前時間並返回到期的鍵；間隔超過一圈時每個槽只檢查一次"""
+        target = int(_seconds(now) // self.tick_seconds)
+        expired = []
+        for tick in range(self._current + 1, self._current + 1 + min(target - self._current, len(self._slots))):
+            slot = self._slots[tick % len(self._slots)]
+            for key in list(slot):
+                deadline = self._deadlines.get(key)
+                if deadline is None or deadline % len(self._slots) != tick % len(self._slots):
+                    slot.discard(key)  # 已取消或已重新排程到其他槽
+                elif deadline <= target:
+                    slot.discard(key)
+                    del self._deadlines[key]
+                    expired.append(key)
+        self._current = max(self._current, target)
+        return expired
+
+
+class _Rule(NamedTuple):
+    """規則在記憶體中的快照，以 NamedTuple 保存以降低大量規則時的記憶體用量"""
+
+    id: int
+    user_id: int
+    device_id: Optional[int]
+    metric: str
+    threshold: float
+
+
+class RuleEngine:
+    """
+    告警規則引擎
+    維護每個設備當日的用電量與電費計數、單次讀數規則的觸發狀態，以及離線規則的時間輪
+    每日規則每個設備每天最多觸發一次；單次讀數規則在讀數由低於門檻變為超過門檻時觸發；離線規則在設備恢復上線前只觸發一次
+    """
+
+    def __init__(self, tick_seconds: float = 5.0):
+        self._rules: Dict[int, _Rule] = {}
+        self._by_device: Dict[Tuple[int, str], Dict[int, _Rule]] = defaultdict(dict)
+        self._by_user: Dict[Tuple[int, str], Dict[int, _Rule]] = defaultdict(dict)
+        self._devices: Dict[int, int] = {}  # 設備 ID -> 使用者 ID
+        self._user_devices: Dict[int, Set[int]] = defaultdict(set)
+        self._daily: Dict[int, Tuple[date, float, float]] = {}  # 設備 ID -> (日期, 用電量, 電費)
+        self._over: Set[Tuple[int, int]] = set()  # 讀數目前超過門檻的（規則 ID, 設備 ID）
+        self._fired_on: Dict[Tuple[int, int], date] = {}  # 每日規則最後觸發的日期
+        self._last_seen: Dict[int, datetime] = {}
+        self._wheel = TimerWheel(tick_seconds)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    def _applicable(self, device_id: int, user_id: int, metric: str) -> Iterable[_Rule]:
+        """套用到設備的規則：設備專屬規則加上使用者層級的規則"""
+        device_rules = self._by_device.get((device_id, metric))
+        user_rules = self._by_user.get((user_id, metric))
+        if device_rules:
+            yield from device_rules.values()
+        if user_rules:
+            yield from user_rules.values()
+
+    def _targets(self, rule: _Rule) -> Iterable[int]:
+        """規則套用的設備"""
+        return (rule.device_id,) if rule.device_id is not None else tuple(self._user_devices.get(rule.user_id, ()))
+
+    def _arm(self, rule: _Rule, device_id: int, now: datetime) -> None:
+        """從設備最後上線時間（未知時為現在）開始排程離線規則"""
+        seen = self._last_seen.get(device_id, now)
+        self._wheel.schedule((rule.id, device_id), seen + timedelta(minutes=rule.threshold))
+
+    def track_device(self, device_id: int, user_id: int, now: Optional[datetime] = None) -> None:
+        """登記設備，讓使用者層級的離線規則也套用到新設備"""
+        with self._lock:
+            self._track(device_id, user_id, now or datetime.utcnow())
+
+    def _track(self, device_id: int, user_id: int, now: datetime) -> None:
+        if self._devices.get(device_id) == user_id:
+            return
+        self._devices[device_id] = user_id
+        self._user_devices[user_id].add(device_id)
+        for rule in self._by_user.get((user_id, "offline"), {}).values():
+            self._arm(rule, device_id, now)
+
+    def forget_device(self, device_id: int) -> None:
+        """設備刪除時取消其所有計時與狀態"""
+        with self._lock:
+            user_id = self._devices.pop(device_id, None)
+            if user_id is None:
+                return
+            self._user_devices[user_id].discard(device_id)
+            self._daily.pop(device_id, None)
+            self._last_seen.pop(device_id, None)
+            for rule in self._applicable(device_id, user_id, "offline"):
+                self._wheel.cancel((rule.id, device_id))
+
+    def set_rule(self, rule: AlertRule, now: Optional[datetime] = None) -> None:
+        """新增或更新規則；停用的規則從索引中移除"""
+        now = now or datetime.utcnow()
+        with self._lock:
+            self._remove(rule.id)
+            if not rule.is_active:
+                return
+            snapshot = _Rule(rule.id, rule.user_id, rule.device_id, rule.metric, float(rule.threshold))
+            self._rules[rule.id] = snapshot
+            if snapshot.device_id is not None:
+                self._by_device[(snapshot.device_id, snapshot.metric)][snapshot.id] = snapshot
+            else:
+                self._by_user[(snapshot.user_id, snapshot.metric)][snapshot.id] = snapshot
+            if snapshot.metric == "offline":
+                for device_id in self._targets(snapshot):
+                    self._arm(snapshot, device_id, now)
+
+    def sync_rules(self, active_ids: Set[int], changed: Iterable[AlertRule], now: Optional[datetime] = None) -> None:
+        """
+        與資料庫的規則同步
+        移除不在 active_ids 中的規則（已刪除或停用），並更新 changed 中內容與引擎不同的規則；內容相同的規則保留觸發狀態與計時
+        """
+        with self._lock:
+            removed = [rule_id for rule_id in self._rules if rule_id not in active_ids]
+        for rule_id in removed:
+            self.remove_rule(rule_id)
+        for rule in changed:
+            snapshot = _Rule(rule.id, rule.user_id, rule.device_id, rule.metric, float(rule.threshold))
+            if rule.is_active and self._rules.get(rule.id) != snapshot:
+                self.set_rule(rule, now=now)
+
+    def remove_rule(self, rule_id: int) -> None:
+        """移除規則"""
+        with self._lock:
+            self._remove(rule_id)
+
+    def _remove(self, rule_id: int) -> None:
+        rule = self._rules.pop(rule_id, None)
+        if rule is None:
+            return
+        index = self._by_device if rule.device_id is not None else self._by_user
+        key = (rule.device_id if rule.device_id is not None else rule.user_id, rule.metric)
+        index[key].pop(rule_id, None)
+        if not index[key]:
+            del index[key]
+        for device_id in self._targets(rule):
+            self._wheel.cancel((rule_id, device_id))
+            self._over.discard((rule_id, device_id))
+            self._fired_on.pop((rule_id, device_id), None)
+
+    def observe(self, device_id: int, user_id: int, usage: float, cost: float, timestamp: datetime, now: Optional[datetime] = None) -> List[Alert]:
+        """
+        處理一筆用電讀數
+        更新設備當日計數、重新排程離線規則，並只評估套用到該設備的規則；返回並發布觸發的告警
+        """
+        now = now or datetime.utcnow()
+        timestamp = naive_utc(timestamp)
+        alerts = []
+        with self._lock:
+            self._track(device_id, user_id, now)
+            self._heartbeat(device_id, user_id, now)
+
+            for rule in self._applicable(device_id, user_id, "usage"):
+                key = (rule.id, device_id)
+                if usage < rule.threshold:
+                    self._over.discard(key)
+                elif key not in self._over:
+                    self._over.add(key)
+                    alerts.append(self._alert(rule, device_id, usage, timestamp, f"設備單次用電量 {usage:.2f} 超過門檻 {rule.threshold:.2f}"))
+
+            # 只有今天的讀數計入當日計數，遲到的前一日讀數不影響今天的每日規則
+            day = timestamp.date()
+            if day == now.date():
+                counted_day, day_usage, day_cost = self._daily.get(device_id, (day, 0.0, 0.0))
+                if counted_day != day:
+                    day_usage, day_cost = 0.0, 0.0
+                day_usage, day_cost = day_usage + usage, day_cost + cost
+                self._daily[device_id] = (day, day_usage, day_cost)
+                for metric, value, label in (("daily_usage", day_usage, "今日用電量"), ("daily_cost", day_cost, "今日電費")):
+                    for rule in self._applicable(device_id, user_id, metric):
+                        key = (rule.id, device_id)
+                        if value >= rule.threshold and self._fired_on.get(key) != day:
+                            self._fired_on[key] = day
+                            alerts.append(self._alert(rule, device_id, value, timestamp, f"設備{label} {value:.2f} 超過門檻 {rule.threshold:.2f}"))
+
+        for alert in alerts:
+            alert_hub.publish(alert)
+        return alerts
+
+    def status_changed(self, device_id: int, user_id: int, status: str, now: Optional[datetime] = None) -> None:
+        """設備狀態變更為 online 時視為上線，重新排程離線規則；變更為離線時計時繼續從最後上線時間起算"""
+        if status != "online":
+            return
+        now = now or datetime.utcnow()
+        with self._lock:
+            self._track(device_id, user_id, now)
+            self._heartbeat(device_id, user_id, now)
+
+    def seen(self, device_id: int, user_id: int, last_online: datetime, now: Optional[datetime] = None) -> None:
+        """其他行程記錄的設備上線時間；比本行程已知的最後上線時間新時才重新排程離線規則"""
+        last_online = naive_utc(last_online)
+        with self._lock:
+            self._track(device_id, user_id, now or datetime.utcnow())
+            if last_online > self._last_seen.get(device_id, datetime.min):
+                self._heartbeat(device_id, user_id, last_online)
+
+    def _heartbeat(self, device_id: int, user_id: int, now: datetime) -> None:
+        self._last_seen[device_id] = now
+        for rule in self._applicable(device_id, user_id, "offline"):
+            self._arm(rule, device_id, now)
+
+    def tick(self, now: Optional[datetime] = None) -> List[Alert]:
+        """推進時間輪並為到期的離線規則發布告警"""
+        now = now or datetime.utcnow()
+        alerts = []
+        with self._lock:
+            for rule_id, device_id in self._wheel.advance(now):
+                rule = self._rules.get(rule_id)
+                if rule is None or device_id not in self._devices:
+                    continue
+                seen = self._last_seen.get(device_id)
+                minutes = (now - seen).total_seconds() / 60 if seen else rule.threshold
+                alerts.append(self._alert(rule, device_id, minutes, now, f"設備已離線 {minutes:.0f} 分鐘，超過門檻 {rule.threshold:.0f} 分鐘"))
+
+        for alert in alerts:
+            alert_hub.publish(alert)
+        return alerts
+
+    async def run(self) -> None:
+        """每個刻度推進一次時間輪，由應用程式生命週期啟動與取消"""
+        while True:
+            await asyncio.sleep(self._wheel.tick_seconds)
+            try:
+                self.tick()
+            except Exception:
+                logger.exception("告警規則時間輪推進失敗")
+
+    def _alert(self, rule: _Rule, device_id: int, value: float, timestamp: datetime, message: str) -> Alert:
+        return Alert(
+            kind=rule.metric,
+            device_id=device_id,
+            user_id=self._devices.get(device_id, rule.user_id),
+            message=message,
+            value=value,
+            baseline=rule.threshold,
+            score=value / rule.threshold if rule.threshold > 0 else value,
+            timestamp=timestamp,
+        )
+
+    def load(self, rules: Iterable[AlertRule], devices: Iterable[Tuple[int, int, Optional[datetime]]], daily: Iterable[Tuple[int, float, float]], now: Optional[datetime] = None) -> None:
+        """
+        啟動時載入規則與狀態
+        devices 為（設備 ID, 使用者 ID, 最後上線時間），daily 為（設備 ID, 今日用電量, 今日電費）
+        """
+        now = now or datetime.utcnow()
+        with self._lock:
+            for device_id, user_id, last_online in devices:
+                self._track(device_id, user_id, now)
+                if last_online is not None:
+                    self._last_seen[device_id] = last_online
+            for device_id, usage, cost in daily:
+                self._daily[device_id] = (now.date(), float(usage), float(cost))
+        for rule in rules:
+            self.set_rule(rule, now=now)
+
+
+class AlertRuleService:
+    """
+    告警規則服務類別
+    處理告警規則的 CRUD，交易提交後同步更新規則引擎
+    所有方法都是靜態方法，不需要實例化即可使用；寫入方法不提交交易，由呼叫端（路由）提交
+    """
+
+    @staticmethod
+    def create_rule(db: Session, user_id: int, metric: str, threshold: float, device_id: Optional[int] = None) -> AlertRule:
+        """創建告警規則"""
+        rule = db.scalars(insert(AlertRule).values(user_id=user_id, device_id=device_id, metric=metric, threshold=threshold).returning(AlertRule)).one()
+        on_commit(db, lambda: rule_engine.set_rule(rule))
+        return rule
+
+    @staticmethod
+    def get_rule(db: Session, rule_id: int) -> Optional[AlertRule]:
+        """根據規則 ID 查詢告警規則"""
+        return db.query(AlertRule).filter(AlertRule.id == rule_id).first()
+
+    @staticmethod
+    def list_rules(db: Session, user_id: int) -> List[AlertRule]:
+        """列出使用者的告警規則"""
+        return db.query(AlertRule).filter(AlertRule.user_id == user_id).order_by(AlertRule.id).all()
+
+    @staticmethod
+    def update_rule(db: Session, user_id: int, rule_id: int, **kwargs) -> Optional[AlertRule]:
+        """更新告警規則，所有權條件寫在 UPDATE 的 WHERE 中；規則不存在或不屬於使用者時返回 None"""
+        values = {key: value for key, value in kwargs.items() if hasattr(AlertRule, key)}
+        stmt = (
+            update(AlertRule)
+            .where(AlertRule.id == rule_id, AlertRule.user_id == user_id)
+            .values(**values, updated_at=utc_now())
+            .returning(AlertRule)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        )
+        rule = db.scalars(stmt).one_or_none()
+        if rule is not None:
+            on_commit(db, lambda: rule_engine.set_rule(rule))
+        return rule
+
+    @staticmethod
+    def delete_rule(db: Session, user_id: int, rule_id: int) -> bool:
+        """刪除告警規則，所有權條件寫在 DELETE 的 WHERE 中；返回規則是否存在且屬於使用者"""
+        stmt = delete(AlertRule).where(AlertRule.id == rule_id, AlertRule.user_id == user_id).returning(AlertRule.id).execution_options(synchronize_session=False)
+        if db.scalar(stmt) is None:
+            return False
+        on_commit(db, lambda: rule_engine.remove_rule(rule_id))
+        return True
+
+    @staticmethod
+    def warm_engine(db: Session) -> None:
+        """
+        預熱規則引擎
+        載入所有啟用的規則、所有設備的使用者與最後上線時間，以及各設備今日的用電量與電費
+        """
+        now = datetime.utcnow()
+        today = datetime.combine(now.date(), datetime.min.time())
+
+        def shard_daily(records_db: Session, _: None) -> list:
+            return records_db.query(PowerUsageRecord.device_id, func.sum(PowerUsageRecord.usage), func.sum(PowerUsageRecord.cost)).filter(PowerUsageRecord.timestamp >= today).group_by(PowerUsageRecord.device_id).all()
+
+        rules = db.query(AlertRule).filter(AlertRule.is_active.is_(True)).all()
+        devices = db.query(Device.id, Device.user_id, Device.last_online).all()
+        daily = [row for shard in telemetry_shards.fan_out_all(db, shard_daily) for row in shard]
+        rule_engine.load(rules, devices, daily, now=now)
+
+
+rule_engine = RuleEngine(tick_seconds=settings.ALERT_RULE_TICK_SECONDS)
+"""全域告警規則引擎實例"""
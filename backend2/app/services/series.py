@@ -0,0 +1,158 @@
+"""
+用電序列編碼模組
+以欄位陣列（紀錄 ID、時間、用電量、電費）表示用電序列，不需要為每一筆讀數建立 Python 物件
+依請求的 Accept 標頭輸出 Apache Arrow IPC（需安裝 pyarrow）、緊湊的小端序二進位格式或 JSON，並依 Accept-Encoding 以 brotli（需安裝 brotli）或 gzip 壓縮
+"""
+
+import gzip
+import json
+import struct
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..config import settings
+from ..database.clock import naive_utc
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:  # 未安裝 pyarrow 時不提供 Arrow 格式
+    pyarrow = None
+
+try:
+    import brotli
+except ImportError:  # 未安裝 brotli 時只使用 gzip
+    brotli = None
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PACKED_MEDIA_TYPE = "application/vnd.ecoshare.usage-series"
+JSON_MEDIA_TYPE = "application/json"
+
+# 緊湊格式的檔頭：4 bytes 格式識別碼 + uint32 筆數，之後依序為 timestamp、id（int64）、usage、cost（float64）四個欄位
+# 檔頭為 8 bytes，瀏覽器可直接以 BigInt64Array / Float64Array 對應各欄位而不需要複製
+PACKED_MAGIC = b"EUS1"
+PACKED_HEADER = struct.Struct("<4sI")
+
+# 欄位名稱與 dtype；timestamp 為 UTC 微秒
+SERIES_COLUMNS = {"timestamp": np.int64, "id": np.int64, "usage": np.float64, "cost": np.float64}
+Columns = Dict[str, np.ndarray]
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def to_micros(value: datetime) -> int:
+    """將時間轉為 UTC 微秒"""
+    return (naive_utc(value) - _EPOCH) // _MICROSECOND
+
+
+def from_micros(value: int) -> datetime:
+    """將 UTC 微秒轉為不帶時區的時間"""
+    return _EPOCH + timedelta(microseconds=int(value))
+
+
+def columns_from_rows(rows: Sequence) -> Columns:
+    """
+    將資料庫查詢結果轉為欄位陣列
+    rows 為（紀錄 ID, 時間, 用電量, 電費）的序列
+    """
+    count = len(rows)
+    return {
+        "timestamp": np.fromiter((to_micros(row[1]) for row in rows), dtype=np.int64, count=count),
+        "id": np.fromiter((row[0] for row in rows), dtype=np.int64, count=count),
+        "usage": np.fromiter((row[2] for row in rows), dtype=np.float64, count=count),
+        "cost": np.fromiter((row[3] for row in rows), dtype=np.float64, count=count),
+    }
+
+
+def records_from_columns(device_id: int, columns: Columns) -> List[dict]:
+    """將欄位陣列轉為 JSON 回應使用的紀錄清單"""
+    return [
+        {"id": record_id, "device_id": device_id, "usage": usage, "timestamp": from_micros(ts), "cost": cost}
+        for ts, record_id, usage, cost in zip(columns["timestamp"].tolist(), columns["id"].tolist(), columns["usage"].tolist(), columns["cost"].tolist())
+    ]
+
+
+def encode_json(device_id: int, columns: Columns) -> bytes:
+    """編碼為 JSON，格式與原本的紀錄清單回應相同"""
+    records = records_from_columns(device_id, columns)
+    for record in records:
+        record["timestamp"] = record["timestamp"].isoformat()
+    return json.dumps(records, separators=(",", ":")).encode()
+
+
+def encode_packed(columns: Columns) -> bytes:
+    """編碼為緊湊的小端序欄位格式"""
+    parts = [PACKED_HEADER.pack(PACKED_MAGIC, len(columns["timestamp"]))]
+    parts.extend(columns[name].astype(np.dtype(dtype).newbyteorder("<"), copy=False).tobytes() for name, dtype in SERIES_COLUMNS.items())
+    return b"".join(parts)
+
+
+def encode_arrow(device_id: int, columns: Columns) -> bytes:
+    """編碼為 Apache Arrow IPC 串流格式，直接由欄位陣列建立 Arrow 陣列"""
+    table = pyarrow.table(
+        {
+            "timestamp": pyarrow.array(columns["timestamp"], type=pyarrow.timestamp("us")),
+            "id": pyarrow.array(columns["id"]),
+            "usage": pyarrow.array(columns["usage"]),
+            "cost": pyarrow.array(columns["cost"]),
+        },
+        metadata={"device_id": str(device_id)},
+    )
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _parse_header(value: str) -> List[Tuple[str, float]]:
+    """解析 Accept / Accept-Encoding 標頭，返回依 q 值排序的（值, q）清單，q 為 0 的項目不列入"""
+    items = []
+    for part in value.split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, number = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(number)
+                except ValueError:
+                    q = 0.0
+        if token and q > 0:
+            items.append((token.strip().lower(), q))
+    return sorted(items, key=lambda item: -item[1])
+
+
+def negotiate_media_type(accept: str) -> str:
+    """依 Accept 標頭選擇回應格式，未要求二進位格式或未安裝 pyarrow 時使用 JSON"""
+    for media_type, _ in _parse_header(accept):
+        if media_type == ARROW_MEDIA_TYPE and pyarrow is not None:
+            return ARROW_MEDIA_TYPE
+        if media_type == PACKED_MEDIA_TYPE:
+            return PACKED_MEDIA_TYPE
+        if media_type in (JSON_MEDIA_TYPE, "application/*", "*/*"):
+            return JSON_MEDIA_TYPE
+    return JSON_MEDIA_TYPE
+
+
+def compress(body: bytes, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+    """依 Accept-Encoding 標頭壓縮回應內容，返回（內容, Content-Encoding）；內容太小或不支援時不壓縮"""
+    if len(body) < settings.SERIES_COMPRESSION_MIN_BYTES:
+        return body, None
+    for encoding, _ in _parse_header(accept_encoding):
+        if encoding == "br" and brotli is not None:
+            return brotli.compress(body, quality=settings.SERIES_BROTLI_QUALITY), "br"
+        if encoding == "gzip":
+            return gzip.compress(body, compresslevel=settings.SERIES_GZIP_LEVEL), "gzip"
+    return body, None
+
+
+def encode_series(media_type: str, device_id: int, columns: Columns) -> bytes:
+    """依回應格式編碼用電序列"""
+    if media_type == ARROW_MEDIA_TYPE:
+        return encode_arrow(device_id, columns)
+    if media_type == PACKED_MEDIA_TYPE:
+        return encode_packed(columns)
+    return encode_json(device_id, columns)
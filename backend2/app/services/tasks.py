@@ -0,0 +1,125 @@
+"""
+背景工作佇列模組
+在應用程式程序內以 asyncio 工作者執行不需要在回應前完成的工作，例如最後登入時間、快取失效與快照寫入
+同類型的工作會合併成批次交給處理函數，失敗時以指數退避重試，關閉時等待佇列清空
+"""
+
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# 批次處理函數：接收同類型工作的參數清單，在執行緒池中同步執行
+TaskHandler = Callable[[List[Any]], None]
+
+
+class TaskRunner:
+    """
+    程序內背景工作執行器
+    以固定數量的工作者限制並行度；尚未啟動、正在關閉或佇列已滿時，submit 會直接同步執行以免遺失工作
+    """
+
+    def __init__(self, workers: int = 4, batch_size: int = 100, batch_wait: float = 0.05, max_retries: int = 3, retry_delay: float = 0.5, max_queue: int = 10000):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.max_queue = max_queue
+        self._handlers: Dict[str, TaskHandler] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional["asyncio.Queue[Tuple[str, Any]]"] = None
+        self._tasks: List[asyncio.Task] = []
+        self._closing = False
+        self._lock = threading.Lock()
+
+    def register(self, kind: str, handler: TaskHandler) -> None:
+        """註冊某種工作的批次處理函數"""
+        self._handlers[kind] = handler
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None and not self._closing
+
+    def submit(self, kind: str, payload: Any = None) -> None:
+        """
+        提交一項工作
+        可在事件迴圈或執行緒池中呼叫；無法排入佇列時在目前執行緒同步執行
+        """
+        handler = self._handlers[kind]
+        with self._lock:
+            queued = self.running and self._queue.qsize() < self.max_queue
+            if queued:
+                self._loop.call_soon_threadsafe(self._queue.put_nowait, (kind, payload))
+        if not queued:
+            handler([payload])
+
+    async def start(self) -> None:
+        """啟動工作者"""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._closing = False
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """
+        停止工作者
+        先停止接收新工作並等待佇列清空，逾時後取消剩餘工作
+        """
+        if self._loop is None:
+            return
+        with self._lock:
+            self._closing = True
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("背景工作佇列未在 %s 秒內清空，剩餘 %s 項工作", timeout, self._queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+
+    async def _worker(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.batch_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - self._loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            grouped: Dict[str, List[Any]] = defaultdict(list)
+            for kind, payload in batch:
+                grouped[kind].append(payload)
+            try:
+                for kind, payloads in grouped.items():
+                    await self._run(kind, payloads)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _run(self, kind: str, payloads: List[Any]) -> None:
+        """在執行緒池中執行批次處理函數，失敗時以指數退避重試"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self._loop.run_in_executor(None, self._handlers[kind], payloads)
+                return
+            except Exception:
+                if attempt == self.max_retries:
+                    logger.exception("背景工作 %s 重試 %s 次後仍失敗，放棄 %s 項工作", kind, self.max_retries, len(payloads))
+                    return
+                await asyncio.sleep(self.retry_delay * 2**attempt)
+
+
+task_runner = TaskRunner(workers=settings.TASK_WORKERS, batch_size=settings.TASK_BATCH_SIZE, max_retries=settings.TASK_MAX_RETRIES, max_queue=settings.TASK_QUEUE_MAX)
+"""全域背景工作執行器實例"""
@@ -4,12 +4,18 @@
 """
 
 from datetime import datetime
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
+from sqlalchemy import Float, and_, bindparam, cast, insert, literal, or_, update
 from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
 
+from ..database.clock import utc_now
+from ..database.session import SessionLocal
+from ..database.soft_delete import INCLUDE_DELETED
 from ..middleware.auth import get_password_hash, verify_password
 from ..models.user import User
+from .tasks import task_runner
 
 
 class UserService:
@@ -17,6 +23,7 @@ class UserService:
     使用者服務類別
     處理所有與使用者相關的業務邏輯，提供完整的使用者管理功能
     所有方法都是靜態方法，不需要實例化即可使用
+    寫入方法以 INSERT / UPDATE ... RETURNING 一次完成寫入與讀回，不提交交易，由呼叫端（路由）提交
     """
 
     @staticmethod
@@ -26,11 +33,13 @@ class UserService:
         將密碼進行雜湊處理後儲存到資料庫
         """
         hashed_password = get_password_hash(password)
-        db_user = User(username=username, password=hashed_password, email=email, phone=phone)
-        db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
-        return db_user
+        return db.scalars(insert(User).values(username=username, password=hashed_password, email=email, phone=phone).returning(User)).one()
+
+    @staticmethod
+    def _update(db: Session, user: User, values: dict) -> User:
+        """以單一 UPDATE ... RETURNING 更新使用者，並以返回的資料列刷新 session 中的使用者物件"""
+        stmt = update(User).where(User.id == user.id).values(**values).returning(User).execution_options(synchronize_session=False, populate_existing=True)
+        return db.scalars(stmt).one()
 
     @staticmethod
     def get_user_by_id(db: Session, user_id: int) -> Optional[User]:
@@ -38,14 +47,14 @@ class UserService:
         return db.query(User).filter(User.id == user_id).first()
 
     @staticmethod
-    def get_user_by_username(db: Session, username: str) -> Optional[User]:
-        """根據使用者名稱查詢使用者資訊"""
-        return db.query(User).filter(User.username == username).first()
+    def get_user_by_username(db: Session, username: str, include_deleted: bool = False) -> Optional[User]:
+        """根據使用者名稱查詢使用者資訊，唯一性檢查需包含已刪除的使用者"""
+        return db.query(User).filter(User.username == username).execution_options(**{INCLUDE_DELETED: include_deleted}).first()
 
     @staticmethod
-    def get_user_by_email(db: Session, email: str) -> Optional[User]:
-        """根據電子郵件查詢使用者資訊"""
-        return db.query(User).filter(User.email == email).first()
+    def get_user_by_email(db: Session, email: str, include_deleted: bool = False) -> Optional[User]:
+        """根據電子郵件查詢使用者資訊，唯一性檢查需包含已刪除的使用者"""
+        return db.query(User).filter(User.email == email).execution_options(**{INCLUDE_DELETED: include_deleted}).first()
 
     @staticmethod
     def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
@@ -66,13 +75,8 @@ class UserService:
         更新使用者資訊
         可以更新使用者的任何欄位，除了密碼（應使用 update_password 方法）
         """
-        for key, value in kwargs.items():
-            if hasattr(user, key):
-                setattr(user, key, value)
-        user.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(user)
-        return user
+        values = {key: value for key, value in kwargs.items() if hasattr(User, key)}
+        return UserService._update(db, user, {**values, "updated_at": utc_now()})
 
     @staticmethod
     def update_password(db: Session, user: User, new_password: str) -> User:
@@ -80,26 +84,58 @@ class UserService:
         更新使用者密碼
         將新密碼進行雜湊處理後更新到資料庫
         """
-        user.password = get_password_hash(new_password)
-        user.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(user)
-        return user
+        return UserService._update(db, user, {"password": get_password_hash(new_password), "updated_at": utc_now()})
 
     @staticmethod
-    def list_users(db: Session, skip: int = 0, limit: int = 10) -> Tuple[List[User], int]:
+    def list_users(db: Session, skip: int = 0, limit: int = 10, include_deleted: bool = False) -> Tuple[List[User], int]:
         """
         列出使用者清單
-        支援分頁查詢，返回使用者列表和總數
+        支援分頁查詢，返回使用者列表和總數；include_deleted 供管理與稽核查詢包含已刪除的使用者
         """
-        total = db.query(User).count()
-        users = db.query(User).offset(skip).limit(limit).all()
+        query = db.query(User).execution_options(**{INCLUDE_DELETED: include_deleted})
+        total = query.count()
+        users = query.order_by(User.id).offset(skip).limit(limit).all()
         return users, total
 
     @staticmethod
-    def update_last_login(db: Session, user: User) -> User:
-        """更新使用者最後登入時間"""
-        user.last_login_at = datetime.utcnow()
+    def search_users(db: Session, query: str, limit: int = 20, after: Optional[Tuple[float, int]] = None) -> List[Tuple[User, float]]:
+        """
+        模糊搜尋使用者
+        以 pg_trgm 的 word_similarity 比對使用者名稱與電子郵件（由 GIN 三元組索引支援），依相似度由高到低排序
+        after 為上一頁最後一筆的（相似度, 使用者 ID），用於鍵集分頁
+        """
+        score = cast(func.greatest(func.word_similarity(query, User.username), func.word_similarity(query, User.email)), Float)
+        q = db.query(User, score).filter(or_(literal(query).op("<%")(User.username), literal(query).op("<%")(User.email)))
+        if after is not None:
+            last_score, last_id = after
+            q = q.filter(or_(score < last_score, and_(score == last_score, User.id > last_id)))
+        return q.order_by(score.desc(), User.id).limit(limit).all()
+
+    @staticmethod
+    def update_last_logins(db: Session, stamps: Dict[int, datetime]) -> None:
+        """
+        批次更新多位使用者的最後登入時間
+        以單一 executemany UPDATE 寫入並提交一次
+        """
+        if not stamps:
+            return
+        stmt = update(User.__table__).where(User.__table__.c.id == bindparam("user_id")).values(last_login_at=bindparam("last_login_at"))
+        db.execute(stmt, [{"user_id": user_id, "last_login_at": stamp} for user_id, stamp in stamps.items()])
         db.commit()
-        db.refresh(user)
-        return user
+
+
+def _stamp_last_logins(payloads: List[Tuple[int, datetime]]) -> None:
+    """背景工作：合併同一批次的登入紀錄，每位使用者只保留最晚的時間"""
+    stamps: Dict[int, datetime] = {}
+    for user_id, stamp in payloads:
+        if user_id not in stamps or stamp > stamps[user_id]:
+            stamps[user_id] = stamp
+
+    db = SessionLocal()
+    try:
+        UserService.update_last_logins(db, stamps)
+    finally:
+        db.close()
+
+
+task_runner.register("stamp_last_login", _stamp_last_logins)
@@ -0,0 +1,72 @@
+"""
+PostgreSQL 基準測試共用工具
+在暫存 schema 中建立資料表，量測時以 EXPLAIN ANALYZE 取得實際執行的查詢計畫與執行時間
+"""
+
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Sequence, Tuple
+
+from sqlalchemy import Table, create_engine, event, text
+from sqlalchemy.engine import Connection, Engine
+
+from app.database.session import Base
+
+
+@contextmanager
+def scratch_engine(url: str, schema: str, tables: Sequence[Table], keep: bool = False) -> Iterator[Engine]:
+    """
+    建立暫存 schema 並在其中建立資料表，返回 search_path 指向該 schema 的引擎
+    public 保留在 search_path 中，擴充功能（例如 pg_trgm）的函式仍可使用；結束時刪除 schema，keep 為 True 時保留
+    """
+    admin = create_engine(url, isolation_level="AUTOCOMMIT")
+    with admin.connect() as conn:
+        conn.execute(text(f'DROP SCHEMA IF EXISTS "{schema}" CASCADE'))
+        conn.execute(text(f'CREATE SCHEMA "{schema}"'))
+    engine = create_engine(url, connect_args={"options": f"-csearch_path={schema},public"})
+    try:
+        Base.metadata.create_all(engine, tables=list(tables))
+        yield engine
+    finally:
+        engine.dispose()
+        if not keep:
+            with admin.connect() as conn:
+                conn.execute(text(f'DROP SCHEMA IF EXISTS "{schema}" CASCADE'))
+        admin.dispose()
+
+
+def capture(engine: Engine, fn: Callable[[], object]) -> Tuple[str, object]:
+    """執行 fn 並返回它送到資料庫的最後一個陳述式與參數，用於對服務層實際執行的查詢做 EXPLAIN"""
+    captured: List[Tuple[str, object]] = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany) -> None:
+        captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    return captured[-1]
+
+
+def _scans(node: dict) -> List[str]:
+    """依序列出計畫中讀取資料表或索引的節點"""
+    found = []
+    if "Relation Name" in node or "Index Name" in node:
+        found.append(f"{node['Node Type']}({node.get('Index Name') or node['Relation Name']})")
+    for child in node.get("Plans", ()):
+        found.extend(_scans(child))
+    return found
+
+
+def explain(conn: Connection, statement: str, parameters: object, repeat: int = 3) -> Tuple[float, str]:
+    """
+    以 EXPLAIN ANALYZE 執行陳述式
+    返回多次執行中最短的執行時間（毫秒）與計畫中讀取資料表或索引的節點
+    """
+    best, scans = float("inf"), ""
+    for _ in range(repeat):
+        plan = conn.exec_driver_sql("EXPLAIN (ANALYZE, FORMAT JSON) " + statement, parameters).scalar()[0]
+        if plan["Execution Time"] < best:
+            best, scans = plan["Execution Time"], " > ".join(_scans(plan["Plan"]))
+    return best, scans
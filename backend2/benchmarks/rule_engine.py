@@ -0,0 +1,80 @@
+"""
+告警規則引擎基準測試
+以大量規則與設備載入記憶體中的規則引擎，量測載入時間與記憶體用量、寫入路徑每筆讀數的評估延遲，以及離線規則時間輪推進一個刻度的時間
+不需要資料庫；規則以與 AlertRule 相同欄位的物件代替，每 10 條規則中有 1 條為使用者層級規則，其餘為設備規則，四種指標平均分配
+
+執行方式（於 backend2 目錄）：
+    python -m benchmarks.rule_engine [--rules 1000000] [--devices 200000] [--users 20000] [--readings 100000]
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from app.services.rules import METRICS, RuleEngine
+
+
+def run(rules: int, devices: int, users: int, readings: int, tick_seconds: float = 5.0, seed: int = 0) -> dict:
+    """執行基準測試並返回量測結果"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    engine = RuleEngine(tick_seconds=tick_seconds)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    engine.load([], ((device_id, device_id % users, None) for device_id in range(devices)), [], now=now)
+    for rule_id in range(rules):
+        device_id = rule_id % devices
+        rule = SimpleNamespace(
+            id=rule_id,
+            user_id=device_id % users,
+            device_id=None if rule_id % 10 == 0 else device_id,
+            metric=METRICS[rule_id % len(METRICS)],
+            threshold=50 + rule_id % 100,
+            is_active=True,
+        )
+        engine.set_rule(rule, now=now)
+    load_seconds = time.perf_counter() - started
+    memory_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    samples = [(device_id, device_id % users, rng.random() * 10) for device_id in (rng.randrange(devices) for _ in range(readings))]
+    started = time.perf_counter()
+    for device_id, user_id, usage in samples:
+        engine.observe(device_id, user_id, usage, usage * 2, now, now=now)
+    observe_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    fired = engine.tick(now + timedelta(seconds=tick_seconds * 2))
+    tick_seconds_taken = time.perf_counter() - started
+
+    return {
+        "load_seconds": load_seconds,
+        "memory_mb": memory_bytes / 1e6,
+        "observe_us": observe_seconds / readings * 1e6,
+        "tick_ms": tick_seconds_taken * 1000,
+        "tick_alerts": len(fired),
+    }
+
+
+def main() -> None:
+    """解析命令列參數並輸出量測結果"""
+    parser = argparse.ArgumentParser(description="告警規則引擎基準測試")
+    parser.add_argument("--rules", type=int, default=1_000_000, help="規則數")
+    parser.add_argument("--devices", type=int, default=200_000, help="設備數")
+    parser.add_argument("--users", type=int, default=20_000, help="使用者數")
+    parser.add_argument("--readings", type=int, default=100_000, help="量測寫入路徑延遲的讀數筆數")
+    args = parser.parse_args()
+
+    result = run(args.rules, args.devices, args.users, args.readings)
+    print(f"規則 {args.rules:,} 條、設備 {args.devices:,} 個、使用者 {args.users:,} 位")
+    print(f"載入：{result['load_seconds']:.1f} 秒，記憶體 {result['memory_mb']:.0f} MB")
+    print(f"每筆讀數評估：{result['observe_us']:.1f} 微秒")
+    print(f"時間輪推進一個刻度：{result['tick_ms']:.2f} 毫秒（觸發 {result['tick_alerts']} 則告警）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+模糊搜尋基準測試
+在 PostgreSQL 的暫存 schema 中寫入大量使用者與設備（預設各 100 萬筆），比較 ILIKE '%x%' 與 pg_trgm 相似度搜尋的查詢計畫與執行時間
+先在沒有三元組索引時量測，再建立與 migration c7d2e9f1a3b4 相同的 GIN 三元組索引後重新量測；相似度搜尋量測的是服務層實際送出的查詢
+需要可建立 pg_trgm 擴充功能的資料庫
+
+執行方式（於 backend2 目錄）：
+    python -m benchmarks.search [--url URL] [--rows 1000000] [--tenants 1000] [--keep]
+"""
+
+import argparse
+from typing import Callable, List, Tuple
+
+from sqlalchemy import or_, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.device import Device
+from app.models.user import User
+from app.services.device import DeviceService
+from app.services.user import UserService
+
+from .postgres import capture, explain, scratch_engine
+
+SCHEMA = "bench_search"
+
+# 與 migration c7d2e9f1a3b4 相同的三元組索引
+TRGM_INDEXES = [
+    ("idx_users_username_trgm", "users", "username"),
+    ("idx_users_email_trgm", "users", "email"),
+    ("idx_devices_name_trgm", "devices", "name"),
+    ("idx_devices_device_id_trgm", "devices", "device_id"),
+    ("idx_devices_location_trgm", "devices", "location"),
+]
+
+DEVICE_NAMES = ["Smart Meter", "Air Conditioner", "Space Heater", "Refrigerator", "Washing Machine", "Smart Plug", "Ceiling Light", "Dryer"]
+
+# （搜尋對象, 查詢字串）
+QUERIES = [("users", "user4242"), ("users", "exmple.com"), ("devices", "meter"), ("devices", "bldg 17"), ("devices", "DEV-0004")]
+
+
+def require_trgm(engine: Engine) -> None:
+    """建立 pg_trgm 擴充功能，資料庫未安裝時以明確的訊息結束"""
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm SCHEMA public"))
+    except SQLAlchemyError as exc:
+        raise SystemExit(f"無法建立 pg_trgm 擴充功能：{exc.orig}")
+
+
+def seed(engine: Engine, rows: int, tenants: int) -> None:
+    """以 generate_series 在資料庫端寫入使用者與設備，設備平均分配給前 tenants 位使用者"""
+    names = ", ".join(f"'{name}'" for name in DEVICE_NAMES)
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO users (username, password, email, role, is_active) SELECT 'user' || i, 'x', 'user' || i || '@example.com', 'user', true FROM generate_series(1, :rows) AS i"),
+            {"rows": rows},
+        )
+        conn.execute(
+            text(
+                f"INSERT INTO devices (user_id, name, device_id, type, location, status, is_active, power_usage) "
+                f"SELECT 1 + i % :tenants, (ARRAY[{names}])[1 + i % {len(DEVICE_NAMES)}] || ' ' || i, 'DEV-' || lpad(i::text, 7, '0'), 'plug', "
+                f"'Building ' || (i % 200) || ' Floor ' || (i % 12), 'offline', true, 0 FROM generate_series(1, :rows) AS i"
+            ),
+            {"rows": rows, "tenants": tenants},
+        )
+    analyze(engine)
+
+
+def analyze(engine: Engine) -> None:
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE users"))
+        conn.execute(text("ANALYZE devices"))
+
+
+def ilike(db: Session, target: str, query: str, limit: int = 20) -> Callable[[], list]:
+    """改用 ILIKE '%x%' 的對照查詢，條件與排序範圍與服務層的搜尋相同"""
+    pattern = f"%{query}%"
+    if target == "users":
+        return lambda: db.query(User).filter(or_(User.username.ilike(pattern), User.email.ilike(pattern))).order_by(User.id).limit(limit).all()
+    columns = (Device.name, Device.device_id, Device.location)
+    return lambda: db.query(Device).filter(Device.user_id == 1, Device.deleted_at.is_(None), or_(*(column.ilike(pattern) for column in columns))).order_by(Device.id).limit(limit).all()
+
+
+def trigram(db: Session, target: str, query: str, limit: int = 20) -> Callable[[], list]:
+    """服務層的相似度搜尋"""
+    if target == "users":
+        return lambda: UserService.search_users(db, query=query, limit=limit)
+    return lambda: DeviceService.search_devices(db, user_id=1, query=query, limit=limit)
+
+
+def measure(engine: Engine, label: str) -> List[Tuple[str, str, str, float, str]]:
+    """量測每個查詢字串的兩種查詢，返回（階段, 搜尋對象, 查詢, 方式, 毫秒, 計畫）"""
+    results = []
+    with Session(engine) as db, engine.connect() as conn:
+        for target, query in QUERIES:
+            for method, build in (("ILIKE", ilike), ("pg_trgm", trigram)):
+                statement, parameters = capture(engine, build(db, target, query))
+                elapsed, scans = explain(conn, statement, parameters)
+                results.append((label, f"{target}: {query}", method, elapsed, scans))
+    return results
+
+
+def main() -> None:
+    """解析命令列參數、寫入資料並輸出量測結果"""
+    parser = argparse.ArgumentParser(description="模糊搜尋基準測試")
+    parser.add_argument("--url", default=settings.DATABASE_URL, help="PostgreSQL 連接字串，資料寫入其中的暫存 schema")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="使用者數與設備數")
+    parser.add_argument("--tenants", type=int, default=1000, help="擁有設備的使用者數，設備搜尋以第一位使用者量測")
+    parser.add_argument("--keep", action="store_true", help="結束時保留暫存 schema")
+    args = parser.parse_args()
+
+    with scratch_engine(args.url, SCHEMA, [User.__table__, Device.__table__], keep=args.keep) as engine:
+        require_trgm(engine)
+        seed(engine, args.rows, args.tenants)
+        results = measure(engine, "無三元組索引")
+        with engine.begin() as conn:
+            for name, table, column in TRGM_INDEXES:
+                conn.execute(text(f"CREATE INDEX {name} ON {table} USING gin ({column} gin_trgm_ops)"))
+        analyze(engine)
+        results += measure(engine, "有三元組索引")
+
+    print(f"使用者 {args.rows:,} 位、設備 {args.rows:,} 個（{args.tenants:,} 位使用者平均擁有）")
+    for label, query, method, elapsed, scans in results:
+        print(f"{label:<8} {query:<22} {method:<8} {elapsed:>9.2f} ms  {scans}")
+
+
+if __name__ == "__main__":
+    main()
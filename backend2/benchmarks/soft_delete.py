@@ -0,0 +1,99 @@
+"""
+軟刪除查詢範圍基準測試
+在 PostgreSQL 的暫存 schema 中寫入設備與用電紀錄，依比例（預設 30%）標記為已刪除，比較自動加上 deleted_at IS NULL 的一般查詢與 include_deleted 查詢
+輸出各查詢的查詢計畫（是否使用 WHERE deleted_at IS NULL 的部分索引）與執行時間，以及含 ORM 開銷的每次查詢平均時間
+
+執行方式（於 backend2 目錄）：
+    python -m benchmarks.soft_delete [--url URL] [--devices 100000] [--records 20] [--deleted-ratio 0.3] [--keep]
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict
+
+from sqlalchemy import func, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Query, Session
+
+from app.config import settings
+from app.database.soft_delete import INCLUDE_DELETED
+from app.models.device import Device, PowerUsageRecord
+from app.models.user import User
+
+from .postgres import capture, explain, scratch_engine
+
+SCHEMA = "bench_soft_delete"
+
+TENANTS = 1000
+
+
+def seed(engine: Engine, devices: int, records: int, ratio: float) -> None:
+    """以 generate_series 在資料庫端寫入資料，設備與用電紀錄各有 ratio 比例標記為已刪除"""
+    deleted = int(ratio * 100)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (username, password, email, role, is_active) SELECT 'user' || i, 'x', 'user' || i || '@example.com', 'user', true FROM generate_series(1, :tenants) AS i"), {"tenants": TENANTS})
+        conn.execute(
+            text(
+                "INSERT INTO devices (user_id, name, device_id, type, status, is_active, power_usage, deleted_at) "
+                "SELECT 1 + i % :tenants, 'Device ' || i, 'DEV-' || i, 'plug', 'online', true, 0, CASE WHEN i % 100 < :deleted THEN now() END FROM generate_series(1, :devices) AS i"
+            ),
+            {"tenants": TENANTS, "devices": devices, "deleted": deleted},
+        )
+        conn.execute(
+            text(
+                "INSERT INTO power_usage_records (device_id, usage, cost, timestamp, deleted_at) "
+                "SELECT d, 1, 2, now() - n * interval '5 minutes', CASE WHEN (d * 31 + n) % 100 < :deleted THEN now() END "
+                "FROM generate_series(1, :devices) AS d, generate_series(1, :records) AS n"
+            ),
+            {"devices": devices, "records": records, "deleted": deleted},
+        )
+    with engine.begin() as conn:
+        for table in ("users", "devices", "power_usage_records"):
+            conn.execute(text(f"ANALYZE {table}"))
+
+
+def queries(db: Session) -> Dict[str, Callable[[], Query]]:
+    """服務層常見的查詢形式：依使用者列出與計數設備、依設備與時間範圍讀取用電紀錄、依使用者彙總用電量"""
+    since = datetime.utcnow() - timedelta(hours=1)
+    return {
+        "列出設備": lambda: db.query(Device).filter(Device.user_id == 1).order_by(Device.id).limit(50),
+        "計數設備": lambda: db.query(func.count(Device.id)).filter(Device.user_id == 1),
+        "設備用電紀錄": lambda: db.query(PowerUsageRecord.timestamp, PowerUsageRecord.usage).filter(PowerUsageRecord.device_id == 1001, PowerUsageRecord.timestamp >= since).order_by(PowerUsageRecord.timestamp),
+        "使用者總用電量": lambda: db.query(func.sum(PowerUsageRecord.usage)).join(Device).filter(Device.user_id == 1, PowerUsageRecord.timestamp >= since),
+    }
+
+
+def timed(fn: Callable[[], object], iterations: int) -> float:
+    """返回執行 fn 的平均毫秒數（含 ORM 編譯與結果處理）"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) * 1000 / iterations
+
+
+def main() -> None:
+    """解析命令列參數、寫入資料並輸出量測結果"""
+    parser = argparse.ArgumentParser(description="軟刪除查詢範圍基準測試")
+    parser.add_argument("--url", default=settings.DATABASE_URL, help="PostgreSQL 連接字串，資料寫入其中的暫存 schema")
+    parser.add_argument("--devices", type=int, default=100_000, help="設備數")
+    parser.add_argument("--records", type=int, default=20, help="每個設備的用電紀錄數")
+    parser.add_argument("--deleted-ratio", type=float, default=0.3, help="標記為已刪除的設備與用電紀錄比例")
+    parser.add_argument("--iterations", type=int, default=200, help="量測 ORM 開銷時每個查詢的執行次數")
+    parser.add_argument("--keep", action="store_true", help="結束時保留暫存 schema")
+    args = parser.parse_args()
+
+    with scratch_engine(args.url, SCHEMA, [User.__table__, Device.__table__, PowerUsageRecord.__table__], keep=args.keep) as engine:
+        seed(engine, args.devices, args.records, args.deleted_ratio)
+        print(f"設備 {args.devices:,} 個、用電紀錄 {args.devices * args.records:,} 筆，已刪除比例 {args.deleted_ratio:.0%}")
+        with Session(engine) as db, engine.connect() as conn:
+            for name, build in queries(db).items():
+                for label, options in (("一般查詢", {}), ("include_deleted", {INCLUDE_DELETED: True})):
+                    run = lambda: build().execution_options(**options).all()
+                    statement, parameters = capture(engine, run)
+                    elapsed, scans = explain(conn, statement, parameters)
+                    print(f"{name:<8} {label:<16} 執行 {elapsed:>8.2f} ms  含 ORM {timed(run, args.iterations):>8.2f} ms  {scans}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+測試共用設定
+以本機 SQLite 檔案代替主資料庫與用電紀錄分片，在 backend2 目錄下以 python -m pytest 執行
+需要 PostgreSQL 專屬功能（pg_trgm、序列）的測試以 TEST_DATABASE_URL 指定的伺服器建立暫時的資料庫，未設定時略過
+"""
+
+import os
+import uuid
+
+# 測試不寫入異常偵測快照
+os.environ.setdefault("ANOMALY_SNAPSHOT_PATH", "")
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.database.replicas import get_read_db
+from app.database.session import Base, get_db
+from app.main import app
+from app.middleware import rate_limit
+from app.middleware.auth import get_current_active_user
+from app.models import alert, device, forecast  # noqa: F401  註冊所有資料表
+from app.models.user import User
+
+
+@pytest.fixture
+def primary(tmp_path) -> Session:
+    """以 SQLite 檔案代替主資料庫的 session"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def pg_primary() -> Session:
+    """在 TEST_DATABASE_URL 指定的 PostgreSQL 上建立暫時的資料庫並返回其 session，結束時刪除資料庫"""
+    url = os.environ.get("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("未設定 TEST_DATABASE_URL")
+    admin = create_engine(url, isolation_level="AUTOCOMMIT")
+    name = f"test_{uuid.uuid4().hex[:12]}"
+    with admin.connect() as conn:
+        conn.execute(text(f'CREATE DATABASE "{name}"'))
+    engine = create_engine(make_url(url).set(database=name))
+    try:
+        Base.metadata.create_all(engine)
+        session = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)()
+        yield session
+        session.close()
+    finally:
+        engine.dispose()
+        with admin.connect() as conn:
+            conn.execute(text(f'DROP DATABASE "{name}" WITH (FORCE)'))
+        admin.dispose()
+
+
+@pytest.fixture
+def user(primary: Session) -> User:
+    """主資料庫中的測試使用者"""
+    user = User(username="alice", password="x", email="alice@example.com")
+    primary.add(user)
+    primary.commit()
+    return user
+
+
+@pytest.fixture
+def api(primary: Session, user: User, monkeypatch) -> TestClient:
+    """以測試主資料庫與測試使用者建立的 API 用戶端，唯讀路由同樣使用主資料庫，速率限制重設為寬鬆的新實例"""
+    Session = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=primary.get_bind())
+
+    def override_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    monkeypatch.setattr(rate_limit, "device_limiter", rate_limit.TokenBucketLimiter(rate=1, burst=100))
+    monkeypatch.setattr(rate_limit, "user_limiter", rate_limit.TokenBucketLimiter(rate=1, burst=100))
+    app.dependency_overrides[get_db] = override_db
+    app.dependency_overrides[get_read_db] = override_db
+    app.dependency_overrides[get_current_active_user] = lambda: user
+    yield TestClient(app)
+    app.dependency_overrides.clear()
@@ -0,0 +1,106 @@
+"""
+行程內快取同步測試
+直接寫入資料庫代替其他工作行程的寫入，驗證本行程的近期讀數、排行與告警規則在同步後跟上
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from app.models.alert import AlertRule
+from app.models.device import Device, PowerUsageRecord
+from app.services import cache_sync as cache_sync_module
+from app.services import device as device_service
+from app.services.cache_sync import CacheSync
+from app.services.rankings import SCOPE_USER, UsageRankings
+from app.services.recent import RecentReadingsBuffer
+from app.services.rules import RuleEngine
+
+
+@pytest.fixture
+def state(monkeypatch):
+    """以全新的近期讀數緩衝、排行與規則引擎取代全域實例"""
+    recent, rankings, rules = RecentReadingsBuffer(initial_devices=4), UsageRankings(size=5), RuleEngine()
+    recent.warm([], since=datetime.utcnow() - timedelta(hours=1))
+    for module in (device_service, cache_sync_module):
+        monkeypatch.setattr(module, "usage_rankings", rankings)
+        monkeypatch.setattr(module, "rule_engine", rules)
+    monkeypatch.setattr(device_service, "recent_readings", recent)
+    return recent, rankings, rules
+
+
+@pytest.fixture
+def device(primary, user) -> Device:
+    device = Device(user_id=user.id, name="冷氣", device_id="AC-1", type="ac", location="客廳")
+    primary.add(device)
+    primary.commit()
+    return device
+
+
+def add_record(primary, device: Device, usage: float, record_id: int = None) -> int:
+    """以另一個工作行程的身分寫入一筆讀數，不經過本行程的寫入路徑"""
+    record = PowerUsageRecord(id=record_id, device_id=device.id, usage=usage, cost=usage * 2, timestamp=datetime.utcnow() - timedelta(minutes=1))
+    primary.add(record)
+    primary.commit()
+    return record.id
+
+
+def test_records_from_other_workers_are_loaded_once(primary, user, device, state):
+    recent, rankings, _ = state
+    sync = CacheSync(interval=1, settle=0)
+    sync.start(primary)
+    add_record(primary, device, 1.5)
+    add_record(primary, device, 2.5)
+
+    assert sync.sync(primary)["records"] == 2
+    assert recent.latest([device.id])[device.id]["usage"] == 2.5
+    assert rankings.top(SCOPE_USER, user.id, "day") == [(device.id, 4.0)]
+
+    # 再次同步不會重複計入
+    assert sync.sync(primary)["records"] == 0
+    assert rankings.top(SCOPE_USER, user.id, "day") == [(device.id, 4.0)]
+
+
+def test_records_committed_out_of_order_are_not_skipped(primary, user, device, state):
+    _, rankings, _ = state
+    sync = CacheSync(interval=1, settle=60)
+    sync.start(primary)
+    add_record(primary, device, 1.0, record_id=1)
+    add_record(primary, device, 3.0, record_id=3)
+    sync.sync(primary, now=0.0)
+
+    # ID 2 較晚提交（例如較長的交易），仍在穩定界線內重新查詢
+    add_record(primary, device, 2.0, record_id=2)
+    assert sync.sync(primary, now=1.0)["records"] == 1
+    assert rankings.top(SCOPE_USER, user.id, "day") == [(device.id, 6.0)]
+
+
+def test_device_and_rule_changes_from_other_workers(primary, user, device, state):
+    recent, rankings, rules = state
+    sync = CacheSync(interval=1, settle=0)
+    sync.start(primary)
+    sync._since = datetime.utcnow() - timedelta(minutes=1)
+    changed_at = datetime.utcnow() - timedelta(seconds=30)
+    rule = AlertRule(user_id=user.id, device_id=device.id, metric="usage", threshold=10, updated_at=changed_at)
+    primary.add(rule)
+    primary.commit()
+    add_record(primary, device, 1.0)
+    sync.sync(primary)
+    assert len(rules) == 1
+
+    primary.execute(update(Device).where(Device.id == device.id).values(location="臥室", updated_at=changed_at + timedelta(seconds=1)))
+    primary.execute(update(AlertRule).where(AlertRule.id == rule.id).values(is_active=False, updated_at=changed_at + timedelta(seconds=1)))
+    primary.commit()
+    sync._since = changed_at
+    sync.sync(primary)
+    assert rankings.top("location", (user.id, "臥室"), "day") == [(device.id, 1.0)]
+    assert rankings.top("location", (user.id, "客廳"), "day") == []
+    assert len(rules) == 0
+
+    primary.execute(update(Device).where(Device.id == device.id).values(deleted_at=datetime.utcnow(), updated_at=changed_at + timedelta(seconds=2)))
+    primary.commit()
+    sync._since = changed_at + timedelta(seconds=1)
+    sync.sync(primary)
+    assert len(recent) == 0
+    assert rankings.top(SCOPE_USER, user.id, "day") == []
@@ -0,0 +1,193 @@
+"""
+API 端點的查詢數回歸測試
+統計每個請求在主資料庫上執行的 SQL 陳述式與提交次數：所有權檢查併入 UPDATE / DELETE ... RETURNING，每個請求最多提交一次
+失敗的請求（403 / 404）只多一次判斷原因的 SELECT，且不提交
+讀取端點由近期讀數緩衝、分析快取與記憶體排行回答的部分不查詢用電紀錄，也不提交
+"""
+
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from app.api import dashboard as dashboard_api
+from app.config import settings
+from app.middleware.auth import get_password_hash
+from app.models.alert import AlertRule
+from app.models.device import Device
+from app.models.user import User
+from app.services import device as device_service
+from app.services.cache import ResultCache
+from app.services.dashboard import SnapshotCache
+from app.services.rankings import UsageRankings
+from app.services.recent import RecentReadingsBuffer
+
+P = settings.API_V1_PREFIX
+
+
+class Statements:
+    """記錄主資料庫上執行的陳述式種類（SELECT、INSERT、UPDATE、DELETE）與提交"""
+
+    def __init__(self, engine):
+        self.log: List[str] = []
+        event.listen(engine, "before_cursor_execute", self._execute)
+        event.listen(engine, "commit", self._commit)
+
+    def _execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        self.log.append(statement.split(None, 1)[0].upper())
+
+    def _commit(self, conn) -> None:
+        self.log.append("COMMIT")
+
+
+@pytest.fixture
+def env(api, primary, user):
+    """建立另一位使用者與雙方的設備，並開始記錄主資料庫上的陳述式"""
+    user.password = get_password_hash("secret12")
+    other = User(username="bob", password="x", email="bob@example.com")
+    primary.add(other)
+    primary.commit()
+    device = Device(user_id=user.id, name="冷氣", device_id="AC-1", type="ac", location="客廳")
+    other_device = Device(user_id=other.id, name="電視", device_id="TV-1", type="tv")
+    primary.add_all([device, other_device])
+    primary.commit()
+    return api, Statements(primary.get_bind()), device, other_device
+
+
+def request(env, method: str, url: str, status: int, **kwargs) -> List[str]:
+    """送出請求並返回執行的陳述式"""
+    client, statements, _, _ = env
+    statements.log.clear()
+    response = client.request(method, P + url, **kwargs)
+    assert response.status_code == status, response.text
+    return list(statements.log)
+
+
+def test_create_device(env):
+    assert request(env, "POST", "/devices", 201, json={"name": "燈", "device_id": "L-1", "type": "light"}) == ["SELECT", "INSERT", "COMMIT"]
+
+
+def test_import_devices(env):
+    rows = [{"name": f"燈{i}", "device_id": f"L-{i}", "type": "light"} for i in range(5)]
+    assert request(env, "POST", "/devices/import", 200, json=rows) == ["SELECT", "INSERT", "COMMIT"]
+
+
+def test_update_device(env):
+    _, _, device, other_device = env
+    assert request(env, "PUT", f"/devices/{device.id}", 200, json={"location": "臥室"}) == ["UPDATE", "COMMIT"]
+    assert request(env, "PUT", f"/devices/{other_device.id}", 403, json={"location": "臥室"}) == ["UPDATE", "SELECT"]
+    assert request(env, "PUT", "/devices/9999", 404, json={"location": "臥室"}) == ["UPDATE", "SELECT"]
+
+
+def test_update_device_status(env):
+    _, _, device, other_device = env
+    assert request(env, "PUT", f"/devices/{device.id}/status", 200, json={"status": "online"}) == ["UPDATE", "COMMIT"]
+    assert request(env, "PUT", f"/devices/{other_device.id}/status", 403, json={"status": "online"}) == ["UPDATE", "SELECT"]
+
+
+def test_record_power_usage(env):
+    _, _, device, other_device = env
+    reading = {"usage": 1.5, "timestamp": datetime.utcnow().isoformat(), "cost": 3.0}
+    assert request(env, "POST", f"/devices/{device.id}/usage", 200, json=reading) == ["UPDATE", "INSERT", "COMMIT"]
+    assert request(env, "POST", f"/devices/{other_device.id}/usage", 403, json=reading) == ["UPDATE", "SELECT"]
+
+
+def test_delete_device(env):
+    _, _, device, other_device = env
+    assert request(env, "DELETE", f"/devices/{other_device.id}", 403) == ["UPDATE", "SELECT"]
+    assert request(env, "DELETE", f"/devices/{device.id}", 200) == ["UPDATE", "COMMIT"]
+
+
+@pytest.mark.parametrize(
+    "url, body",
+    [
+        ("/devices/bulk/status", {"location": "客廳", "status": "offline"}),
+        ("/devices/bulk/location", {"type": "ac", "new_location": "臥室"}),
+        ("/devices/bulk/delete", {"type": "ac"}),
+    ],
+)
+def test_bulk_operations(env, url, body):
+    assert request(env, "POST", url, 200, json=body) == ["UPDATE", "COMMIT"]
+
+
+def test_alert_rules(env, primary):
+    client, statements, _, _ = env
+    statements.log.clear()
+    response = client.post(P + "/alerts/rules", json={"metric": "usage", "threshold": 5})
+    assert response.status_code == 201
+    assert statements.log == ["INSERT", "COMMIT"]
+    rule_id = response.json()["id"]
+
+    assert request(env, "PUT", f"/alerts/rules/{rule_id}", 200, json={"threshold": 7}) == ["UPDATE", "COMMIT"]
+    assert request(env, "DELETE", f"/alerts/rules/{rule_id}", 200) == ["DELETE", "COMMIT"]
+    assert request(env, "DELETE", f"/alerts/rules/{rule_id}", 404) == ["DELETE", "SELECT"]
+    assert primary.query(AlertRule).count() == 0
+
+
+def test_user_endpoints(env):
+    assert request(env, "PUT", "/profile", 200, json={"phone": "0912345678"}) == ["UPDATE", "COMMIT"]
+    assert request(env, "POST", "/change-password", 200, json={"old_password": "secret12", "new_password": "secret34"}) == ["UPDATE", "COMMIT"]
+    assert request(env, "POST", "/register", 201, json={"username": "carol", "password": "secret12", "email": "carol@example.com", "phone": "0911"}) == ["SELECT", "SELECT", "INSERT", "COMMIT"]
+
+
+@pytest.fixture
+def reads(env, primary, monkeypatch):
+    """以全新且已預熱的近期讀數緩衝、分析快取、排行與儀表板快取取代全域實例，儀表板的唯讀 session 改用測試資料庫"""
+    recent = RecentReadingsBuffer(initial_devices=4)
+    recent.warm([], since=datetime.utcnow() - recent.window)
+    monkeypatch.setattr(device_service, "recent_readings", recent)
+    monkeypatch.setattr(device_service, "analytics_cache", ResultCache())
+    monkeypatch.setattr(device_service, "usage_rankings", UsageRankings(size=5))
+    monkeypatch.setattr(dashboard_api, "read_replicas", type("Replicas", (), {"session": staticmethod(sessionmaker(bind=primary.get_bind()))})())
+    monkeypatch.setattr(dashboard_api, "dashboard_snapshots", SnapshotCache(ttl_seconds=60, max_entries=10))
+    return env
+
+
+def window(start: timedelta, end: timedelta) -> dict:
+    now = datetime.utcnow()
+    return {"params": {"start_time": (now - start).isoformat(), "end_time": (now - end).isoformat()}}
+
+
+def test_list_devices(reads):
+    # 總數與分頁各一次
+    assert request(reads, "GET", "/devices", 200) == ["SELECT", "SELECT"]
+
+
+def test_get_device(reads):
+    _, _, device, _ = reads
+    assert request(reads, "GET", f"/devices/{device.id}", 200) == ["SELECT"]
+
+
+def test_device_usage(reads):
+    _, _, device, other_device = reads
+    # 已結算的範圍第一次查詢用電紀錄，之後由分析快取回答，只剩所有權檢查
+    settled = window(timedelta(days=10), timedelta(days=9))
+    assert request(reads, "GET", f"/devices/{device.id}/usage", 200, **settled) == ["SELECT", "SELECT"]
+    assert request(reads, "GET", f"/devices/{device.id}/usage", 200, **settled) == ["SELECT"]
+    # 近期的範圍由近期讀數緩衝回答
+    assert request(reads, "GET", f"/devices/{device.id}/usage", 200, **window(timedelta(hours=1), timedelta(0))) == ["SELECT"]
+    assert request(reads, "GET", f"/devices/{other_device.id}/usage", 403, **window(timedelta(hours=1), timedelta(0))) == ["SELECT"]
+
+
+def test_current_power(reads):
+    assert request(reads, "GET", "/devices/current-power", 200) == ["SELECT"]
+
+
+def test_rankings(reads):
+    _, _, device, _ = reads
+    assert request(reads, "GET", "/devices/rankings", 200) == []
+    device_service.usage_rankings.observe(device.id, device.user_id, device.location, 1.0, datetime.utcnow())
+    # 排行來自記憶體，只以一次主鍵查詢載入設備
+    assert request(reads, "GET", "/devices/rankings", 200) == ["SELECT"]
+
+
+def test_dashboard(reads):
+    _, _, device, _ = reads
+    device_service.usage_rankings.observe(device.id, device.user_id, device.location, 1.0, datetime.utcnow())
+    # 各區塊並行查詢，順序不固定：即時用電 1、最近兩小時總用電量 2 x 2、每日用電 2、預測 1、設備用電分布 1
+    assert Counter(request(reads, "GET", "/dashboard", 200)) == {"SELECT": 9}
+    # 快取期間內重複載入不查詢資料庫
+    assert request(reads, "GET", "/dashboard", 200) == []
@@ -0,0 +1,44 @@
+"""用電排行測試"""
+
+from datetime import datetime
+
+from app.models.device import Device
+from app.models.user import User
+from app.services import device as device_service
+from app.services.rankings import SCOPE_LOCATION, SCOPE_USER, UsageRankings
+
+
+def test_location_boards_are_per_tenant():
+    rankings = UsageRankings(size=5)
+    now = datetime.utcnow()
+    rankings.observe(1, 10, "Office", 3.0, now, now=now)
+    rankings.observe(2, 20, "Office", 5.0, now, now=now)
+
+    assert rankings.top(SCOPE_LOCATION, (10, "Office"), "day", now=now) == [(1, 3.0)]
+    assert rankings.top(SCOPE_LOCATION, (20, "Office"), "day", now=now) == [(2, 5.0)]
+
+    rankings.relocate(1, "Lab", now=now)
+    assert rankings.top(SCOPE_LOCATION, (10, "Office"), "day", now=now) == []
+    assert rankings.top(SCOPE_LOCATION, (10, "Lab"), "day", now=now) == [(1, 3.0)]
+    assert rankings.top(SCOPE_USER, 10, "day", now=now) == [(1, 3.0)]
+
+
+def test_location_rankings_endpoint_only_shows_own_devices(api, primary, user, monkeypatch):
+    rankings = UsageRankings(size=5)
+    monkeypatch.setattr(device_service, "usage_rankings", rankings)
+    other = User(username="bob", password="x", email="bob@example.com")
+    primary.add(other)
+    primary.flush()
+    mine = Device(user_id=user.id, name="冷氣", device_id="AC-1", type="ac", location="Office")
+    theirs = Device(user_id=other.id, name="暖氣", device_id="HT-1", type="heater", location="Office")
+    primary.add_all([mine, theirs])
+    primary.commit()
+    now = datetime.utcnow()
+    rankings.observe(mine.id, user.id, "Office", 1.0, now)
+    rankings.observe(theirs.id, other.id, "Office", 9.0, now)
+
+    response = api.get("/api/v1/devices/rankings", params={"location": "Office"})
+    assert response.status_code == 200
+    assert [item["device_id"] for item in response.json()["items"]] == ["AC-1"]
+
+    assert api.get("/api/v1/devices/rankings", params={"location": "Office", "user_id": other.id}).status_code == 403
@@ -0,0 +1,35 @@
+"""權杖桶速率限制器的測試"""
+
+from app.middleware.rate_limit import TokenBucketLimiter
+
+
+def test_acquire_until_empty():
+    limiter = TokenBucketLimiter(rate=1, burst=2)
+    assert limiter.acquire(1, now=0.0) == (True, 0.0)
+    assert limiter.acquire(1, now=0.0) == (True, 0.0)
+    assert limiter.acquire(1, now=0.0) == (False, 1.0)
+    assert limiter.acquire(1, now=1.0) == (True, 0.0)
+
+
+def test_sweep_drops_full_buckets_first():
+    limiter = TokenBucketLimiter(rate=1, burst=5, max_keys=3)
+    for key in range(3):
+        limiter.acquire(key, now=0.0)
+    limiter.acquire(0, now=0.0)
+    limiter.acquire(0, now=0.0)
+
+    # 1、2 已回滿被回收，0 仍在補充中而保留
+    limiter.acquire(3, now=1.5)
+    assert sorted(limiter._slots) == [0, 3]
+    assert limiter.acquire(0, now=1.5) == (True, 0.0)
+
+
+def test_rotating_keys_stay_within_max_keys():
+    limiter = TokenBucketLimiter(rate=0.001, burst=1, max_keys=10)
+    for key in range(1000):
+        assert limiter.acquire(key, now=float(key))[0]
+        assert len(limiter) <= 10
+
+    # 最近的權杖桶保留，仍被限制
+    assert limiter.acquire(999, now=999.0)[0] is False
+    assert 0 not in limiter._slots
@@ -0,0 +1,24 @@
+"""近期用電讀數緩衝測試"""
+
+from datetime import datetime, timedelta
+
+from app.services.recent import RecentReadingsBuffer
+
+
+def test_forgotten_rows_are_reused():
+    buffer = RecentReadingsBuffer(capacity=4, initial_devices=2)
+    buffer.warm([], since=datetime.utcnow() - timedelta(hours=1))
+    now = datetime.utcnow()
+    for device_id in (1, 2):
+        buffer.append(device_id, device_id, now, 1.0, 2.0)
+    size = buffer.nbytes()
+
+    buffer.forget(1)
+    assert len(buffer) == 1
+    assert buffer.latest([1, 2], now=now).keys() == {2}
+
+    # 新設備使用釋出的列，不會擴充矩陣，也看不到前一個設備的讀數
+    buffer.append(3, 3, now, 5.0, 6.0)
+    assert buffer.nbytes() == size
+    assert buffer.latest([3], now=now)[3]["usage"] == 5.0
+    assert buffer.query(3, now - timedelta(minutes=1), now)["id"].tolist() == [3]
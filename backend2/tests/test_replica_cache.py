@@ -0,0 +1,61 @@
+"""
+唯讀複本與分析快取測試
+落後主資料庫的複本讀到的已結算範圍結果不寫入快取，與主資料庫斷線而無法估計延遲的複本不會被選用
+"""
+
+from datetime import datetime
+
+from sqlalchemy import create_engine
+
+from app.database import replicas
+from app.database.replicas import ReadReplicas
+from app.services.cache import ResultCache
+
+KEY = ResultCache.make_key("user", 1, datetime(2020, 1, 1), datetime(2020, 1, 2), "total")
+
+
+def test_primary_sessions_are_caught_up(primary):
+    assert ReadReplicas.caught_up(primary)
+
+
+def test_lagging_replica_results_are_not_cached(tmp_path, monkeypatch):
+    router = ReadReplicas([f"sqlite:///{tmp_path / 'replica.db'}"], engine_factory=create_engine)
+    cache = ResultCache()
+    monkeypatch.setattr(replicas, "_primary_lsn", lambda: "0/0")
+    db = router.session()
+    try:
+        monkeypatch.setattr(replicas, "_lag_query", lambda conn, primary_lsn: 3.0)
+        assert cache.get_or_compute(KEY, lambda: 1.0, fresh=lambda: ReadReplicas.caught_up(db)) == 1.0
+        assert len(cache) == 0
+
+        monkeypatch.setattr(replicas, "_lag_query", lambda conn, primary_lsn: 0.0)
+        assert cache.get_or_compute(KEY, lambda: 2.0, fresh=lambda: ReadReplicas.caught_up(db)) == 2.0
+        assert cache.get_or_compute(KEY, lambda: 3.0, fresh=lambda: ReadReplicas.caught_up(db)) == 2.0
+    finally:
+        db.close()
+        router.dispose()
+
+
+def test_disconnected_replica_is_not_used_or_trusted(tmp_path, monkeypatch):
+    router = ReadReplicas([f"sqlite:///{tmp_path / 'replica.db'}"], engine_factory=create_engine)
+    monkeypatch.setattr(replicas, "_primary_lsn", lambda: "0/0")
+    monkeypatch.setattr(replicas, "_lag_query", lambda conn, primary_lsn: None)
+    db = router.session()
+    try:
+        assert router.pick() is None
+        assert replicas.REPLICA not in db.info
+
+        # 已開啟的複本 session 在斷線後不視為已追上
+        db.info[replicas.REPLICA] = 0
+        assert not ReadReplicas.caught_up(db)
+    finally:
+        db.close()
+        router.dispose()
+
+
+def test_postgres_lag_is_measured_against_primary_lsn(pg_primary):
+    # 不在復原模式的資料庫（以主資料庫代替複本）沒有延遲；查詢語法在 PostgreSQL 上可執行
+    conn = pg_primary.connection()
+    lsn = conn.execute(replicas.PRIMARY_LSN_QUERY).scalar()
+    assert replicas._lag_query(conn, lsn) == 0
+    assert replicas._lag_query(conn, None) == 0
@@ -0,0 +1,115 @@
+"""
+模糊搜尋測試
+游標的編碼與驗證在 SQLite 上測試；相似度排序與鍵集分頁需要 PostgreSQL 的 pg_trgm，以 TEST_DATABASE_URL 指定的伺服器測試
+"""
+
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.config import settings
+from app.main import app
+from app.middleware.auth import get_current_admin_user
+from app.models.device import Device
+from app.models.user import User
+from app.services.device import DeviceService
+from app.services.pagination import decode_cursor, encode_cursor
+from app.services.user import UserService
+
+P = settings.API_V1_PREFIX
+
+INVALID_CURSORS = ["不是游標", encode_cursor(0.5), encode_cursor("高", "低"), encode_cursor(None, 1), encode_cursor(0.5, [1])]
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(0.4166666567325592, 42), 2) == [0.4166666567325592, 42]
+    assert decode_cursor(None, 2) is None
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor(1, 2, 3), 2)
+
+
+@pytest.mark.parametrize("cursor", INVALID_CURSORS)
+def test_invalid_device_cursor_is_rejected(api, cursor):
+    response = api.get(P + "/devices/search", params={"q": "冷氣", "cursor": cursor})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("cursor", INVALID_CURSORS)
+def test_invalid_user_cursor_is_rejected(api, user, cursor):
+    app.dependency_overrides[get_current_admin_user] = lambda: user
+    response = api.get(P + "/users/search", params={"q": "alice", "cursor": cursor})
+    assert response.status_code == 400
+
+
+@pytest.fixture
+def trgm(pg_primary):
+    """啟用 pg_trgm，伺服器沒有此擴充功能時略過"""
+    try:
+        pg_primary.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        pg_primary.commit()
+    except SQLAlchemyError:
+        pytest.skip("PostgreSQL 伺服器沒有 pg_trgm 擴充功能")
+    return pg_primary
+
+
+@pytest.fixture
+def tenants(trgm) -> Tuple[User, User]:
+    owner = User(username="alice", password="x", email="alice@example.com")
+    other = User(username="bob", password="x", email="bob@example.com")
+    trgm.add_all([owner, other])
+    trgm.commit()
+    names = ["Smart Meter", "Smart Meter", "Smart Meter", "Meter Box", "Kitchen Meter", "Smart Plug", "Garage Meters", "Heater"]
+    trgm.add_all([Device(user_id=owner.id, name=name, device_id=f"DEV-{index}", type="meter") for index, name in enumerate(names)])
+    trgm.add(Device(user_id=other.id, name="Smart Meter", device_id="OTHER-1", type="meter"))
+    trgm.add(Device(user_id=owner.id, name="Smart Meter", device_id="GONE-1", type="meter", deleted_at=datetime.utcnow()))
+    trgm.commit()
+    return owner, other
+
+
+def paginate(db, user_id: int, query: str, limit: int) -> List[Tuple[Device, float]]:
+    """以游標逐頁取出所有結果，游標經過與 API 相同的編碼與解碼"""
+    results: List[Tuple[Device, float]] = []
+    cursor: Optional[str] = None
+    while True:
+        after = decode_cursor(cursor, 2)
+        page = DeviceService.search_devices(db, user_id=user_id, query=query, limit=limit, after=(float(after[0]), int(after[1])) if after else None)
+        results.extend(page)
+        if len(page) < limit:
+            return results
+        cursor = encode_cursor(page[-1][1], page[-1][0].id)
+
+
+def test_results_are_ranked_by_similarity(trgm, tenants):
+    owner, _ = tenants
+    results = DeviceService.search_devices(trgm, user_id=owner.id, query="meter", limit=100)
+    keys = [(-score, device.id) for device, score in results]
+    assert keys == sorted(keys)
+    assert results[0][1] == pytest.approx(1.0)
+    assert "Heater" not in {device.name for device, _ in results[:5]}
+
+
+def test_search_is_scoped_to_live_devices_of_the_tenant(trgm, tenants):
+    owner, _ = tenants
+    device_ids = {device.device_id for device, _ in DeviceService.search_devices(trgm, user_id=owner.id, query="smart meter", limit=100)}
+    assert device_ids and all(device_id.startswith("DEV-") for device_id in device_ids)
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3])
+def test_cursor_pagination_visits_every_result_once(trgm, tenants, limit):
+    owner, _ = tenants
+    everything = DeviceService.search_devices(trgm, user_id=owner.id, query="meter", limit=100)
+    paged = paginate(trgm, owner.id, "meter", limit)
+    assert [device.id for device, _ in paged] == [device.id for device, _ in everything]
+
+
+def test_user_search_pagination(trgm, tenants):
+    trgm.add_all([User(username=f"meter{index}", password="x", email=f"meter{index}@example.com") for index in range(5)])
+    trgm.commit()
+    everything = UserService.search_users(trgm, query="meter", limit=100)
+    first = UserService.search_users(trgm, query="meter", limit=2)
+    last_score, last_id = decode_cursor(encode_cursor(first[-1][1], first[-1][0].id), 2)
+    rest = UserService.search_users(trgm, query="meter", limit=100, after=(float(last_score), int(last_id)))
+    assert [user.id for user, _ in first + rest] == [user.id for user, _ in everything]
@@ -0,0 +1,184 @@
+"""
+用電紀錄分片測試
+以多個 SQLite 檔案代替分片，驗證路由穩定性、跨分片彙總與重新分片
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Set, Tuple
+
+import pytest
+from sqlalchemy import MetaData, func, select
+
+from app.database.sharding import TelemetryShards, jump_hash, shard_table
+from app.jobs.reshard import reshard
+from app.models.device import Device
+from app.models.user import User
+from app.services import device as device_service
+from app.services.device import DeviceService
+
+DEVICES = 40
+READINGS = 3
+
+
+def shard_urls(tmp_path, count: int) -> List[str]:
+    return [f"sqlite:///{tmp_path / f'shard{index}.db'}" for index in range(count)]
+
+
+def open_shards(urls: List[str]) -> TelemetryShards:
+    shards = TelemetryShards(urls)
+    shards.create_schema()
+    return shards
+
+
+def record_ids_by_shard(urls: List[str]) -> List[Set[Tuple[int, int]]]:
+    """返回每個分片上的 {(紀錄 ID, 設備 ID)}"""
+    table = shard_table(MetaData())
+    shards = TelemetryShards(urls)
+    try:
+        result = []
+        for engine in shards.engines:
+            with engine.connect() as conn:
+                result.append({tuple(row) for row in conn.execute(select(table.c.id, table.c.device_id))})
+        return result
+    finally:
+        shards.dispose()
+
+
+def records_by_shard(urls: List[str]) -> List[Dict[int, int]]:
+    """返回每個分片上 {設備 ID: 紀錄筆數}"""
+    table = shard_table(MetaData())
+    shards = TelemetryShards(urls)
+    try:
+        result = []
+        for engine in shards.engines:
+            with engine.connect() as conn:
+                result.append(dict(conn.execute(select(table.c.device_id, func.count()).group_by(table.c.device_id)).all()))
+        return result
+    finally:
+        shards.dispose()
+
+
+@pytest.fixture
+def devices(primary, user) -> List[Device]:
+    devices = [Device(user_id=user.id, name=f"設備{index}", device_id=f"D{index}", type="plug") for index in range(DEVICES)]
+    primary.add_all(devices)
+    primary.commit()
+    return devices
+
+
+@pytest.fixture
+def sharded(tmp_path, monkeypatch):
+    """以兩個 SQLite 分片取代全域分片路由"""
+    shards = open_shards(shard_urls(tmp_path, 2))
+    monkeypatch.setattr(device_service, "telemetry_shards", shards)
+    yield shards
+    shards.dispose()
+
+
+def record_readings(primary, user, devices: List[Device]) -> float:
+    """每個設備寫入 READINGS 筆讀數並提交，返回總用電量"""
+    now = datetime.utcnow()
+    total = 0.0
+    for device in devices:
+        for minute in range(READINGS):
+            usage = device.id + minute / 10
+            assert DeviceService.record_power_usage(primary, user_id=user.id, device_id=device.id, usage=usage, timestamp=now - timedelta(minutes=minute + 1), cost=usage * 2) is not None
+            total += usage
+        primary.commit()
+    return total
+
+
+def test_routing_is_stable(tmp_path):
+    urls = shard_urls(tmp_path, 3)
+    first, second = TelemetryShards(urls), TelemetryShards(urls)
+    try:
+        assignments = [first.shard_for(device_id) for device_id in range(1, 1001)]
+        assert assignments == [second.shard_for(device_id) for device_id in range(1, 1001)]
+        assert set(assignments) == {0, 1, 2}
+        assert all(jump_hash(device_id, 1) == 0 for device_id in range(1, 1001))
+    finally:
+        first.dispose()
+        second.dispose()
+
+
+def test_records_are_written_to_their_shard(primary, user, devices, sharded):
+    record_readings(primary, user, devices)
+    for index, counts in enumerate(records_by_shard(sharded.urls)):
+        assert counts
+        assert all(sharded.shard_for(device_id) == index and count == READINGS for device_id, count in counts.items())
+
+
+def test_record_ids_are_unique_across_shards(primary, user, devices, sharded):
+    record_readings(primary, user, devices)
+    ids = [record_id for records in record_ids_by_shard(sharded.urls) for record_id, _ in records]
+    assert len(ids) == len(set(ids)) == DEVICES * READINGS
+
+    # 新的路由實例從分片現有的最大 ID 接續
+    shards = TelemetryShards(sharded.urls)
+    try:
+        assert shards.allocate_record_id(primary) == max(ids) + 1
+    finally:
+        shards.dispose()
+
+
+def test_record_ids_come_from_primary_sequence(pg_primary, tmp_path, monkeypatch):
+    shards = open_shards(shard_urls(tmp_path, 2))
+    monkeypatch.setattr(device_service, "telemetry_shards", shards)
+    try:
+        owner = User(username="alice", password="x", email="alice@example.com")
+        pg_primary.add(owner)
+        pg_primary.flush()
+        devices = [Device(user_id=owner.id, name=f"設備{index}", device_id=f"D{index}", type="plug") for index in range(4)]
+        pg_primary.add_all(devices)
+        pg_primary.commit()
+
+        ids = [DeviceService.record_power_usage(pg_primary, user_id=owner.id, device_id=device.id, usage=1.0, timestamp=datetime.utcnow(), cost=2.0) for device in devices]
+        pg_primary.commit()
+        assert ids == list(range(1, len(devices) + 1))
+        assert {record_id for records in record_ids_by_shard(shards.urls) for record_id, _ in records} == set(ids)
+    finally:
+        shards.dispose()
+
+
+def test_totals_are_merged_across_shards(primary, user, devices, sharded):
+    total = record_readings(primary, user, devices)
+    now = datetime.utcnow()
+
+    assert DeviceService.get_total_power_usage(primary, user_id=user.id, start_time=now - timedelta(hours=1), end_time=now) == pytest.approx(total)
+    daily = DeviceService.get_daily_usage(primary, user_id=user.id, start_time=now - timedelta(days=1), end_time=now + timedelta(days=1))
+    assert sum(usage for usage, _ in daily.values()) == pytest.approx(total)
+    assert sum(cost for _, cost in daily.values()) == pytest.approx(total * 2)
+
+    primary.expire_all()
+    assert sum(float(device.power_usage) for device in primary.query(Device)) == pytest.approx(total)
+
+
+def test_shard_record_is_removed_when_primary_rolls_back(primary, user, devices, sharded):
+    device = devices[0]
+    DeviceService.record_power_usage(primary, user_id=user.id, device_id=device.id, usage=1.0, timestamp=datetime.utcnow(), cost=2.0)
+    assert records_by_shard(sharded.urls)[sharded.shard_for(device.id)] == {device.id: 1}
+
+    primary.rollback()
+    assert all(not counts for counts in records_by_shard(sharded.urls))
+
+
+def test_reshard_moves_only_remapped_devices(tmp_path, primary, user, devices, sharded):
+    record_readings(primary, user, devices)
+    sharded.dispose()
+    source, target = sharded.urls, shard_urls(tmp_path, 3)
+    moved = {device.id for device in devices if jump_hash(device.id, 2) != jump_hash(device.id, 3)}
+    assert moved and len(moved) < len(devices)
+
+    before = set().union(*record_ids_by_shard(source))
+    stats = reshard(source, target)
+    assert stats == {"devices": len(moved), "records": len(moved) * READINGS}
+    # 紀錄連同 ID 一起搬移
+    assert set().union(*record_ids_by_shard(target)) == before
+
+    after = records_by_shard(target)
+    for device in devices:
+        index = jump_hash(device.id, 3)
+        assert after[index].get(device.id) == READINGS
+        # 未搬移的設備仍在原分片，搬移的設備只會移到新增的分片
+        assert index == (2 if device.id in moved else jump_hash(device.id, 2))
+    assert sum(len(counts) for counts in after) == len(devices)
@@ -0,0 +1,66 @@
+"""
+軟刪除查詢範圍測試
+驗證欄位查詢、彙總、JOIN 與關聯載入都排除已刪除的資料，以及 include_deleted 明確包含已刪除的資料
+"""
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload, selectinload
+
+from app.database.soft_delete import INCLUDE_DELETED
+from app.models.device import Device, PowerUsageRecord
+
+
+@pytest.fixture
+def devices(primary, user):
+    """一個未刪除與一個已刪除的設備，各有一筆未刪除與一筆已刪除的用電紀錄"""
+    now = datetime.utcnow()
+    live = Device(user_id=user.id, name="冷氣", device_id="AC-1", type="ac")
+    deleted = Device(user_id=user.id, name="舊冷氣", device_id="AC-0", type="ac", deleted_at=now)
+    primary.add_all([live, deleted])
+    primary.flush()
+    for device in (live, deleted):
+        primary.add_all(
+            [
+                PowerUsageRecord(device_id=device.id, usage=1, cost=2, timestamp=now),
+                PowerUsageRecord(device_id=device.id, usage=10, cost=20, timestamp=now, deleted_at=now),
+            ]
+        )
+    primary.commit()
+    primary.expunge_all()
+    return live, deleted
+
+
+def test_column_queries_exclude_deleted(primary, devices):
+    assert primary.query(Device.name).all() == [("冷氣",)]
+    assert primary.scalars(select(Device.device_id)).all() == ["AC-1"]
+
+
+def test_aggregates_exclude_deleted(primary, devices):
+    assert primary.query(func.count(Device.id)).scalar() == 1
+    assert float(primary.query(func.sum(PowerUsageRecord.usage)).scalar()) == 2
+    # JOIN 的兩側都套用條件
+    assert float(primary.query(func.sum(PowerUsageRecord.usage)).join(Device).scalar()) == 1
+
+
+def test_relationship_loads_exclude_deleted(primary, devices):
+    live, _ = devices
+    device = primary.get(Device, live.id)
+    assert [float(record.usage) for record in device.power_usage_records] == [1]
+
+    for loader in (selectinload, joinedload):
+        primary.expunge_all()
+        (device,) = primary.query(Device).options(loader(Device.power_usage_records)).all()
+        assert [float(record.usage) for record in device.power_usage_records] == [1]
+
+
+def test_include_deleted(primary, devices):
+    options = {INCLUDE_DELETED: True}
+    assert primary.query(func.count(Device.id)).execution_options(**options).scalar() == 2
+    assert float(primary.query(func.sum(PowerUsageRecord.usage)).execution_options(**options).scalar()) == 22
+
+    _, deleted = devices
+    device = primary.query(Device).filter(Device.id == deleted.id).execution_options(**options).one()
+    assert {float(record.usage) for record in device.power_usage_records} == {1, 10}
@@ -0,0 +1,43 @@
+"""
+工作單元測試
+提交後與回滾後的回呼：依登記順序執行，單一回呼失敗時記錄錯誤並繼續執行其餘回呼
+"""
+
+import logging
+
+from sqlalchemy import text
+
+from app.database.unit_of_work import on_commit, on_rollback
+
+
+def fail() -> None:
+    raise RuntimeError("回呼失敗")
+
+
+def test_post_commit_callbacks_survive_failures(primary, caplog):
+    calls = []
+    on_commit(primary, lambda: calls.append("first"))
+    on_commit(primary, fail)
+    on_commit(primary, lambda: calls.append("last"))
+    on_rollback(primary, lambda: calls.append("compensated"))
+
+    with caplog.at_level(logging.ERROR):
+        primary.commit()
+
+    assert calls == ["first", "last"]
+    assert "交易提交後的回呼執行失敗" in caplog.text
+
+
+def test_rollback_discards_post_commit_and_runs_compensation(primary, caplog):
+    calls = []
+    primary.execute(text("SELECT 1"))
+    on_commit(primary, lambda: calls.append("committed"))
+    on_rollback(primary, fail)
+    on_rollback(primary, lambda: calls.append("compensated"))
+
+    with caplog.at_level(logging.ERROR):
+        primary.rollback()
+    primary.commit()
+
+    assert calls == ["compensated"]
+    assert "交易回滾後的補償回呼執行失敗" in caplog.text